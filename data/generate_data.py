@@ -3,28 +3,42 @@
 Generate synthetic logistics data CSVs.
 
 - Produces dims: Customer, Carrier, Equipment, Location, Lane, Date
-- Produces facts: Shipment (leg grain), Event, Cost
+- Produces facts: Shipment (leg grain), Event, Cost, and Shipment Milestone (one row per
+  shipment derived from its events: milestone timestamps, dwell minutes, exception count and
+  first exception type, plus the shipment's filter columns)
 - Deterministic via seed; UTC timestamps
 - Weekly diesel price curve influences fuel surcharge
 - Seasonality (EOM/holidays), dwell lognormal, exceptions 6–9%
+- Optional Hive-style partitioned layout for the facts (`--layout partitioned`): Parquet files
+  under FACT_SHIPMENT/delivery_month=YYYY-MM/, FACT_EVENT/event_month=YYYY-MM/ and FACT_COST
+  co-partitioned with its shipments, rows sorted by customer_id, lane_id within each partition
 """
 
 from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
 import math
 import random
+import shutil
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 try:
     import yaml  # type: ignore
 except Exception:  # pragma: no cover
     yaml = None  # Will error later with a friendly message
 
+try:  # only needed for the partitioned layout
+    import pandas as pd  # type: ignore
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pd = pa = pq = None  # type: ignore
+
 
 UTC = timezone.utc
 
@@ -48,11 +62,18 @@ class Config:
     diesel_weekly_sigma: float
     acceptance_rate: float
     seeds_dir: str | None = None
+    output_layout: str = "flat"  # flat CSVs, or "partitioned" Parquet facts
+    rows_per_file: int = 250_000  # per Parquet part file in the partitioned layout
 
 
 def parse_args() -> argparse.Namespace:
     ap = argparse.ArgumentParser(description="Generate synthetic logistics CSVs to data/out/")
     ap.add_argument("--config", type=str, default="data/config.yaml", help="Path to config.yaml")
+    ap.add_argument(
+        "--layout",
+        choices=("flat", "partitioned"),
+        help="Fact output layout (default: output_layout from the config, else flat)",
+    )
     return ap.parse_args()
 
 
@@ -86,6 +107,8 @@ def load_config(path: Path) -> Config:
         diesel_weekly_sigma=float(raw.get("diesel_weekly_sigma", 0.05)),
         acceptance_rate=float(raw.get("acceptance_rate", 0.92)),
         seeds_dir=raw.get("seeds_dir", "data/seeds"),
+        output_layout=str(raw.get("output_layout", "flat")),
+        rows_per_file=int(raw.get("rows_per_file", 250_000)),
     )
 
 
@@ -502,7 +525,7 @@ def simulate_shipments(
             # Lognormal minutes
             mu = math.log(cfg.dwell_mu_minutes)
             sigma = cfg.dwell_sigma_minutes
-            dwell_minutes = int(random.lognormvariate(mu, sigma) * 10)  # long tail
+            dwell_minutes = int(rng.lognormvariate(mu, sigma) * 10)  # long tail
             start = pickup_actual + timedelta(hours=rng.randint(1, 12))
             add_event(sid, seq, "DwellStart", start, o_loc["loc_id"], notes="Facility dwell")
             seq += 1
@@ -638,16 +661,146 @@ def simulate_shipments(
     return shipments, events, costs
 
 
+MILESTONE_EVENTS = {
+    "Tendered": "tendered_ts",
+    "Accepted": "accepted_ts",
+    "PickedUp": "picked_up_ts",
+    "AtDest": "at_dest_ts",
+    "Delivered": "delivered_ts",
+}
+
+
+def build_milestones(shipments: List[Dict], events: List[Dict], load_dt: datetime) -> List[Dict]:
+    """One accumulating-snapshot row per shipment, from its events (same rules as the curation SQL).
+
+    Each milestone is the earliest event of its type. Dwell pairs the n-th DwellStart with the
+    n-th DwellEnd and sums the minutes (blank when the shipment never dwelled). The first
+    exception type is the notes of the earliest Exception event ('Unknown' when blank).
+    Filter columns and delivery_date come from the shipment's first leg.
+    """
+    by_shipment: Dict[str, List[Dict]] = {}
+    for e in events:
+        by_shipment.setdefault(e["shipment_id"], []).append(e)
+    rows: List[Dict] = []
+    seen = set()
+    for s in shipments:
+        sid = s["shipment_id"]
+        if sid in seen:
+            continue
+        seen.add(sid)
+        row = {
+            "shipment_id": sid,
+            "customer_id": s["customer_id"],
+            "carrier_id": s["carrier_id"],
+            "equipment_id": s["equipment_id"],
+            "lane_id": s["lane_id"],
+            "delivery_date": s["delivery_actual_ts"][:10],
+            **{col: "" for col in MILESTONE_EVENTS.values()},
+        }
+        evs = sorted(by_shipment.get(sid, []), key=lambda e: (e["event_ts"], e["event_seq"]))
+        for e in evs:
+            col = MILESTONE_EVENTS.get(e["event_type"])
+            if col and not row[col]:
+                row[col] = e["event_ts"]
+        starts = [datetime.fromisoformat(e["event_ts"]) for e in evs if e["event_type"] == "DwellStart"]
+        ends = [datetime.fromisoformat(e["event_ts"]) for e in evs if e["event_type"] == "DwellEnd"]
+        pairs = list(zip(starts, ends))
+        row["dwell_minutes"] = sum(int((b - a).total_seconds() // 60) for a, b in pairs) if pairs else ""
+        exceptions = [e for e in evs if e["event_type"] == "Exception"]
+        row["exception_count"] = len(exceptions)
+        row["first_exception_type"] = ((exceptions[0]["notes"] or "").strip() or "Unknown") if exceptions else ""
+        row["load_date"] = load_dt.isoformat()
+        row["update_date"] = load_dt.isoformat()
+        rows.append(row)
+    return rows
+
+
+AUDIT_COLUMNS = ("load_date", "update_date")
+
+
+def row_hash(row: Dict, columns: List[str]) -> str:
+    """md5 of the business columns' CSV text, '|'-joined in column order (NULL -> '').
+
+    Audit timestamps are left out, so re-extracting an unchanged row yields the same hash and
+    the MERGE steps can skip it (see snowflake/03_merge_upserts.sql).
+    """
+    text = "|".join("" if row.get(c) is None else str(row[c]) for c in columns)
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
 def write_csv(path: Path, fieldnames: List[str], rows: List[Dict]) -> None:
+    business = [c for c in fieldnames if c not in AUDIT_COLUMNS]
     with path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w = csv.DictWriter(f, fieldnames=[*fieldnames, "row_hash"])
         w.writeheader()
         for r in rows:
             # Remove internal columns if present
             r = {k: v for k, v in r.items() if not k.startswith("_")}
+            r["row_hash"] = row_hash(r, business)
             w.writerow(r)
 
 
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"  # Hive's directory name for a NULL partition value
+
+
+def month_of(ts: str) -> str:
+    """Partition value (YYYY-MM) of an ISO timestamp string; HIVE_NULL when it is empty."""
+    return ts[:7] if ts else HIVE_NULL
+
+
+def write_partitioned(
+    table_dir: Path,
+    fieldnames: List[str],
+    rows: List[Dict],
+    part_col: str,
+    partition: Callable[[Dict], str],
+    sort_key: Callable[[Dict], Tuple],
+    rows_per_file: int,
+) -> int:
+    """Write rows as <table_dir>/<part_col>=<value>/part-NNNNN.parquet; return the file count.
+
+    Rows are sorted by `sort_key` within each partition. Timestamps are stored as UTC timestamps
+    rather than text; row_hash is computed from the CSV text, so it matches the flat layout.
+    """
+    if pa is None:
+        raise RuntimeError("pandas and pyarrow are required for the partitioned layout (make venv).")
+    business = [c for c in fieldnames if c not in AUDIT_COLUMNS]
+    keyed = []
+    for r in rows:
+        r = {k: v for k, v in r.items() if not k.startswith("_")}
+        r["row_hash"] = row_hash(r, business)
+        keyed.append((partition(r), sort_key(r), r))
+    # Partitions in order (HIVE_NULL sorts after any YYYY-MM), then the sort key within each
+    keyed.sort(key=lambda t: (t[0], t[1]))
+    # Blank fields become NULLs, as COPY reads them from the CSVs (so optional ints stay ints)
+    df = pd.DataFrame([r for _, _, r in keyed], columns=[*fieldnames, "row_hash"]).replace("", None)
+    for c in df.columns:
+        if c.endswith("_ts") or c in AUDIT_COLUMNS:
+            df[c] = pd.to_datetime(df[c], utc=True, format="ISO8601")
+        elif c.endswith("_date"):
+            df[c] = pd.to_datetime(df[c], format="ISO8601").dt.date
+    # One schema for every file, so all-NULL columns in a small partition keep their type
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.cast(pa.schema([
+        pa.field(f.name, pa.string()) if pa.types.is_large_string(f.type) else f for f in table.schema
+    ], metadata=table.schema.metadata))
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    values = [v for v, _, _ in keyed]
+    files = start = 0
+    while start < len(values):
+        stop = start
+        while stop < len(values) and values[stop] == values[start]:
+            stop += 1
+        part = table_dir / f"{part_col}={values[start]}"
+        part.mkdir(parents=True)
+        for i, lo in enumerate(range(start, stop, rows_per_file)):
+            pq.write_table(table.slice(lo, min(rows_per_file, stop - lo)), part / f"part-{i:05d}.parquet")
+            files += 1
+        start = stop
+    return files
+
+
 def generate(cfg: Config) -> None:
     rng = random.Random(cfg.seed)
     out_dir = ensure_out_dir()
@@ -727,58 +880,102 @@ def generate(cfg: Config) -> None:
         ["date_key", "date", "year", "quarter", "month", "week", "dow", "is_weekend", "load_date", "update_date"],
         dates,
     )
-    write_csv(
-        out_dir / "FACT_SHIPMENT.csv",
-        [
-            "shipment_id",
-            "leg_id",
-            "customer_id",
-            "carrier_id",
-            "equipment_id",
-            "origin_loc_id",
-            "dest_loc_id",
-            "lane_id",
-            "tender_ts",
-            "pickup_plan_ts",
-            "pickup_actual_ts",
-            "delivery_plan_ts",
-            "delivery_actual_ts",
-            "planned_miles",
-            "actual_miles",
-            "pieces",
-            "weight_lbs",
-            "cube",
-            "revenue",
-            "total_cost",
-            "fuel_surcharge",
-            "accessorial_cost",
-            "status",
-            "isdeliveredontime",
-            "isinfull",
-            "isotif",
-            "cancel_flag",
-            "load_date",
-            "update_date",
-        ],
-        shipments,
+    shipment_fields = [
+        "shipment_id",
+        "leg_id",
+        "customer_id",
+        "carrier_id",
+        "equipment_id",
+        "origin_loc_id",
+        "dest_loc_id",
+        "lane_id",
+        "tender_ts",
+        "pickup_plan_ts",
+        "pickup_actual_ts",
+        "delivery_plan_ts",
+        "delivery_actual_ts",
+        "planned_miles",
+        "actual_miles",
+        "pieces",
+        "weight_lbs",
+        "cube",
+        "revenue",
+        "total_cost",
+        "fuel_surcharge",
+        "accessorial_cost",
+        "status",
+        "isdeliveredontime",
+        "isinfull",
+        "isotif",
+        "cancel_flag",
+        "load_date",
+        "update_date",
+    ]
+    event_fields = ["shipment_id", "event_seq", "event_type", "event_ts", "facility_loc_id", "notes", "load_date", "update_date"]
+    cost_fields = ["shipment_id", "cost_type", "calc_method", "rate_ref", "cost_amount", "currency", "load_date", "update_date"]
+    milestones = build_milestones(shipments, events, load_dt)
+    milestone_fields = [
+        "shipment_id", "customer_id", "carrier_id", "equipment_id", "lane_id", "delivery_date",
+        *MILESTONE_EVENTS.values(), "dwell_minutes", "exception_count", "first_exception_type", "load_date", "update_date",
+    ]
+    facts = ("FACT_SHIPMENT", "FACT_EVENT", "FACT_COST", "FACT_SHIPMENT_MILESTONE")
+
+    if cfg.output_layout != "partitioned":
+        for table in facts:
+            shutil.rmtree(out_dir / table, ignore_errors=True)
+        write_csv(out_dir / "FACT_SHIPMENT.csv", shipment_fields, shipments)
+        write_csv(out_dir / "FACT_EVENT.csv", event_fields, events)
+        write_csv(out_dir / "FACT_COST.csv", cost_fields, costs)
+        write_csv(out_dir / "FACT_SHIPMENT_MILESTONE.csv", milestone_fields, milestones)
+        return
+
+    # Partitioned layout: events and costs sort with their shipment's customer and lane, so a
+    # partition read for one customer touches one contiguous run of rows in every fact
+    by_id = {s["shipment_id"]: s for s in shipments}
+
+    def shipment_key(sid: str) -> Tuple:
+        s = by_id.get(sid, {})
+        return (s.get("customer_id", 0), s.get("lane_id", 0), sid)
+
+    for table in facts:
+        (out_dir / f"{table}.csv").unlink(missing_ok=True)
+    files = write_partitioned(
+        out_dir / "FACT_SHIPMENT", shipment_fields, shipments, "delivery_month",
+        lambda r: month_of(r["delivery_actual_ts"]),
+        lambda r: (*shipment_key(r["shipment_id"]), r["leg_id"]),
+        cfg.rows_per_file,
     )
-    write_csv(
-        out_dir / "FACT_EVENT.csv",
-        ["shipment_id", "event_seq", "event_type", "event_ts", "facility_loc_id", "notes", "load_date", "update_date"],
-        events,
+    files += write_partitioned(
+        out_dir / "FACT_EVENT", event_fields, events, "event_month",
+        lambda r: month_of(r["event_ts"]),
+        lambda r: (*shipment_key(r["shipment_id"]), r["event_seq"]),
+        cfg.rows_per_file,
     )
-    write_csv(
-        out_dir / "FACT_COST.csv",
-        ["shipment_id", "cost_type", "calc_method", "rate_ref", "cost_amount", "currency", "load_date", "update_date"],
-        costs,
+    files += write_partitioned(
+        out_dir / "FACT_COST", cost_fields, costs, "delivery_month",
+        lambda r: month_of(by_id.get(r["shipment_id"], {}).get("delivery_actual_ts", "")),
+        lambda r: shipment_key(r["shipment_id"]),
+        cfg.rows_per_file,
     )
+    files += write_partitioned(
+        out_dir / "FACT_SHIPMENT_MILESTONE", milestone_fields, milestones, "delivery_month",
+        lambda r: month_of(r["delivery_date"]),
+        lambda r: shipment_key(r["shipment_id"]),
+        cfg.rows_per_file,
+    )
+    print(f"Wrote {files} Parquet files under data/out/FACT_*/")
 
 
 def main() -> None:
     args = parse_args()
     cfg = load_config(Path(args.config))
+    if args.layout:
+        cfg.output_layout = args.layout
     generate(cfg)
-    print("Data generated to data/out/*.csv")
+    if cfg.output_layout == "partitioned":
+        print("Data generated to data/out/: dimension CSVs, facts as Parquet partitions under data/out/FACT_*/")
+    else:
+        print("Data generated to data/out/*.csv")
 
 
 if __name__ == "__main__":
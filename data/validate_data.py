@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Single-pass data-quality validator for the generated CSVs (run before loading).
+
+- Reads each FACT file once, in chunks, with one worker process per file; memory stays
+  bounded by the chunk size plus one hashed key (and one amount) per shipment
+- FACT_SHIPMENT: customer/carrier/equipment/origin/dest/lane FKs against ID sets from the DIM
+  files, duplicate (shipment_id, leg_id), isotif implies isdeliveredontime and isinfull
+- FACT_EVENT: facility FK, event_seq strictly increasing per shipment, and milestone
+  timestamps (Tendered .. Delivered) non-decreasing in event_seq order. Exception and dwell
+  events are stamped when they happened, not when recorded, so they are not ordered.
+  Expects each shipment's events to be contiguous, as the generator writes them
+- FACT_COST: cost rows summed per shipment and compared with total_cost (cancelled shipments
+  carry a TONU charge against a zero total and are skipped)
+- FACT_SHIPMENT_MILESTONE (when present): FKs, accepted without tendered, negative dwell; across
+  files one row per shipment, none orphaned, and exception_count equal to the shipment's
+  Exception events
+- Across files: events and costs whose shipment_id is not in FACT_SHIPMENT
+- Reads the partitioned layout (TABLE/<key>=<value>/*.parquet) as well as CSVs. Events are
+  partitioned by event month, so the ordering checks apply within each partition file
+
+Usage:
+  python data/validate_data.py --data data/out [--workers 3] [--json report.json]
+Exit code 1 when any check fails.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pq = None  # type: ignore
+
+MILESTONES = ("Tendered", "Accepted", "AtOrigin", "PickedUp", "AtDest", "Delivered")
+SAMPLES = 5  # offending keys kept per check
+
+# FACT_SHIPMENT column -> DIM id set it references (FACT_SHIPMENT_MILESTONE repeats four of them)
+SHIPMENT_FKS = {
+    "customer_id": "customer",
+    "carrier_id": "carrier",
+    "equipment_id": "equipment",
+    "origin_loc_id": "location",
+    "dest_loc_id": "location",
+    "lane_id": "lane",
+}
+
+Arrays = Dict[str, np.ndarray]
+
+
+class Findings:
+    """Violation counts per check, with a few sample keys each."""
+
+    def __init__(self):
+        self.rows: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[str]] = {}
+
+    def add(self, check: str, bad: np.ndarray, keys: Optional[np.ndarray] = None) -> None:
+        """Record the rows flagged by boolean mask `bad` (keys label the samples)."""
+        n = int(np.count_nonzero(bad))
+        self.counts[check] = self.counts.get(check, 0) + n
+        if n and keys is not None:
+            kept = self.samples.setdefault(check, [])
+            if len(kept) < SAMPLES:
+                kept.extend(str(k) for k in keys[bad][: SAMPLES - len(kept)])
+
+    def merge(self, other: "Findings") -> None:
+        for t, n in other.rows.items():
+            self.rows[t] = self.rows.get(t, 0) + n
+        for check, n in other.counts.items():
+            self.counts[check] = self.counts.get(check, 0) + n
+        for check, keys in other.samples.items():
+            kept = self.samples.setdefault(check, [])
+            kept.extend(keys[: SAMPLES - len(kept)])
+
+    @property
+    def failed(self) -> bool:
+        return any(self.counts.values())
+
+
+def _key_hash(values: pd.Series) -> np.ndarray:
+    # 64-bit hashes stand in for shipment ids in the cross-file checks
+    return pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+
+
+def _flag(s: pd.Series) -> np.ndarray:
+    return s.astype(str).str.strip().str.lower().isin(("true", "1")).to_numpy()
+
+
+def _prev(values: np.ndarray, carry) -> np.ndarray:
+    """`values` shifted down one row, with the previous chunk's last value in front."""
+    out = np.empty_like(values)
+    out[1:] = values[:-1]
+    out[0] = carry
+    return out
+
+
+def _as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Typed Parquet columns as the text the CSV reader yields (NULL -> '')."""
+    return pd.DataFrame({c: df[c].astype(object).where(df[c].notna(), "").astype(str) for c in df.columns})
+
+
+def _chunks(path: Path, usecols: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if path.suffix == ".parquet":
+        if pq is None:
+            raise RuntimeError("pyarrow is required to validate Parquet partitions")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=usecols):
+            yield _as_text(batch.to_pandas(types_mapper=pd.ArrowDtype))
+        return
+    yield from pd.read_csv(path, usecols=usecols, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+
+
+def load_dims(base: Path) -> Dict[str, np.ndarray]:
+    """ID sets of the dimensions the facts reference."""
+    def ids(table: str, col: str) -> np.ndarray:
+        return pd.read_csv(base / f"{table}.csv", usecols=[col], dtype=str)[col].str.strip().unique()
+
+    return {
+        "customer": ids("DIM_CUSTOMER", "customer_id"),
+        "carrier": ids("DIM_CARRIER", "carrier_id"),
+        "equipment": ids("DIM_EQUIPMENT", "equipment_id"),
+        "location": ids("DIM_LOCATION", "loc_id"),
+        "lane": ids("DIM_LANE", "lane_id"),
+    }
+
+
+def check_lanes(base: Path, dims: Dict[str, np.ndarray]) -> Findings:
+    f = Findings()
+    lanes = pd.read_csv(base / "DIM_LANE.csv", usecols=["lane_id", "origin_loc_id", "dest_loc_id"], dtype=str)
+    f.rows["DIM_LANE"] = len(lanes)
+    keys = lanes["lane_id"].to_numpy()
+    for col in ("origin_loc_id", "dest_loc_id"):
+        f.add(f"DIM_LANE.{col} -> DIM_LOCATION", ~lanes[col].str.strip().isin(dims["location"]).to_numpy(), keys)
+    return f
+
+
+def check_shipments(path: Path, dims: Dict[str, np.ndarray], chunk_rows: int) -> Tuple[Findings, Arrays]:
+    f = Findings()
+    cols = ["shipment_id", "leg_id", *SHIPMENT_FKS, "total_cost", "isdeliveredontime", "isinfull", "isotif", "cancel_flag"]
+    ids, legs, totals, cancelled = [], [], [], []
+    for df in _chunks(path, cols, chunk_rows):
+        f.rows["FACT_SHIPMENT"] = f.rows.get("FACT_SHIPMENT", 0) + len(df)
+        keys = df["shipment_id"].to_numpy()
+        for col, dim in SHIPMENT_FKS.items():
+            f.add(f"FACT_SHIPMENT.{col} -> DIM_{dim.upper()}", ~df[col].str.strip().isin(dims[dim]).to_numpy(), keys)
+        otif = _flag(df["isotif"])
+        f.add("FACT_SHIPMENT isotif without isdeliveredontime", otif & ~_flag(df["isdeliveredontime"]), keys)
+        f.add("FACT_SHIPMENT isotif without isinfull", otif & ~_flag(df["isinfull"]), keys)
+        ids.append(_key_hash(df["shipment_id"]))
+        legs.append(_key_hash(df["shipment_id"] + "|" + df["leg_id"]))
+        totals.append(pd.to_numeric(df["total_cost"], errors="coerce").to_numpy(dtype=float))
+        cancelled.append(_flag(df["cancel_flag"]))
+    return f, {
+        "ids": np.concatenate(ids) if ids else np.empty(0, np.uint64),
+        "legs": np.concatenate(legs) if legs else np.empty(0, np.uint64),
+        "total_cost": np.concatenate(totals) if totals else np.empty(0),
+        "cancelled": np.concatenate(cancelled) if cancelled else np.empty(0, bool),
+    }
+
+
+def check_events(path: Path, dims: Dict[str, np.ndarray], chunk_rows: int) -> Tuple[Findings, Arrays]:
+    f = Findings()
+    ids: List[np.ndarray] = []
+    exceptions: List[np.ndarray] = []  # one shipment hash per Exception event
+    last_sid, last_seq = "", np.nan  # previous event, across chunk boundaries
+    last_mile_sid, last_mile_ts = "", np.iinfo(np.int64).min  # previous milestone event
+    for df in _chunks(path, ["shipment_id", "event_seq", "event_type", "event_ts", "facility_loc_id"], chunk_rows):
+        f.rows["FACT_EVENT"] = f.rows.get("FACT_EVENT", 0) + len(df)
+        sid = df["shipment_id"].to_numpy(dtype=object)
+        keys = (df["shipment_id"] + "#" + df["event_seq"]).to_numpy()
+        f.add("FACT_EVENT.facility_loc_id -> DIM_LOCATION", ~df["facility_loc_id"].str.strip().isin(dims["location"]).to_numpy(), keys)
+
+        seq = pd.to_numeric(df["event_seq"], errors="coerce").to_numpy(dtype=float)
+        same = sid == _prev(sid, last_sid)
+        f.add("FACT_EVENT event_seq not increasing per shipment", same & ~(seq > _prev(seq, last_seq)), keys)
+        last_sid, last_seq = sid[-1], seq[-1]
+
+        ts = pd.to_datetime(df["event_ts"], utc=True, errors="coerce", format="ISO8601")
+        f.add("FACT_EVENT event_ts unparseable", ts.isna().to_numpy(), keys)
+        mile = df["event_type"].isin(MILESTONES).to_numpy() & ts.notna().to_numpy()
+        if mile.any():
+            m_sid = sid[mile]
+            m_ts = ts[mile].dt.tz_localize(None).to_numpy().astype("datetime64[ns]").view(np.int64)
+            m_same = m_sid == _prev(m_sid, last_mile_sid)
+            f.add("FACT_EVENT milestone event_ts out of order", m_same & (m_ts < _prev(m_ts, last_mile_ts)), keys[mile])
+            last_mile_sid, last_mile_ts = m_sid[-1], m_ts[-1]
+        ids.append(np.unique(_key_hash(df["shipment_id"])))
+        exceptions.append(_key_hash(df.loc[df["event_type"] == "Exception", "shipment_id"]))
+    return f, {
+        "ids": np.unique(np.concatenate(ids)) if ids else np.empty(0, np.uint64),
+        "exceptions": np.concatenate(exceptions) if exceptions else np.empty(0, np.uint64),
+    }
+
+
+def check_costs(path: Path, dims: Dict[str, np.ndarray], chunk_rows: int) -> Tuple[Findings, Arrays]:
+    f = Findings()
+    partial: List[pd.Series] = []
+    for df in _chunks(path, ["shipment_id", "cost_type", "cost_amount"], chunk_rows):
+        f.rows["FACT_COST"] = f.rows.get("FACT_COST", 0) + len(df)
+        amount = pd.to_numeric(df["cost_amount"], errors="coerce")
+        keys = (df["shipment_id"] + "/" + df["cost_type"]).to_numpy()
+        f.add("FACT_COST cost_amount missing or negative", ~(amount >= 0).to_numpy(), keys)
+        # Per-shipment sums of this chunk; shipments split across chunks are summed again below
+        partial.append(amount.groupby(_key_hash(df["shipment_id"])).sum())
+    sums = pd.concat(partial).groupby(level=0).sum() if partial else pd.Series(dtype=float)
+    return f, {"ids": sums.index.to_numpy(dtype=np.uint64), "cost": sums.to_numpy(dtype=float)}
+
+
+def check_milestones(path: Path, dims: Dict[str, np.ndarray], chunk_rows: int) -> Tuple[Findings, Arrays]:
+    f = Findings()
+    fks = {c: d for c, d in SHIPMENT_FKS.items() if c not in ("origin_loc_id", "dest_loc_id")}
+    cols = ["shipment_id", *fks, "tendered_ts", "accepted_ts", "dwell_minutes", "exception_count"]
+    ids, counts = [], []
+    for df in _chunks(path, cols, chunk_rows):
+        f.rows["FACT_SHIPMENT_MILESTONE"] = f.rows.get("FACT_SHIPMENT_MILESTONE", 0) + len(df)
+        keys = df["shipment_id"].to_numpy()
+        for col, dim in fks.items():
+            f.add(f"FACT_SHIPMENT_MILESTONE.{col} -> DIM_{dim.upper()}", ~df[col].str.strip().isin(dims[dim]).to_numpy(), keys)
+        blank = {c: (df[c].str.strip() == "").to_numpy() for c in ("tendered_ts", "accepted_ts")}
+        f.add("FACT_SHIPMENT_MILESTONE accepted_ts without tendered_ts", ~blank["accepted_ts"] & blank["tendered_ts"], keys)
+        f.add("FACT_SHIPMENT_MILESTONE dwell_minutes negative", (pd.to_numeric(df["dwell_minutes"], errors="coerce") < 0).to_numpy(), keys)
+        ids.append(_key_hash(df["shipment_id"]))
+        counts.append(pd.to_numeric(df["exception_count"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64))
+    return f, {
+        "ids": np.concatenate(ids) if ids else np.empty(0, np.uint64),
+        "exception_count": np.concatenate(counts) if counts else np.empty(0, np.int64),
+    }
+
+
+CHECKS = {
+    "FACT_SHIPMENT": check_shipments,
+    "FACT_EVENT": check_events,
+    "FACT_COST": check_costs,
+    "FACT_SHIPMENT_MILESTONE": check_milestones,
+}
+
+
+def fact_files(base: Path) -> List[Tuple[str, Path]]:
+    """(table, file) for every FACT file: TABLE.csv, TABLE_*.csv or TABLE/**/*.csv|parquet."""
+    out = []
+    for table in CHECKS:
+        parts = [*(base / table).glob("**/*.csv"), *(base / table).glob("**/*.parquet")]
+        chunks = [p for p in base.glob(f"{table}_*.csv") if p.stem not in CHECKS]  # not FACT_SHIPMENT_MILESTONE
+        paths = sorted({*base.glob(f"{table}.csv"), *chunks, *parts})
+        out.extend((table, p) for p in paths)
+    return out
+
+
+def reconcile(arrays: Dict[str, List[Arrays]], tolerance: float) -> Findings:
+    """Checks that need more than one file: orphans, duplicates and cost totals."""
+    f = Findings()
+
+    def cat(table: str, key: str) -> np.ndarray:
+        parts = [a[key] for a in arrays.get(table, [])]
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    ship_ids = cat("FACT_SHIPMENT", "ids")
+    legs = cat("FACT_SHIPMENT", "legs")
+    f.counts["FACT_SHIPMENT duplicate (shipment_id, leg_id)"] = int(len(legs) - len(np.unique(legs)))
+    known = np.unique(ship_ids)
+    for table in ("FACT_EVENT", "FACT_COST"):
+        ids = np.unique(cat(table, "ids"))
+        f.counts[f"{table}.shipment_id -> FACT_SHIPMENT (shipments)"] = int(np.count_nonzero(~np.isin(ids, known)))
+
+    # total_cost per shipment (summed over legs) against the FACT_COST rows
+    ship = pd.DataFrame({"id": ship_ids, "total": cat("FACT_SHIPMENT", "total_cost"), "cancelled": cat("FACT_SHIPMENT", "cancelled")})
+    ship = ship.groupby("id").agg(total=("total", "sum"), cancelled=("cancelled", "any"))
+    cost = pd.Series(cat("FACT_COST", "cost"), index=cat("FACT_COST", "ids")).groupby(level=0).sum()
+    live = ship[~ship["cancelled"]]
+    diff = (live["total"] - cost.reindex(live.index).fillna(0.0)).abs()
+    f.counts["FACT_SHIPMENT total_cost != sum(FACT_COST)"] = int((diff > tolerance).sum())
+
+    # Milestone snapshot (older outputs have none): one row per shipment, counts match the events
+    if "FACT_SHIPMENT_MILESTONE" in arrays:
+        mile_ids = cat("FACT_SHIPMENT_MILESTONE", "ids")
+        f.counts["FACT_SHIPMENT_MILESTONE duplicate shipment_id"] = int(len(mile_ids) - len(np.unique(mile_ids)))
+        f.counts["FACT_SHIPMENT_MILESTONE.shipment_id -> FACT_SHIPMENT (shipments)"] = int(np.count_nonzero(~np.isin(mile_ids, known)))
+        f.counts["FACT_SHIPMENT without FACT_SHIPMENT_MILESTONE (shipments)"] = int(np.count_nonzero(~np.isin(known, mile_ids)))
+        events = pd.Series(cat("FACT_EVENT", "exceptions")).value_counts()
+        counted = pd.Series(cat("FACT_SHIPMENT_MILESTONE", "exception_count"), index=mile_ids).groupby(level=0).first()
+        f.counts["FACT_SHIPMENT_MILESTONE exception_count != Exception events"] = int(
+            (counted != events.reindex(counted.index).fillna(0).astype(np.int64)).sum()
+        )
+    return f
+
+
+def validate(base: Path, workers: int, chunk_rows: int, tolerance: float) -> Tuple[Findings, List[str]]:
+    dims = load_dims(base)
+    findings = check_lanes(base, dims)
+    files = fact_files(base)
+    arrays: Dict[str, List[Arrays]] = {}
+    log = []
+    with ProcessPoolExecutor(max(workers, 1)) as pool:
+        futures = [(table, path, pool.submit(CHECKS[table], path, dims, chunk_rows)) for table, path in files]
+        for table, path, fut in futures:
+            t0 = perf_counter()
+            part, arr = fut.result()
+            findings.merge(part)
+            arrays.setdefault(table, []).append(arr)
+            log.append(f"{path.relative_to(base).as_posix()}: {part.rows.get(table, 0):,} rows (waited {perf_counter() - t0:.1f}s)")
+    findings.merge(reconcile(arrays, tolerance))
+    return findings, log
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Validate generated CSVs in one streaming pass per file")
+    ap.add_argument("--data", type=Path, default=Path("data/out"), help="Directory with the generated CSVs")
+    ap.add_argument("--workers", type=int, default=min(len(CHECKS), os.cpu_count() or 1), help="Worker processes")
+    ap.add_argument("--chunk-rows", type=int, default=500_000, help="Rows read per chunk")
+    ap.add_argument("--cost-tolerance", type=float, default=0.02, help="Allowed |total_cost - sum(costs)|")
+    ap.add_argument("--json", type=Path, help="Also write the findings as JSON")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    t0 = perf_counter()
+    findings, log = validate(args.data, args.workers, args.chunk_rows, args.cost_tolerance)
+    elapsed = perf_counter() - t0
+    for line in log:
+        print(line)
+    rows = sum(findings.rows.values())
+    print(f"\n{rows:,} rows checked in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)\n")
+    for check in sorted(findings.counts):
+        n = findings.counts[check]
+        sample = findings.samples.get(check)
+        print(f"{'FAIL' if n else 'ok  '} {check}: {n:,}" + (f"  e.g. {', '.join(sample)}" if sample else ""))
+    if args.json:
+        args.json.write_text(
+            json.dumps({"rows": findings.rows, "counts": findings.counts, "samples": findings.samples, "seconds": round(elapsed, 2)}, indent=2),
+            encoding="utf-8",
+        )
+    if findings.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,50 +5,51 @@ USE DATABASE IDENTIFIER('<DATABASE>');
 -- Idempotent upserts leveraging MERGE templates defined in snowflake/03_merge_upserts.sql.
 -- Option A: Reference MERGE templates directly (preferred).
 -- Option B: Inline transforms (simplified below).
+-- Matched rows are only updated when row_hash differs, so unchanged re-extracts are not rewritten.
 
 -- 1) Upsert dimensions
 -- (Assume STG loaded; either call MERGE templates or run inline copies.)
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').DIM_CUSTOMER t
-USING IDENTIFIER('<STG_SCHEMA>').DIM_CUSTOMER s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(customer_id,name,segment,region))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').DIM_CUSTOMER) s
 ON t.customer_id = s.customer_id
-WHEN MATCHED THEN UPDATE SET name=s.name, segment=s.segment, region=s.region, update_date=s.update_date
-WHEN NOT MATCHED THEN INSERT (customer_id,name,segment,region,load_date,update_date)
-VALUES (s.customer_id,s.name,s.segment,s.region,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()));
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET name=s.name, segment=s.segment, region=s.region, update_date=s.update_date, row_hash=s.src_hash
+WHEN NOT MATCHED THEN INSERT (customer_id,name,segment,region,load_date,update_date,row_hash)
+VALUES (s.customer_id,s.name,s.segment,s.region,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()),s.src_hash);
 
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').DIM_CARRIER t
-USING IDENTIFIER('<STG_SCHEMA>').DIM_CARRIER s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(carrier_id,name,mode,mc_number,score_tier))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').DIM_CARRIER) s
 ON t.carrier_id = s.carrier_id
-WHEN MATCHED THEN UPDATE SET name=s.name, mode=s.mode, mc_number=s.mc_number, score_tier=s.score_tier, update_date=s.update_date
-WHEN NOT MATCHED THEN INSERT (carrier_id,name,mode,mc_number,score_tier,load_date,update_date)
-VALUES (s.carrier_id,s.name,s.mode,s.mc_number,s.score_tier,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()));
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET name=s.name, mode=s.mode, mc_number=s.mc_number, score_tier=s.score_tier, update_date=s.update_date, row_hash=s.src_hash
+WHEN NOT MATCHED THEN INSERT (carrier_id,name,mode,mc_number,score_tier,load_date,update_date,row_hash)
+VALUES (s.carrier_id,s.name,s.mode,s.mc_number,s.score_tier,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()),s.src_hash);
 
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').DIM_EQUIPMENT t
-USING IDENTIFIER('<STG_SCHEMA>').DIM_EQUIPMENT s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(equipment_id,type,capacity_lbs))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').DIM_EQUIPMENT) s
 ON t.equipment_id = s.equipment_id
-WHEN MATCHED THEN UPDATE SET type=s.type, capacity_lbs=s.capacity_lbs, update_date=s.update_date
-WHEN NOT MATCHED THEN INSERT (equipment_id,type,capacity_lbs,load_date,update_date)
-VALUES (s.equipment_id,s.type,s.capacity_lbs,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()));
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET type=s.type, capacity_lbs=s.capacity_lbs, update_date=s.update_date, row_hash=s.src_hash
+WHEN NOT MATCHED THEN INSERT (equipment_id,type,capacity_lbs,load_date,update_date,row_hash)
+VALUES (s.equipment_id,s.type,s.capacity_lbs,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()),s.src_hash);
 
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').DIM_LOCATION t
-USING IDENTIFIER('<STG_SCHEMA>').DIM_LOCATION s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(loc_id,name,city,state,country,timezone,type))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').DIM_LOCATION) s
 ON t.loc_id = s.loc_id
-WHEN MATCHED THEN UPDATE SET name=s.name, city=s.city, state=s.state, country=s.country, timezone=s.timezone, type=s.type, update_date=s.update_date
-WHEN NOT MATCHED THEN INSERT (loc_id,name,city,state,country,timezone,type,load_date,update_date)
-VALUES (s.loc_id,s.name,s.city,s.state,s.country,s.timezone,s.type,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()));
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET name=s.name, city=s.city, state=s.state, country=s.country, timezone=s.timezone, type=s.type, update_date=s.update_date, row_hash=s.src_hash
+WHEN NOT MATCHED THEN INSERT (loc_id,name,city,state,country,timezone,type,load_date,update_date,row_hash)
+VALUES (s.loc_id,s.name,s.city,s.state,s.country,s.timezone,s.type,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()),s.src_hash);
 
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').DIM_LANE t
-USING IDENTIFIER('<STG_SCHEMA>').DIM_LANE s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(lane_id,origin_loc_id,dest_loc_id,standard_miles,std_transit_days))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').DIM_LANE) s
 ON t.lane_id = s.lane_id
-WHEN MATCHED THEN UPDATE SET origin_loc_id=s.origin_loc_id, dest_loc_id=s.dest_loc_id, standard_miles=s.standard_miles, std_transit_days=s.std_transit_days, update_date=s.update_date
-WHEN NOT MATCHED THEN INSERT (lane_id,origin_loc_id,dest_loc_id,standard_miles,std_transit_days,load_date,update_date)
-VALUES (s.lane_id,s.origin_loc_id,s.dest_loc_id,s.standard_miles,s.std_transit_days,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()));
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET origin_loc_id=s.origin_loc_id, dest_loc_id=s.dest_loc_id, standard_miles=s.standard_miles, std_transit_days=s.std_transit_days, update_date=s.update_date, row_hash=s.src_hash
+WHEN NOT MATCHED THEN INSERT (lane_id,origin_loc_id,dest_loc_id,standard_miles,std_transit_days,load_date,update_date,row_hash)
+VALUES (s.lane_id,s.origin_loc_id,s.dest_loc_id,s.standard_miles,s.std_transit_days,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()),s.src_hash);
 
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').DIM_DATE t
-USING IDENTIFIER('<STG_SCHEMA>').DIM_DATE s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(date_key,date,year,quarter,month,week,dow,is_weekend))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').DIM_DATE) s
 ON t.date_key = s.date_key
-WHEN MATCHED THEN UPDATE SET date=s.date, year=s.year, quarter=s.quarter, month=s.month, week=s.week, dow=s.dow, is_weekend=s.is_weekend, update_date=s.update_date
-WHEN NOT MATCHED THEN INSERT (date_key,date,year,quarter,month,week,dow,is_weekend,load_date,update_date)
-VALUES (s.date_key,s.date,s.year,s.quarter,s.month,s.week,s.dow,s.is_weekend,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()));
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET date=s.date, year=s.year, quarter=s.quarter, month=s.month, week=s.week, dow=s.dow, is_weekend=s.is_weekend, update_date=s.update_date, row_hash=s.src_hash
+WHEN NOT MATCHED THEN INSERT (date_key,date,year,quarter,month,week,dow,is_weekend,load_date,update_date,row_hash)
+VALUES (s.date_key,s.date,s.year,s.quarter,s.month,s.week,s.dow,s.is_weekend,COALESCE(s.load_date,CURRENT_TIMESTAMP()),COALESCE(s.update_date,CURRENT_TIMESTAMP()),s.src_hash);
 
 -- 2) Normalize types and compute flags for shipments
 CREATE OR REPLACE TEMP TABLE TMP_FACT_SHIPMENT AS
@@ -85,13 +86,20 @@ SELECT
   ) AS isotif,
   cancel_flag,
   load_date,
-  update_date
+  update_date,
+  -- Source hash plus the flag rule, so changing the grace minutes rewrites every row once
+  MD5(COALESCE(row_hash, TO_VARCHAR(HASH(
+    shipment_id, leg_id, customer_id, carrier_id, equipment_id, origin_loc_id, dest_loc_id, lane_id,
+    tender_ts, pickup_plan_ts, pickup_actual_ts, delivery_plan_ts, delivery_actual_ts,
+    planned_miles, actual_miles, pieces, weight_lbs, cube, revenue, total_cost, fuel_surcharge, accessorial_cost,
+    status, isinfull, cancel_flag
+  ))) || '|grace=60') AS row_hash
 FROM IDENTIFIER('<STG_SCHEMA>').FACT_SHIPMENT;
 
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').FACT_SHIPMENT t
 USING TMP_FACT_SHIPMENT s
 ON t.shipment_id = s.shipment_id AND t.leg_id = s.leg_id
-WHEN MATCHED AND s.update_date >= t.update_date THEN UPDATE SET
+WHEN MATCHED AND s.update_date >= t.update_date AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
   customer_id=s.customer_id, carrier_id=s.carrier_id, equipment_id=s.equipment_id,
   origin_loc_id=s.origin_loc_id, dest_loc_id=s.dest_loc_id, lane_id=s.lane_id,
   tender_ts=s.tender_ts, pickup_plan_ts=s.pickup_plan_ts, pickup_actual_ts=s.pickup_actual_ts,
@@ -99,35 +107,190 @@ WHEN MATCHED AND s.update_date >= t.update_date THEN UPDATE SET
   planned_miles=s.planned_miles, actual_miles=s.actual_miles, pieces=s.pieces, weight_lbs=s.weight_lbs, cube=s.cube,
   revenue=s.revenue, total_cost=s.total_cost, fuel_surcharge=s.fuel_surcharge, accessorial_cost=s.accessorial_cost,
   status=s.status, isdeliveredontime=s.isdeliveredontime, isinfull=s.isinfull, isotif=s.isotif,
-  cancel_flag=s.cancel_flag, update_date=s.update_date
+  cancel_flag=s.cancel_flag, update_date=s.update_date, row_hash=s.row_hash
 WHEN NOT MATCHED THEN INSERT (
   shipment_id, leg_id, customer_id, carrier_id, equipment_id, origin_loc_id, dest_loc_id, lane_id,
   tender_ts, pickup_plan_ts, pickup_actual_ts, delivery_plan_ts, delivery_actual_ts,
   planned_miles, actual_miles, pieces, weight_lbs, cube, revenue, total_cost, fuel_surcharge, accessorial_cost,
-  status, isdeliveredontime, isinfull, isotif, cancel_flag, load_date, update_date
+  status, isdeliveredontime, isinfull, isotif, cancel_flag, load_date, update_date, row_hash
 ) VALUES (
   s.shipment_id, s.leg_id, s.customer_id, s.carrier_id, s.equipment_id, s.origin_loc_id, s.dest_loc_id, s.lane_id,
   s.tender_ts, s.pickup_plan_ts, s.pickup_actual_ts, s.delivery_plan_ts, s.delivery_actual_ts,
   s.planned_miles, s.actual_miles, s.pieces, s.weight_lbs, s.cube, s.revenue, s.total_cost, s.fuel_surcharge, s.accessorial_cost,
-  s.status, s.isdeliveredontime, s.isinfull, s.isotif, s.cancel_flag, s.load_date, s.update_date
+  s.status, s.isdeliveredontime, s.isinfull, s.isotif, s.cancel_flag, s.load_date, s.update_date, s.row_hash
 );
 
 -- 3) Events and Costs (pass-through upserts)
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').FACT_EVENT t
-USING IDENTIFIER('<STG_SCHEMA>').FACT_EVENT s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(shipment_id,event_seq,event_type,event_ts,facility_loc_id,notes))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').FACT_EVENT) s
 ON t.shipment_id = s.shipment_id AND t.event_seq = s.event_seq
-WHEN MATCHED AND s.update_date >= t.update_date THEN
-  UPDATE SET event_type=s.event_type, event_ts=s.event_ts, facility_loc_id=s.facility_loc_id, notes=s.notes, update_date=s.update_date
+WHEN MATCHED AND s.update_date >= t.update_date AND t.row_hash IS DISTINCT FROM s.src_hash THEN
+  UPDATE SET event_type=s.event_type, event_ts=s.event_ts, facility_loc_id=s.facility_loc_id, notes=s.notes, update_date=s.update_date, row_hash=s.src_hash
 WHEN NOT MATCHED THEN
-  INSERT (shipment_id,event_seq,event_type,event_ts,facility_loc_id,notes,load_date,update_date)
-  VALUES (s.shipment_id,s.event_seq,s.event_type,s.event_ts,s.facility_loc_id,s.notes,s.load_date,s.update_date);
+  INSERT (shipment_id,event_seq,event_type,event_ts,facility_loc_id,notes,load_date,update_date,row_hash)
+  VALUES (s.shipment_id,s.event_seq,s.event_type,s.event_ts,s.facility_loc_id,s.notes,s.load_date,s.update_date,s.src_hash);
 
 MERGE INTO IDENTIFIER('<EDW_SCHEMA>').FACT_COST t
-USING IDENTIFIER('<STG_SCHEMA>').FACT_COST s
+USING (SELECT *, COALESCE(row_hash, TO_VARCHAR(HASH(shipment_id,cost_type,calc_method,rate_ref,cost_amount,currency))) AS src_hash FROM IDENTIFIER('<STG_SCHEMA>').FACT_COST) s
 ON t.shipment_id = s.shipment_id AND NVL(t.rate_ref,'') = NVL(s.rate_ref,'') AND t.cost_type = s.cost_type
-WHEN MATCHED AND s.update_date >= t.update_date THEN
-  UPDATE SET calc_method=s.calc_method, cost_amount=s.cost_amount, currency=s.currency, update_date=s.update_date
+WHEN MATCHED AND s.update_date >= t.update_date AND t.row_hash IS DISTINCT FROM s.src_hash THEN
+  UPDATE SET calc_method=s.calc_method, cost_amount=s.cost_amount, currency=s.currency, update_date=s.update_date, row_hash=s.src_hash
 WHEN NOT MATCHED THEN
-  INSERT (shipment_id,cost_type,calc_method,rate_ref,cost_amount,currency,load_date,update_date)
-  VALUES (s.shipment_id,s.cost_type,s.calc_method,s.rate_ref,s.cost_amount,s.currency,s.load_date,s.update_date);
+  INSERT (shipment_id,cost_type,calc_method,rate_ref,cost_amount,currency,load_date,update_date,row_hash)
+  VALUES (s.shipment_id,s.cost_type,s.calc_method,s.rate_ref,s.cost_amount,s.currency,s.load_date,s.update_date,s.src_hash);
 
+-- 4) Shipment milestone snapshot for this batch's shipments, from their full EDW event history
+-- (same MERGE as snowflake/10_shipment_milestone.sql)
+ALTER SESSION SET TIMESTAMP_INPUT_FORMAT = 'AUTO';
+
+MERGE INTO IDENTIFIER('<EDW_SCHEMA>.FACT_SHIPMENT_MILESTONE') t
+USING (
+  WITH touched AS (
+    SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_EVENT')
+    UNION
+    SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_SHIPMENT')
+  ),
+  ev AS (
+    SELECT e.shipment_id, e.event_seq, e.event_type, e.notes,
+           TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(e.event_ts::VARCHAR), '')) AS event_ts
+    FROM IDENTIFIER('<EDW_SCHEMA>.FACT_EVENT') e
+    JOIN touched USING (shipment_id)
+  ),
+  dwell_seq AS (
+    SELECT shipment_id, event_type, event_ts,
+           ROW_NUMBER() OVER (PARTITION BY shipment_id, event_type ORDER BY event_ts, event_seq) AS n
+    FROM ev
+    WHERE event_type IN ('DwellStart', 'DwellEnd')
+  ),
+  dwell AS (
+    SELECT b.shipment_id, SUM(FLOOR(DATEDIFF('second', b.event_ts, d.event_ts) / 60)) AS dwell_minutes
+    FROM dwell_seq b
+    JOIN dwell_seq d ON d.shipment_id = b.shipment_id AND d.n = b.n AND d.event_type = 'DwellEnd'
+    WHERE b.event_type = 'DwellStart'
+    GROUP BY b.shipment_id
+  ),
+  agg AS (
+    SELECT shipment_id,
+           MIN(IFF(event_type = 'Tendered', event_ts, NULL)) AS tendered_ts,
+           MIN(IFF(event_type = 'Accepted', event_ts, NULL)) AS accepted_ts,
+           MIN(IFF(event_type = 'PickedUp', event_ts, NULL)) AS picked_up_ts,
+           MIN(IFF(event_type = 'AtDest', event_ts, NULL)) AS at_dest_ts,
+           MIN(IFF(event_type = 'Delivered', event_ts, NULL)) AS delivered_ts,
+           COUNT_IF(event_type = 'Exception') AS exception_count
+    FROM ev
+    GROUP BY shipment_id
+  ),
+  first_ex AS (
+    SELECT shipment_id, COALESCE(NULLIF(TRIM(notes), ''), 'Unknown') AS first_exception_type
+    FROM ev
+    WHERE event_type = 'Exception'
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY shipment_id ORDER BY event_ts, event_seq) = 1
+  ),
+  leg AS (
+    SELECT f.shipment_id, f.customer_id, f.carrier_id, f.equipment_id, f.lane_id,
+           CAST(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts::VARCHAR), '')) AS DATE) AS delivery_date
+    FROM IDENTIFIER('<EDW_SCHEMA>.FACT_SHIPMENT') f
+    JOIN touched USING (shipment_id)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY f.shipment_id ORDER BY f.leg_id) = 1
+  )
+  SELECT
+    l.shipment_id, l.customer_id, l.carrier_id, l.equipment_id, l.lane_id, l.delivery_date,
+    a.tendered_ts, a.accepted_ts, a.picked_up_ts, a.at_dest_ts, a.delivered_ts,
+    d.dwell_minutes,
+    COALESCE(a.exception_count, 0) AS exception_count,
+    x.first_exception_type,
+    TO_VARCHAR(HASH(
+      l.shipment_id, l.customer_id, l.carrier_id, l.equipment_id, l.lane_id, l.delivery_date,
+      a.tendered_ts, a.accepted_ts, a.picked_up_ts, a.at_dest_ts, a.delivered_ts,
+      d.dwell_minutes, a.exception_count, x.first_exception_type
+    )) AS src_hash
+  FROM leg l
+  LEFT JOIN agg a ON a.shipment_id = l.shipment_id
+  LEFT JOIN dwell d ON d.shipment_id = l.shipment_id
+  LEFT JOIN first_ex x ON x.shipment_id = l.shipment_id
+) s
+ON t.shipment_id = s.shipment_id
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET
+  customer_id = s.customer_id,
+  carrier_id = s.carrier_id,
+  equipment_id = s.equipment_id,
+  lane_id = s.lane_id,
+  delivery_date = s.delivery_date,
+  tendered_ts = s.tendered_ts,
+  accepted_ts = s.accepted_ts,
+  picked_up_ts = s.picked_up_ts,
+  at_dest_ts = s.at_dest_ts,
+  delivered_ts = s.delivered_ts,
+  dwell_minutes = s.dwell_minutes,
+  exception_count = s.exception_count,
+  first_exception_type = s.first_exception_type,
+  update_date = CURRENT_TIMESTAMP(),
+  row_hash = s.src_hash
+WHEN NOT MATCHED THEN INSERT (
+  shipment_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+  tendered_ts, accepted_ts, picked_up_ts, at_dest_ts, delivered_ts,
+  dwell_minutes, exception_count, first_exception_type, load_date, update_date, row_hash
+) VALUES (
+  s.shipment_id, s.customer_id, s.carrier_id, s.equipment_id, s.lane_id, s.delivery_date,
+  s.tendered_ts, s.accepted_ts, s.picked_up_ts, s.at_dest_ts, s.delivered_ts,
+  s.dwell_minutes, s.exception_count, s.first_exception_type,
+  CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP(), s.src_hash
+);
+
+-- 5) Refresh the typed serving layer read by the Streamlit app for this batch's shipments
+-- (same MERGEs as snowflake/07_typed_serving.sql, which creates the tables). Rows whose EDW
+-- row_hash did not change are skipped, so an unchanged batch leaves the typed tables, and the
+-- app's result cache, untouched. 20_compact_keys.sql refreshes the *_COMPACT tables from these.
+MERGE INTO IDENTIFIER('<EDW_SCHEMA>.FACT_SHIPMENT_TYPED') t
+USING (
+  SELECT
+    f.shipment_id, f.leg_id, f.customer_id, f.carrier_id, f.equipment_id, f.origin_loc_id, f.dest_loc_id, f.lane_id,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.tender_ts::VARCHAR), '')) AS tender_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.pickup_plan_ts::VARCHAR), '')) AS pickup_plan_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.pickup_actual_ts::VARCHAR), '')) AS pickup_actual_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_plan_ts::VARCHAR), '')) AS delivery_plan_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts::VARCHAR), '')) AS delivery_actual_ts,
+    f.planned_miles, f.actual_miles, f.pieces, f.weight_lbs, f.cube, f.revenue, f.total_cost, f.fuel_surcharge, f.accessorial_cost,
+    f.status, f.isdeliveredontime, f.isinfull, f.isotif, f.cancel_flag, f.load_date, f.update_date,
+    COALESCE(f.row_hash, TO_VARCHAR(HASH(f.*))) AS row_hash
+  FROM IDENTIFIER('<EDW_SCHEMA>.FACT_SHIPMENT') f
+  JOIN (SELECT DISTINCT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_SHIPMENT')) b USING (shipment_id)
+) s
+ON t.shipment_id = s.shipment_id AND t.leg_id = s.leg_id
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  customer_id=s.customer_id, carrier_id=s.carrier_id, equipment_id=s.equipment_id,
+  origin_loc_id=s.origin_loc_id, dest_loc_id=s.dest_loc_id, lane_id=s.lane_id,
+  tender_ts=s.tender_ts, pickup_plan_ts=s.pickup_plan_ts, pickup_actual_ts=s.pickup_actual_ts,
+  delivery_plan_ts=s.delivery_plan_ts, delivery_actual_ts=s.delivery_actual_ts, delivery_date=CAST(s.delivery_actual_ts AS DATE),
+  planned_miles=s.planned_miles, actual_miles=s.actual_miles, pieces=s.pieces, weight_lbs=s.weight_lbs, cube=s.cube,
+  revenue=s.revenue, total_cost=s.total_cost, fuel_surcharge=s.fuel_surcharge, accessorial_cost=s.accessorial_cost,
+  status=s.status, isdeliveredontime=s.isdeliveredontime, isinfull=s.isinfull, isotif=s.isotif,
+  cancel_flag=s.cancel_flag, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (
+  shipment_id, leg_id, customer_id, carrier_id, equipment_id, origin_loc_id, dest_loc_id, lane_id,
+  tender_ts, pickup_plan_ts, pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, delivery_date,
+  planned_miles, actual_miles, pieces, weight_lbs, cube, revenue, total_cost, fuel_surcharge, accessorial_cost,
+  status, isdeliveredontime, isinfull, isotif, cancel_flag, load_date, update_date, row_hash
+) VALUES (
+  s.shipment_id, s.leg_id, s.customer_id, s.carrier_id, s.equipment_id, s.origin_loc_id, s.dest_loc_id, s.lane_id,
+  s.tender_ts, s.pickup_plan_ts, s.pickup_actual_ts, s.delivery_plan_ts, s.delivery_actual_ts, CAST(s.delivery_actual_ts AS DATE),
+  s.planned_miles, s.actual_miles, s.pieces, s.weight_lbs, s.cube, s.revenue, s.total_cost, s.fuel_surcharge, s.accessorial_cost,
+  s.status, s.isdeliveredontime, s.isinfull, s.isotif, s.cancel_flag, s.load_date, s.update_date, s.row_hash
+);
+
+MERGE INTO IDENTIFIER('<EDW_SCHEMA>.FACT_EVENT_TYPED') t
+USING (
+  SELECT
+    e.shipment_id, e.event_seq, e.event_type,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(e.event_ts::VARCHAR), '')) AS event_ts,
+    e.facility_loc_id, e.notes, e.load_date, e.update_date,
+    COALESCE(e.row_hash, TO_VARCHAR(HASH(e.*))) AS row_hash
+  FROM IDENTIFIER('<EDW_SCHEMA>.FACT_EVENT') e
+  JOIN (SELECT DISTINCT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_EVENT')) b USING (shipment_id)
+) s
+ON t.shipment_id = s.shipment_id AND t.event_seq = s.event_seq
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  event_type=s.event_type, event_ts=s.event_ts, facility_loc_id=s.facility_loc_id, notes=s.notes,
+  load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (shipment_id, event_seq, event_type, event_ts, facility_loc_id, notes, load_date, update_date, row_hash)
+VALUES (s.shipment_id, s.event_seq, s.event_type, s.event_ts, s.facility_loc_id, s.notes, s.load_date, s.update_date, s.row_hash);
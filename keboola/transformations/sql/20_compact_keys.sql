@@ -0,0 +1,115 @@
+-- Compact-key serving layer refresh (optional second transformation, after 10_curate_edw.sql).
+-- Only for compact-key mode: apply snowflake/09_compact_keys.sql once first (it creates the
+-- key and code dimensions this step extends). Keys already assigned are never changed, so
+-- the compact facts stay joinable across runs; new IDs and code values get the next numbers.
+-- The compact facts are MERGEd for the shipments of this batch only (those in STG), and a row
+-- is rewritten only when its typed/EDW row_hash changed, so an unchanged batch writes nothing.
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+-- Shipments of this batch: the only ones whose keys or compact rows can change
+CREATE OR REPLACE TEMP TABLE TMP_COMPACT_BATCH AS
+SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_SHIPMENT') WHERE shipment_id IS NOT NULL
+UNION SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_EVENT') WHERE shipment_id IS NOT NULL
+UNION SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_COST') WHERE shipment_id IS NOT NULL;
+
+-- Refresh: new shipment IDs and code values get the next free numbers (in ID/value order)
+INSERT INTO DIM_SHIPMENT (shipment_key, shipment_id)
+SELECT COALESCE(m.max_key, 0) + ROW_NUMBER() OVER (ORDER BY n.shipment_id), n.shipment_id
+FROM TMP_COMPACT_BATCH n
+CROSS JOIN (SELECT MAX(shipment_key) AS max_key FROM DIM_SHIPMENT) m
+WHERE NOT EXISTS (SELECT 1 FROM DIM_SHIPMENT k WHERE k.shipment_id = n.shipment_id);
+
+INSERT INTO DIM_STATUS (status_code, status)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.status), n.status
+FROM (SELECT DISTINCT status FROM FACT_SHIPMENT WHERE status IS NOT NULL) n
+CROSS JOIN (SELECT MAX(status_code) AS max_code FROM DIM_STATUS) m
+WHERE n.status NOT IN (SELECT status FROM DIM_STATUS);
+
+INSERT INTO DIM_EVENT_TYPE (event_type_code, event_type)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.event_type), n.event_type
+FROM (SELECT DISTINCT event_type FROM FACT_EVENT WHERE event_type IS NOT NULL) n
+CROSS JOIN (SELECT MAX(event_type_code) AS max_code FROM DIM_EVENT_TYPE) m
+WHERE n.event_type NOT IN (SELECT event_type FROM DIM_EVENT_TYPE);
+
+INSERT INTO DIM_COST_TYPE (cost_type_code, cost_type)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.cost_type), n.cost_type
+FROM (SELECT DISTINCT cost_type FROM FACT_COST WHERE cost_type IS NOT NULL) n
+CROSS JOIN (SELECT MAX(cost_type_code) AS max_code FROM DIM_COST_TYPE) m
+WHERE n.cost_type NOT IN (SELECT cost_type FROM DIM_COST_TYPE);
+
+INSERT INTO DIM_CALC_METHOD (calc_method_code, calc_method)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.calc_method), n.calc_method
+FROM (SELECT DISTINCT calc_method FROM FACT_COST WHERE calc_method IS NOT NULL) n
+CROSS JOIN (SELECT MAX(calc_method_code) AS max_code FROM DIM_CALC_METHOD) m
+WHERE n.calc_method NOT IN (SELECT calc_method FROM DIM_CALC_METHOD);
+
+MERGE INTO FACT_SHIPMENT_COMPACT t
+USING (
+  SELECT
+    k.shipment_key, f.leg_id, f.customer_id, f.carrier_id, f.equipment_id, f.origin_loc_id,
+    f.dest_loc_id, f.lane_id, f.tender_ts, f.pickup_plan_ts, f.pickup_actual_ts, f.delivery_plan_ts,
+    f.delivery_actual_ts, f.delivery_date, f.planned_miles, f.actual_miles, f.pieces, f.weight_lbs,
+    f.cube, f.revenue, f.total_cost, f.fuel_surcharge, f.accessorial_cost, sc.status_code,
+    f.isdeliveredontime, f.isinfull, f.isotif, f.cancel_flag, f.load_date, f.update_date, f.row_hash
+  FROM FACT_SHIPMENT_TYPED f
+  JOIN DIM_SHIPMENT k ON k.shipment_id = f.shipment_id
+  JOIN TMP_COMPACT_BATCH b ON b.shipment_id = f.shipment_id
+  LEFT JOIN DIM_STATUS sc ON sc.status = f.status
+) s
+ON t.shipment_key = s.shipment_key AND t.leg_id = s.leg_id
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  customer_id=s.customer_id, carrier_id=s.carrier_id, equipment_id=s.equipment_id,
+  origin_loc_id=s.origin_loc_id, dest_loc_id=s.dest_loc_id, lane_id=s.lane_id, tender_ts=s.tender_ts,
+  pickup_plan_ts=s.pickup_plan_ts, pickup_actual_ts=s.pickup_actual_ts,
+  delivery_plan_ts=s.delivery_plan_ts, delivery_actual_ts=s.delivery_actual_ts,
+  delivery_date=s.delivery_date, planned_miles=s.planned_miles, actual_miles=s.actual_miles,
+  pieces=s.pieces, weight_lbs=s.weight_lbs, cube=s.cube, revenue=s.revenue, total_cost=s.total_cost,
+  fuel_surcharge=s.fuel_surcharge, accessorial_cost=s.accessorial_cost, status_code=s.status_code,
+  isdeliveredontime=s.isdeliveredontime, isinfull=s.isinfull, isotif=s.isotif,
+  cancel_flag=s.cancel_flag, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (
+  shipment_key, leg_id, customer_id, carrier_id, equipment_id, origin_loc_id, dest_loc_id, lane_id,
+  tender_ts, pickup_plan_ts, pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, delivery_date,
+  planned_miles, actual_miles, pieces, weight_lbs, cube, revenue, total_cost, fuel_surcharge,
+  accessorial_cost, status_code, isdeliveredontime, isinfull, isotif, cancel_flag, load_date,
+  update_date, row_hash
+) VALUES (
+  s.shipment_key, s.leg_id, s.customer_id, s.carrier_id, s.equipment_id, s.origin_loc_id,
+  s.dest_loc_id, s.lane_id, s.tender_ts, s.pickup_plan_ts, s.pickup_actual_ts, s.delivery_plan_ts,
+  s.delivery_actual_ts, s.delivery_date, s.planned_miles, s.actual_miles, s.pieces, s.weight_lbs,
+  s.cube, s.revenue, s.total_cost, s.fuel_surcharge, s.accessorial_cost, s.status_code,
+  s.isdeliveredontime, s.isinfull, s.isotif, s.cancel_flag, s.load_date, s.update_date, s.row_hash
+);
+
+MERGE INTO FACT_EVENT_COMPACT t
+USING (
+  SELECT k.shipment_key, e.event_seq, et.event_type_code, e.event_ts, e.facility_loc_id, e.notes,
+         e.load_date, e.update_date, e.row_hash
+  FROM FACT_EVENT_TYPED e
+  JOIN DIM_SHIPMENT k ON k.shipment_id = e.shipment_id
+  JOIN TMP_COMPACT_BATCH b ON b.shipment_id = e.shipment_id
+  LEFT JOIN DIM_EVENT_TYPE et ON et.event_type = e.event_type
+) s
+ON t.shipment_key = s.shipment_key AND t.event_seq = s.event_seq
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  event_type_code=s.event_type_code, event_ts=s.event_ts, facility_loc_id=s.facility_loc_id, notes=s.notes, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (shipment_key, event_seq, event_type_code, event_ts, facility_loc_id, notes, load_date, update_date, row_hash)
+VALUES (s.shipment_key, s.event_seq, s.event_type_code, s.event_ts, s.facility_loc_id, s.notes, s.load_date, s.update_date, s.row_hash);
+
+MERGE INTO FACT_COST_COMPACT t
+USING (
+  SELECT k.shipment_key, ct.cost_type_code, cm.calc_method_code, c.rate_ref, c.cost_amount, c.currency,
+         c.load_date, c.update_date, COALESCE(c.row_hash, TO_VARCHAR(HASH(c.*))) AS row_hash
+  FROM FACT_COST c
+  JOIN DIM_SHIPMENT k ON k.shipment_id = c.shipment_id
+  JOIN TMP_COMPACT_BATCH b ON b.shipment_id = c.shipment_id
+  LEFT JOIN DIM_COST_TYPE ct ON ct.cost_type = c.cost_type
+  LEFT JOIN DIM_CALC_METHOD cm ON cm.calc_method = c.calc_method
+) s
+ON t.shipment_key = s.shipment_key AND t.cost_type_code = s.cost_type_code AND NVL(t.rate_ref, '') = NVL(s.rate_ref, '')
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  calc_method_code=s.calc_method_code, cost_amount=s.cost_amount, currency=s.currency, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (shipment_key, cost_type_code, rate_ref, calc_method_code, cost_amount, currency, load_date, update_date, row_hash)
+VALUES (s.shipment_key, s.cost_type_code, s.rate_ref, s.calc_method_code, s.cost_amount, s.currency, s.load_date, s.update_date, s.row_hash);
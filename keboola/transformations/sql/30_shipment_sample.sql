@@ -0,0 +1,70 @@
+-- Stratified shipment sample refresh (optional transformation, after 10_curate_edw.sql).
+-- Only for the app's approximate mode with a pre-built sample: apply snowflake/11_shipment_sample.sql
+-- once first; it defines the sampling rule (1% of each lane × customer stratum, at least 30 legs).
+-- A batch changes the size, and so every weight, of the strata its legs belong to: those strata
+-- are recomputed whole from the typed layer and MERGEd, a row is rewritten only when its
+-- row_hash changed and legs that left the sample are deleted, so an unchanged batch writes
+-- nothing. The strata are the batch legs' current ones plus any whose leg count no longer
+-- matches the sample's (legs that moved out of them); counting reads two columns of the fact.
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+-- Strata of this batch's legs, and strata whose size changed (the sample's weights add up to it)
+CREATE OR REPLACE TEMP TABLE TMP_SAMPLE_STRATA AS
+SELECT f.lane_id, f.customer_id
+FROM FACT_SHIPMENT_TYPED f
+JOIN (SELECT DISTINCT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_SHIPMENT')) b ON b.shipment_id = f.shipment_id
+UNION
+SELECT COALESCE(n.lane_id, p.lane_id), COALESCE(n.customer_id, p.customer_id)
+FROM (SELECT lane_id, customer_id, COUNT(*) AS legs FROM FACT_SHIPMENT_TYPED GROUP BY lane_id, customer_id) n
+FULL OUTER JOIN (
+  SELECT lane_id, customer_id, ROUND(SUM(sample_weight)) AS legs FROM FACT_SHIPMENT_SAMPLE GROUP BY lane_id, customer_id
+) p ON EQUAL_NULL(n.lane_id, p.lane_id) AND EQUAL_NULL(n.customer_id, p.customer_id)
+WHERE n.legs IS DISTINCT FROM p.legs;
+
+MERGE INTO FACT_SHIPMENT_SAMPLE t
+USING (
+  WITH strata AS (
+    SELECT
+      f.shipment_id, f.leg_id, f.customer_id, f.carrier_id, f.equipment_id, f.lane_id, f.delivery_date,
+      f.pickup_actual_ts, f.delivery_plan_ts, f.delivery_actual_ts, f.row_hash,
+      COUNT(*) OVER (PARTITION BY f.lane_id, f.customer_id) AS stratum_rows,
+      ROW_NUMBER() OVER (PARTITION BY f.lane_id, f.customer_id ORDER BY HASH(f.shipment_id, f.leg_id, 7)) AS stratum_rank
+    FROM FACT_SHIPMENT_TYPED f
+    JOIN TMP_SAMPLE_STRATA b ON EQUAL_NULL(b.lane_id, f.lane_id) AND EQUAL_NULL(b.customer_id, f.customer_id)
+  ), sized AS (
+    SELECT s.*, LEAST(stratum_rows, GREATEST(30, CEIL(stratum_rows * 0.01))) AS stratum_keep
+    FROM strata s
+  ), kept AS (
+    SELECT
+      shipment_id, leg_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+      pickup_actual_ts, delivery_plan_ts, delivery_actual_ts,
+      stratum_rows::FLOAT / stratum_keep AS sample_weight,
+      TO_VARCHAR(HASH(row_hash, stratum_rows::FLOAT / stratum_keep)) AS row_hash
+    FROM sized
+    WHERE stratum_rank <= stratum_keep
+  )
+  SELECT k.*, FALSE AS dropped FROM kept k
+  UNION ALL
+  -- Sampled legs of these strata that are no longer kept
+  SELECT
+    p.shipment_id, p.leg_id, p.customer_id, p.carrier_id, p.equipment_id, p.lane_id, p.delivery_date,
+    p.pickup_actual_ts, p.delivery_plan_ts, p.delivery_actual_ts, p.sample_weight, p.row_hash, TRUE
+  FROM FACT_SHIPMENT_SAMPLE p
+  JOIN TMP_SAMPLE_STRATA b ON EQUAL_NULL(b.lane_id, p.lane_id) AND EQUAL_NULL(b.customer_id, p.customer_id)
+  WHERE NOT EXISTS (SELECT 1 FROM kept k WHERE k.shipment_id = p.shipment_id AND k.leg_id = p.leg_id)
+) s
+ON t.shipment_id = s.shipment_id AND t.leg_id = s.leg_id
+WHEN MATCHED AND s.dropped THEN DELETE
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  customer_id=s.customer_id, carrier_id=s.carrier_id, equipment_id=s.equipment_id, lane_id=s.lane_id,
+  delivery_date=s.delivery_date, pickup_actual_ts=s.pickup_actual_ts, delivery_plan_ts=s.delivery_plan_ts,
+  delivery_actual_ts=s.delivery_actual_ts, sample_weight=s.sample_weight, row_hash=s.row_hash
+WHEN NOT MATCHED AND NOT s.dropped THEN INSERT (
+  shipment_id, leg_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+  pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, sample_weight, row_hash
+) VALUES (
+  s.shipment_id, s.leg_id, s.customer_id, s.carrier_id, s.equipment_id, s.lane_id, s.delivery_date,
+  s.pickup_actual_ts, s.delivery_plan_ts, s.delivery_actual_ts, s.sample_weight, s.row_hash
+);
@@ -0,0 +1,102 @@
+-- Daily summary refresh (optional transformation, after 10_curate_edw.sql).
+-- Only when the app should read percentiles from FACT_SHIPMENT_DAILY: apply
+-- snowflake/12_shipment_daily.sql once first; it defines the grain (delivery_date × lane × carrier)
+-- and the t-digest sketch columns. The cells of the batch's delivery days are recomputed whole
+-- from the typed layer and the milestone snapshot and MERGEd; a cell is rewritten only when the
+-- legs or shipments under it changed (row_hash) and cells left empty are deleted, so an
+-- unchanged batch writes nothing. The days are those of the batch's legs and shipments plus any
+-- whose leg or dwell count no longer matches the summary (legs that moved to another day).
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+-- Delivery days of this batch, and days whose counts changed
+CREATE OR REPLACE TEMP TABLE TMP_DAILY_DATES AS
+WITH batch AS (
+  SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_SHIPMENT') WHERE shipment_id IS NOT NULL
+  UNION SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_EVENT') WHERE shipment_id IS NOT NULL
+), counts AS (
+  SELECT delivery_date, SUM(legs) AS legs, SUM(dwell_shipments) AS dwell_shipments
+  FROM (
+    SELECT delivery_date, COUNT(*) AS legs, 0 AS dwell_shipments
+    FROM FACT_SHIPMENT_TYPED
+    WHERE delivery_date IS NOT NULL AND pickup_actual_ts IS NOT NULL
+    GROUP BY delivery_date
+    UNION ALL
+    SELECT delivery_date, 0, COUNT(*)
+    FROM FACT_SHIPMENT_MILESTONE
+    WHERE delivery_date IS NOT NULL AND dwell_minutes IS NOT NULL
+    GROUP BY delivery_date
+  ) c
+  GROUP BY delivery_date
+)
+SELECT f.delivery_date FROM FACT_SHIPMENT_TYPED f JOIN batch b ON b.shipment_id = f.shipment_id WHERE f.delivery_date IS NOT NULL
+UNION
+SELECT m.delivery_date FROM FACT_SHIPMENT_MILESTONE m JOIN batch b ON b.shipment_id = m.shipment_id WHERE m.delivery_date IS NOT NULL
+UNION
+SELECT COALESCE(n.delivery_date, p.delivery_date)
+FROM counts n
+FULL OUTER JOIN (
+  SELECT delivery_date, SUM(legs) AS legs, SUM(dwell_shipments) AS dwell_shipments
+  FROM FACT_SHIPMENT_DAILY
+  GROUP BY delivery_date
+) p ON p.delivery_date = n.delivery_date
+WHERE n.legs IS DISTINCT FROM p.legs OR n.dwell_shipments IS DISTINCT FROM p.dwell_shipments;
+
+MERGE INTO FACT_SHIPMENT_DAILY t
+USING (
+  WITH legs AS (
+    SELECT f.delivery_date, f.lane_id, f.carrier_id,
+           COUNT(*) AS legs,
+           APPROX_PERCENTILE_ACCUMULATE(DATEDIFF('minute', f.pickup_actual_ts, f.delivery_actual_ts) / 60) AS transit_hours_sketch,
+           HASH_AGG(f.row_hash) AS legs_hash
+    FROM FACT_SHIPMENT_TYPED f
+    JOIN TMP_DAILY_DATES b ON b.delivery_date = f.delivery_date
+    WHERE f.pickup_actual_ts IS NOT NULL
+    GROUP BY f.delivery_date, f.lane_id, f.carrier_id
+  ), dwell AS (
+    SELECT m.delivery_date, m.lane_id, m.carrier_id,
+           COUNT(*) AS dwell_shipments,
+           APPROX_PERCENTILE_ACCUMULATE(m.dwell_minutes) AS dwell_minutes_sketch,
+           HASH_AGG(m.row_hash) AS dwell_hash
+    FROM FACT_SHIPMENT_MILESTONE m
+    JOIN TMP_DAILY_DATES b ON b.delivery_date = m.delivery_date
+    WHERE m.dwell_minutes IS NOT NULL
+    GROUP BY m.delivery_date, m.lane_id, m.carrier_id
+  ), cells AS (
+    SELECT
+      COALESCE(l.delivery_date, d.delivery_date) AS delivery_date,
+      COALESCE(l.lane_id, d.lane_id) AS lane_id,
+      COALESCE(l.carrier_id, d.carrier_id) AS carrier_id,
+      COALESCE(l.legs, 0) AS legs,
+      l.transit_hours_sketch,
+      COALESCE(d.dwell_shipments, 0) AS dwell_shipments,
+      d.dwell_minutes_sketch,
+      TO_VARCHAR(HASH(l.legs_hash, d.dwell_hash)) AS row_hash
+    FROM legs l
+    FULL OUTER JOIN dwell d
+      ON d.delivery_date = l.delivery_date AND d.lane_id = l.lane_id AND d.carrier_id = l.carrier_id
+  )
+  SELECT c.*, FALSE AS dropped FROM cells c
+  UNION ALL
+  -- Cells of these days with no legs or dwell left
+  SELECT
+    p.delivery_date, p.lane_id, p.carrier_id, p.legs, p.transit_hours_sketch, p.dwell_shipments,
+    p.dwell_minutes_sketch, p.row_hash, TRUE
+  FROM FACT_SHIPMENT_DAILY p
+  JOIN TMP_DAILY_DATES b ON b.delivery_date = p.delivery_date
+  WHERE NOT EXISTS (
+    SELECT 1 FROM cells c
+    WHERE c.delivery_date = p.delivery_date AND EQUAL_NULL(c.lane_id, p.lane_id) AND EQUAL_NULL(c.carrier_id, p.carrier_id)
+  )
+) s
+ON t.delivery_date = s.delivery_date AND EQUAL_NULL(t.lane_id, s.lane_id) AND EQUAL_NULL(t.carrier_id, s.carrier_id)
+WHEN MATCHED AND s.dropped THEN DELETE
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  legs=s.legs, transit_hours_sketch=s.transit_hours_sketch, dwell_shipments=s.dwell_shipments,
+  dwell_minutes_sketch=s.dwell_minutes_sketch, row_hash=s.row_hash
+WHEN NOT MATCHED AND NOT s.dropped THEN INSERT (
+  delivery_date, lane_id, carrier_id, legs, transit_hours_sketch, dwell_shipments, dwell_minutes_sketch, row_hash
+) VALUES (
+  s.delivery_date, s.lane_id, s.carrier_id, s.legs, s.transit_hours_sketch, s.dwell_shipments, s.dwell_minutes_sketch, s.row_hash
+);
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Compare the string-key and compact-key serving layouts (snowflake/09_compact_keys.sql) on DuckDB.
+
+- Loads the generated facts (flat CSVs or the partitioned Parquet layout) as the string-key
+  tables, then derives the compact ones the way 09_compact_keys.sql does: a dense BIGINT
+  shipment_key per shipment_id and SMALLINT codes for status, event_type, cost_type, calc_method
+- File sizes: writes every fact table in both layouts as CSV and as Parquet and reports bytes
+- Join times: runs the app's event-side queries (exception heatmap, tender acceptance) and a
+  drill page in both layouts, median of --repeat runs each
+
+Usage:
+  python scripts/bench_keys.py --data data/out
+  python scripts/bench_keys.py --data data/out --repeat 10 --threads 1
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+try:
+    import duckdb  # type: ignore
+except Exception:  # pragma: no cover
+    duckdb = None  # type: ignore
+
+FACTS = ("FACT_SHIPMENT", "FACT_EVENT", "FACT_COST")
+# code dimension -> (fact holding the value, value column)
+CODES: Dict[str, Tuple[str, str]] = {
+    "DIM_STATUS": ("FACT_SHIPMENT", "status"),
+    "DIM_EVENT_TYPE": ("FACT_EVENT", "event_type"),
+    "DIM_COST_TYPE": ("FACT_COST", "cost_type"),
+    "DIM_CALC_METHOD": ("FACT_COST", "calc_method"),
+}
+
+# (name, string-key SQL, compact-key SQL); same results, as the app issues them in each mode
+QUERIES: List[Tuple[str, str, str]] = [
+    (
+        "exceptions",
+        """SELECT c.name AS customer_name, COALESCE(NULLIF(TRIM(e.notes), ''), 'Unknown') AS exception_type, COUNT(*) AS exceptions
+        FROM s_FACT_EVENT e JOIN s_FACT_SHIPMENT f ON f.shipment_id = e.shipment_id
+        JOIN DIM_CUSTOMER c ON c.customer_id = f.customer_id
+        WHERE e.event_type = 'Exception' GROUP BY 1, 2""",
+        """SELECT c.name AS customer_name, COALESCE(NULLIF(TRIM(e.notes), ''), 'Unknown') AS exception_type, COUNT(*) AS exceptions
+        FROM c_FACT_EVENT e JOIN c_FACT_SHIPMENT f ON f.shipment_key = e.shipment_key
+        JOIN DIM_CUSTOMER c ON c.customer_id = f.customer_id
+        WHERE e.event_type_code = (SELECT event_type_code FROM DIM_EVENT_TYPE WHERE event_type = 'Exception') GROUP BY 1, 2""",
+    ),
+    (
+        "tender",
+        """SELECT (SELECT COUNT(DISTINCT shipment_id) FROM s_FACT_EVENT WHERE event_type = 'Accepted')::DOUBLE
+             / NULLIF((SELECT COUNT(DISTINCT shipment_id) FROM s_FACT_EVENT WHERE event_type = 'Tendered'), 0)""",
+        """SELECT (SELECT COUNT(DISTINCT shipment_key) FROM c_FACT_EVENT
+                   WHERE event_type_code = (SELECT event_type_code FROM DIM_EVENT_TYPE WHERE event_type = 'Accepted'))::DOUBLE
+             / NULLIF((SELECT COUNT(DISTINCT shipment_key) FROM c_FACT_EVENT
+                   WHERE event_type_code = (SELECT event_type_code FROM DIM_EVENT_TYPE WHERE event_type = 'Tendered')), 0)""",
+    ),
+    (
+        "drill",
+        """SELECT f.shipment_id, f.leg_id, c.name, f.status, f.revenue
+        FROM s_FACT_SHIPMENT f JOIN DIM_CUSTOMER c ON c.customer_id = f.customer_id
+        ORDER BY f.shipment_id, f.leg_id LIMIT 1000""",
+        """SELECT k.shipment_id, f.leg_id, c.name, sc.status, f.revenue
+        FROM c_FACT_SHIPMENT f JOIN DIM_CUSTOMER c ON c.customer_id = f.customer_id
+        JOIN DIM_SHIPMENT k ON k.shipment_key = f.shipment_key
+        LEFT JOIN DIM_STATUS sc ON sc.status_code = f.status_code
+        ORDER BY k.shipment_id, f.leg_id LIMIT 1000""",
+    ),
+]
+
+
+def source(data: Path, table: str) -> str:
+    """read_* call for one generated table, in whichever layout the generator wrote it."""
+    if (data / table).is_dir():
+        return f"read_parquet('{data / table}/**/*.parquet', union_by_name=true, hive_partitioning=false)"
+    return f"read_csv('{data / table}.csv', header=true)"
+
+
+def prepare(con, data: Path) -> None:
+    """s_<fact> (string keys, as the typed layer) and c_<fact> (compact) plus the key/code dimensions."""
+    con.execute(f"CREATE OR REPLACE TABLE DIM_CUSTOMER AS SELECT * FROM {source(data, 'DIM_CUSTOMER')}")
+    for fact in FACTS:
+        # row_hash is a load-time column; the serving layers do not carry it
+        con.execute(f"CREATE OR REPLACE TABLE s_{fact} AS SELECT * EXCLUDE (row_hash) FROM {source(data, fact)}")
+    con.execute(
+        "CREATE OR REPLACE TABLE DIM_SHIPMENT AS "
+        "SELECT row_number() OVER (ORDER BY shipment_id)::BIGINT AS shipment_key, shipment_id FROM ("
+        + " UNION ".join(f"SELECT shipment_id FROM s_{fact} WHERE shipment_id IS NOT NULL" for fact in FACTS)
+        + ")"
+    )
+    for dim, (fact, col) in CODES.items():
+        con.execute(
+            f"CREATE OR REPLACE TABLE {dim} AS SELECT row_number() OVER (ORDER BY {col})::SMALLINT AS {col}_code, {col} "
+            f"FROM (SELECT DISTINCT {col} FROM s_{fact} WHERE {col} IS NOT NULL)"
+        )
+    for fact in FACTS:
+        cols = [r[0] for r in con.execute(f"DESCRIBE s_{fact}").fetchall()]
+        select, joins = [], [f"JOIN DIM_SHIPMENT k ON k.shipment_id = t.shipment_id"]
+        for col in cols:
+            dim = next((d for d, (f, c) in CODES.items() if f == fact and c == col), None)
+            if col == "shipment_id":
+                select.append("k.shipment_key")
+            elif dim:
+                select.append(f"{dim}.{col}_code")
+                joins.append(f"LEFT JOIN {dim} ON {dim}.{col} = t.{col}")
+            else:
+                select.append(f"t.{col}")
+        con.execute(f"CREATE OR REPLACE TABLE c_{fact} AS SELECT {', '.join(select)} FROM s_{fact} t {' '.join(joins)}")
+
+
+def file_sizes(con, out: Path) -> List[Tuple[str, int, int, int, int]]:
+    """(fact, string CSV, compact CSV, string Parquet, compact Parquet) bytes."""
+    rows = []
+    for fact in FACTS:
+        sizes = []
+        for fmt, opts in (("csv", "FORMAT CSV, HEADER"), ("parquet", "FORMAT PARQUET")):
+            for layout in ("s", "c"):
+                path = out / f"{layout}_{fact}.{fmt}"
+                con.execute(f"COPY {layout}_{fact} TO '{path}' ({opts})")
+                sizes.append(path.stat().st_size)
+        rows.append((fact, sizes[0], sizes[1], sizes[2], sizes[3]))
+    return rows
+
+
+def timed(con, sql: str, repeat: int) -> Tuple[float, list]:
+    """Median seconds over `repeat` runs (after one warm-up run) and the result rows."""
+    result = sorted(con.execute(sql).fetchall(), key=repr)
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        con.execute(sql).fetchall()
+        times.append(perf_counter() - t0)
+    return statistics.median(times), result
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="File sizes and join times of string vs compact shipment keys (DuckDB)")
+    ap.add_argument("--data", default="data/out", help="Generator output directory (flat or partitioned)")
+    ap.add_argument("--repeat", type=int, default=5, help="Timed runs per query and layout (median reported)")
+    ap.add_argument("--threads", type=int, default=0, help="DuckDB threads (default: DuckDB's own)")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if duckdb is None:
+        print("duckdb is not installed (pip install -r requirements-dev.txt)", file=sys.stderr)
+        return 2
+    data = Path(args.data)
+    missing = [t for t in ("DIM_CUSTOMER", *FACTS) if not (data / t).is_dir() and not (data / f"{t}.csv").exists()]
+    if missing:
+        print(f"Missing in {data}: {', '.join(missing)} (run make data)", file=sys.stderr)
+        return 2
+
+    con = duckdb.connect()
+    if args.threads:
+        con.execute(f"SET threads = {args.threads}")
+    prepare(con, data)
+
+    print(f"{'file sizes (MB)':<16} {'csv':>8} {'compact':>8} {'saved':>6}   {'parquet':>8} {'compact':>8} {'saved':>6}")
+    with tempfile.TemporaryDirectory(prefix="bench_keys_") as tmp:
+        for fact, s_csv, c_csv, s_pq, c_pq in file_sizes(con, Path(tmp)):
+            print(
+                f"{fact:<16} {s_csv / 1e6:>8.2f} {c_csv / 1e6:>8.2f} {1 - c_csv / s_csv:>6.0%}   "
+                f"{s_pq / 1e6:>8.2f} {c_pq / 1e6:>8.2f} {1 - c_pq / s_pq:>6.0%}"
+            )
+
+    print(f"\n{'query':<16} {'string ms':>10} {'compact ms':>11} {'speedup':>8}  same result")
+    for name, string_sql, compact_sql in QUERIES:
+        s_t, s_rows = timed(con, string_sql, args.repeat)
+        c_t, c_rows = timed(con, compact_sql, args.repeat)
+        print(f"{name:<16} {1000 * s_t:>10.2f} {1000 * c_t:>11.2f} {s_t / c_t if c_t else 0:>7.1f}x  {s_rows == c_rows}")
+    con.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
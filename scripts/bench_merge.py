@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark the STG -> EDW fact MERGEs with and without the row_hash guard, on DuckDB.
+
+- Loads each fact CSV as the current EDW state, then builds a re-extract of it: every row gets a
+  newer update_date (as a full re-pull would) and --change-pct of them get a real content change
+- Times the MERGE from snowflake/03_merge_upserts.sql as it was (update every matched row whose
+  update_date is not older) against the hash-gated version (only rows whose row_hash differs),
+  on a fresh copy of the target for each of --repeat runs, and reports rows written and timings
+- CSVs written before row_hash existed are hashed here with the generator's formula
+
+Usage:
+  python scripts/bench_merge.py --data data/out
+  python scripts/bench_merge.py --data data/out --change-pct 5 --tables FACT_SHIPMENT
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+try:
+    import duckdb  # type: ignore
+except Exception:  # pragma: no cover
+    duckdb = None  # type: ignore
+
+# table -> (key columns, column changed in the re-extract, its new value; columns are loaded as text)
+TABLES: Dict[str, Tuple[Tuple[str, ...], str, str]] = {
+    "FACT_SHIPMENT": (("shipment_id", "leg_id"), "revenue", "CAST(CAST(revenue AS DOUBLE) + 1 AS VARCHAR)"),
+    "FACT_EVENT": (("shipment_id", "event_seq"), "notes", "COALESCE(notes, '') || ' (amended)'"),
+    "FACT_COST": (("shipment_id", "cost_type", "rate_ref"), "cost_amount", "CAST(CAST(cost_amount AS DOUBLE) + 1 AS VARCHAR)"),
+}
+AUDIT = ("load_date", "update_date", "row_hash")
+
+
+def hash_expr(columns: List[str]) -> str:
+    """generate_data.row_hash in SQL: md5 of the '|'-joined CSV text, NULL as ''."""
+    parts = ", ".join(f"COALESCE(CAST({c} AS VARCHAR), '')" for c in columns)
+    return f"md5(concat_ws('|', {parts}))"
+
+
+def prepare(con, table: str, path: Path, change_pct: float, seed: int) -> Tuple[List[str], int, int]:
+    """Create base_<table> (EDW state) and src_<table> (re-extract); return business columns, rows, changed."""
+    _, col, change = TABLES[table]
+    # Text columns keep the CSV text exactly, so hashes computed here match the generator's
+    con.execute(f"CREATE OR REPLACE TABLE base_{table} AS SELECT * FROM read_csv('{path}', header=true, all_varchar=true)")
+    cols = [r[0] for r in con.execute(f"DESCRIBE base_{table}").fetchall()]
+    business = [c for c in cols if c not in AUDIT]
+    if "row_hash" not in cols:
+        con.execute(f"ALTER TABLE base_{table} ADD COLUMN row_hash VARCHAR")
+        con.execute(f"UPDATE base_{table} SET row_hash = {hash_expr(business)}")
+    rows = con.execute(f"SELECT count(*) FROM base_{table}").fetchone()[0]
+
+    con.execute(f"SELECT setseed({seed / 2**31})")
+    con.execute(
+        f"CREATE OR REPLACE TABLE src_{table} AS "
+        f"SELECT * REPLACE (strftime(now()::TIMESTAMP, '%Y-%m-%dT%H:%M:%S.%f+00:00') AS update_date), random() * 100 < {change_pct} AS _changed "
+        f"FROM base_{table}"
+    )
+    con.execute(f"UPDATE src_{table} SET {col} = {change} WHERE _changed")
+    con.execute(f"UPDATE src_{table} SET row_hash = {hash_expr(business)} WHERE _changed")
+    changed = con.execute(f"SELECT count(*) FROM src_{table} WHERE _changed").fetchone()[0]
+    con.execute(f"ALTER TABLE src_{table} DROP COLUMN _changed")
+    return business, rows, changed
+
+
+def merge_sql(table: str, business: List[str], hashed: bool) -> str:
+    keys = TABLES[table][0]
+    on = " AND ".join(f"COALESCE(t.{k}, '') = COALESCE(s.{k}, '')" for k in keys)
+    guard = "s.update_date >= t.update_date" + (" AND t.row_hash IS DISTINCT FROM s.row_hash" if hashed else "")
+    sets = ", ".join(f"{c} = s.{c}" for c in business if c not in keys)
+    cols = [*business, *AUDIT]
+    return (
+        f"MERGE INTO edw_{table} t USING src_{table} s ON {on} "
+        f"WHEN MATCHED AND {guard} THEN UPDATE SET {sets}, update_date = s.update_date, row_hash = s.row_hash "
+        f"WHEN NOT MATCHED THEN INSERT ({', '.join(cols)}) VALUES ({', '.join('s.' + c for c in cols)})"
+    )
+
+
+def bench(con, table: str, business: List[str], hashed: bool, repeat: int) -> Tuple[int, float]:
+    """Median seconds over `repeat` MERGEs, each into a fresh copy of the base table."""
+    sql = merge_sql(table, business, hashed)
+    times: List[float] = []
+    written = 0
+    for _ in range(repeat):
+        con.execute(f"CREATE OR REPLACE TABLE edw_{table} AS SELECT * FROM base_{table}")
+        con.execute("CHECKPOINT")
+        t0 = perf_counter()
+        written = con.execute(sql).fetchone()[0]
+        con.execute("CHECKPOINT")  # count the write-back of updated row groups, not just the in-memory delta
+        times.append(perf_counter() - t0)
+    return written, statistics.median(times)
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Time fact MERGEs with and without the row_hash guard (DuckDB)")
+    ap.add_argument("--data", default="data/out", help="Directory with the generated CSVs")
+    ap.add_argument("--tables", default=",".join(TABLES), help="Comma-separated fact tables")
+    ap.add_argument("--change-pct", type=float, default=1.0, help="Percent of rows with a content change")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs per variant (median reported)")
+    ap.add_argument("--db", help="DuckDB database file (default: a temporary file, removed afterwards)")
+    ap.add_argument("--seed", type=int, default=42)
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if duckdb is None:
+        print("duckdb is not installed (pip install -r requirements-dev.txt)", file=sys.stderr)
+        return 2
+    tables = [t.strip().upper() for t in args.tables.split(",") if t.strip()]
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        print(f"Unknown tables: {', '.join(unknown)} (choose from {', '.join(TABLES)})", file=sys.stderr)
+        return 2
+
+    tmp = None
+    if not args.db:
+        # On disk rather than in memory, so CHECKPOINT pays for writing the updated row groups back
+        tmp = tempfile.TemporaryDirectory(prefix="bench_merge_")
+        args.db = str(Path(tmp.name) / "bench.duckdb")
+    con = duckdb.connect(args.db)
+    print(f"{'table':<14} {'rows':>9} {'changed':>8} {'written':>9} {'full ms':>9} {'hashed':>9} {'ms':>9} {'speedup':>8}")
+    for table in tables:
+        path = Path(args.data) / f"{table}.csv"
+        if not path.exists():
+            print(f"{table:<14} missing {path}")
+            continue
+        business, rows, changed = prepare(con, table, path, args.change_pct, args.seed)
+        full_rows, full_s = bench(con, table, business, False, args.repeat)
+        hashed_rows, hashed_s = bench(con, table, business, True, args.repeat)
+        print(
+            f"{table:<14} {rows:>9,} {changed:>8,} {full_rows:>9,} {1000 * full_s:>9.1f} "
+            f"{hashed_rows:>9,} {1000 * hashed_s:>9.1f} {full_s / hashed_s if hashed_s else 0:>7.1f}x"
+        )
+    con.close()
+    if tmp is not None:
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
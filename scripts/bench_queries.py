@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Plan and timing regression check of the app's query catalog (streamlit/query_catalog.py).
+
+- Runs every panel query of two views, their sampled (approximate mode) variants and the
+  on-demand lane percentiles, rendered exactly as the app issues them: the default view (full
+  date range, no filters, grace 60) and a filtered one (last 30 days, two customers, grace 30),
+  plus the default view's second drill page. Queries that read the stratified sample or the
+  daily sketches are also run as they render without them (`<query>@facts`), so both the
+  summary and the fallback SQL stay guarded
+- Per query: median wall time of --repeat runs after one warm-up, result rows, data scanned
+  (bytes from QUERY_HISTORY on Snowflake, rows from the profiler on DuckDB) and the operator
+  sequence of its EXPLAIN plan; --plans DIR also writes the full plans
+- Compares with a baseline JSON (--baseline) recorded at the same scale (shipment legs) and
+  exits 1 when a query got slower or scans more by over --threshold, or returns a different
+  row count. Plan changes are listed and fail with --strict-plans. A missing baseline is
+  written from this run; --update rewrites it. The default, perf/query_baseline_<backend>.json,
+  stays out of the data directory so writing it does not change CSV mode's data version
+- Backends: duckdb loads the generator output (flat or partitioned) into typed tables named
+  like the app's CSV mode, builds FACT_SHIPMENT_SAMPLE and (with the milestone snapshot)
+  FACT_SHIPMENT_DAILY from their snowflake/ scripts, and adapts the few Snowflake-only
+  functions; snowflake uses the app's Snowpark settings with the result cache off
+
+Usage:
+  python scripts/bench_queries.py --data data/out
+  python scripts/bench_queries.py --data data/out --update
+  python scripts/bench_queries.py --backend snowflake --baseline perf/baseline_snowflake.json --plans perf/plans
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import replace
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "streamlit"))
+from query_catalog import (  # noqa: E402
+    APPROX_PANELS, DAILY, MILESTONES, ON_DEMAND_PANELS, SAMPLE, VIEW_PANELS, DrillPage, Filters, SchemaMap, View,
+    build_schema_sql, canonical_schema_map, render, schema_map,
+)
+
+try:
+    import duckdb  # type: ignore
+except Exception:  # pragma: no cover
+    duckdb = None  # type: ignore
+
+# Generated table -> logical name in the app's typed serving layer
+DUCKDB_TABLES = {
+    "DIM_CUSTOMER": "dim_customer",
+    "DIM_CARRIER": "dim_carrier",
+    "DIM_EQUIPMENT": "dim_equipment",
+    "DIM_LANE": "dim_lane",
+    "DIM_LOCATION": "dim_location",
+    "FACT_SHIPMENT": "fact_shipment_typed",
+    "FACT_EVENT": "fact_event_typed",
+    "FACT_SHIPMENT_MILESTONE": MILESTONES,
+}
+
+# Optional serving tables -> the EDW script that builds (and refreshes) them from the tables above
+# (the daily summary reads the milestone snapshot, so it is skipped without one)
+SNOWFLAKE_DIR = Path(__file__).resolve().parents[1] / "snowflake"
+DUCKDB_DERIVED = {SAMPLE: "11_shipment_sample.sql", DAILY: "12_shipment_daily.sql"}
+DUCKDB_CLUSTER = re.compile(r"\s*CLUSTER BY \([^)]*\)")
+
+# Snowflake constructs of the catalog with no DuckDB equivalent of the same spelling
+DUCKDB_REWRITES = [
+    ("SELECT VALUE::NUMBER FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?)))", "SELECT unnest(CAST(? AS BIGINT[]))"),
+    ("DATEADD(minute, ", "dateadd_minute("),
+    ("DATEADD('day', ", "dateadd_day("),
+    ("::FLOAT", "::DOUBLE"),
+    ("APPROX_PERCENTILE(", "approx_quantile("),
+    # Sketch states are lists of the raw values: accumulate and combine collect them, and
+    # approx_percentile_estimate (a macro below) flattens the combined lists
+    ("APPROX_PERCENTILE_ACCUMULATE(", "list("),
+    ("APPROX_PERCENTILE_COMBINE(", "list("),
+]
+# Snowflake's seeded Bernoulli sample clause (query_catalog._bernoulli) in DuckDB's spelling
+DUCKDB_SAMPLE = (re.compile(r"SAMPLE BERNOULLI \(([\d.]+)\) SEED \((\d+)\)"), r"TABLESAMPLE BERNOULLI (\1 PERCENT) REPEATABLE (\2)")
+DUCKDB_MACROS = [
+    "CREATE MACRO iff(c, a, b) AS CASE WHEN c THEN a ELSE b END",
+    "CREATE MACRO dateadd_minute(n, ts) AS ts + to_minutes(CAST(n AS BIGINT))",
+    "CREATE MACRO dateadd_day(n, d) AS CAST(d + to_days(CAST(n AS INTEGER)) AS DATE)",
+    "CREATE MACRO to_varchar(x) AS CAST(x AS VARCHAR)",
+    "CREATE MACRO equal_null(a, b) AS a IS NOT DISTINCT FROM b",
+    "CREATE MACRO hash_agg(x) AS bit_xor(hash(x))",
+    "CREATE MACRO approx_percentile_estimate(state, q) AS list_aggregate(flatten(state), 'approx_quantile', q)",
+]
+
+
+class Backend(ABC):
+    """What the harness needs from an engine: the schema, a scale, and run/explain/scanned per query."""
+
+    name = ""
+    scan_unit = ""
+    schema: SchemaMap
+
+    @abstractmethod
+    def scale(self) -> int:
+        ...
+
+    @abstractmethod
+    def run(self, sql: str, params: tuple) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def explain(self, sql: str, params: tuple) -> Tuple[List[str], str]:
+        """(operator names in plan order, full plan text)."""
+
+    @abstractmethod
+    def scanned(self, sql: str, params: tuple) -> Optional[int]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class DuckDBBackend(Backend):
+    name = "duckdb"
+    scan_unit = "rows"
+
+    def __init__(self, data: Path, threads: int = 0):
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads = {threads}")
+        self.con.execute("SET TimeZone = 'UTC'")  # delivery dates are UTC dates, as in Snowflake
+        self.con.execute("ATTACH ':memory:' AS local")
+        self.con.execute("CREATE SCHEMA local.edw")
+        for macro in DUCKDB_MACROS:
+            self.con.execute(macro)
+        present = []
+        for table, logical in DUCKDB_TABLES.items():
+            src = self._source(data, table)
+            if src is None:
+                if logical == MILESTONES:
+                    continue
+                raise FileNotFoundError(f"{table} not in {data} (run make data)")
+            extra = ", CAST(delivery_actual_ts AS DATE) AS delivery_date" if table == "FACT_SHIPMENT" else ""
+            self.con.execute(f"CREATE TABLE local.edw.{logical.upper()} AS SELECT *{extra} FROM {src}")
+            present.append(logical)
+        for logical, script in DUCKDB_DERIVED.items():
+            if logical == DAILY and MILESTONES not in present:
+                continue
+            self._derive(SNOWFLAKE_DIR / script)
+            present.append(logical)
+        self.schema = canonical_schema_map("LOCAL", "EDW", MILESTONES in present, SAMPLE in present, DAILY in present)
+        self._profile = Path(tempfile.mkdtemp(prefix="bench_queries_")) / "profile.json"
+
+    @staticmethod
+    def _source(data: Path, table: str) -> Optional[str]:
+        if (data / table).is_dir():
+            return f"read_parquet('{data / table}/**/*.parquet', union_by_name=true, hive_partitioning=false)"
+        if (data / f"{table}.csv").exists():
+            return f"read_csv('{data / table}.csv', header=true)"
+        return None
+
+    def _derive(self, script: Path) -> None:
+        """Run a script's statements in local.edw (its USE statements and CLUSTER BY dropped)."""
+        text = "\n".join(line for line in script.read_text(encoding="utf-8").splitlines() if not line.lstrip().startswith("--"))
+        self.con.execute("SET search_path = 'local.edw,memory.main'")  # the tables, then the macros
+        try:
+            for stmt in text.split(";"):
+                if stmt.strip() and not stmt.strip().startswith("USE "):
+                    self.con.execute(self._sql(DUCKDB_CLUSTER.sub("", stmt)))
+        finally:
+            self.con.execute("RESET search_path")
+
+    @staticmethod
+    def _sql(sql: str) -> str:
+        for old, new in DUCKDB_REWRITES:
+            sql = sql.replace(old, new)
+        return DUCKDB_SAMPLE[0].sub(DUCKDB_SAMPLE[1], sql)
+
+    def scale(self) -> int:
+        return self.con.execute(f"SELECT COUNT(*) FROM {self.schema.t(self.schema.shipments)}").fetchone()[0]
+
+    def run(self, sql: str, params: tuple) -> pd.DataFrame:
+        return self.con.execute(self._sql(sql), list(params)).df()
+
+    def explain(self, sql: str, params: tuple) -> Tuple[List[str], str]:
+        text = self.con.execute("EXPLAIN (FORMAT JSON) " + self._sql(sql), list(params)).fetchall()[0][1]
+        ops: List[str] = []
+
+        def walk(node: dict) -> None:
+            ops.append(node.get("name", "?"))
+            for child in node.get("children", []):
+                walk(child)
+
+        for root in json.loads(text):
+            walk(root)
+        return ops, text
+
+    def scanned(self, sql: str, params: tuple) -> Optional[int]:
+        self.con.execute("PRAGMA enable_profiling = 'json'")
+        self.con.execute(f"PRAGMA profiling_output = '{self._profile}'")
+        try:
+            self.con.execute(self._sql(sql), list(params)).df()
+        finally:
+            self.con.execute("PRAGMA disable_profiling")
+        try:
+            return json.loads(self._profile.read_text(encoding="utf-8")).get("cumulative_rows_scanned")
+        except (OSError, ValueError):
+            return None
+
+    def close(self) -> None:
+        self.con.close()
+
+
+class SnowflakeBackend(Backend):
+    name = "snowflake"
+    scan_unit = "bytes"
+
+    def __init__(self):
+        from streamlit import logger as st_logger
+
+        st_logger.set_log_level("error")  # st.cache_* outside a Streamlit runtime works but warns
+        import app  # the app's Snowpark settings (SNOWFLAKE_*, SF_PASSWORD) and Arrow fetch
+
+        self.app = app
+        self.session = app._new_session()
+        database = os.getenv("STREAMLIT_EDW_DATABASE") or self.session.sql("SELECT CURRENT_DATABASE()").collect()[0][0]
+        edw_schema = os.getenv("STREAMLIT_EDW_SCHEMA", "EDW")
+        # Measure the warehouse, not the result cache; the tag finds these runs in QUERY_HISTORY
+        self.session.sql("ALTER SESSION SET USE_CACHED_RESULT = FALSE").collect()
+        self.session.sql("ALTER SESSION SET QUERY_TAG = 'bench_queries'").collect()
+        rows = self.session.sql(build_schema_sql(database), params=[edw_schema.upper()]).collect()
+        self.schema = schema_map(database, edw_schema, [(r[0], r[1]) for r in rows])
+        if not self.schema.typed:
+            self.session.sql("""ALTER SESSION SET TIMESTAMP_INPUT_FORMAT='YYYY-MM-DD"T"HH24:MI:SS.FF TZH:TZM'""").collect()
+        self._last_qid: Optional[str] = None
+
+    def scale(self) -> int:
+        return int(self.session.sql(f"SELECT COUNT(*) FROM {self.schema.t(self.schema.shipments)}").collect()[0][0])
+
+    def run(self, sql: str, params: tuple) -> pd.DataFrame:
+        df, self._last_qid = self.app._snowflake_df(self.session, sql, params)
+        return df
+
+    def explain(self, sql: str, params: tuple) -> Tuple[List[str], str]:
+        text = self.session.sql("EXPLAIN USING JSON " + sql, params=list(params) or None).collect()[0][0]
+        plan = json.loads(text)
+        ops = [op.get("operation", "?") for step in plan.get("Operations", []) for op in step]
+        return ops, text
+
+    def scanned(self, sql: str, params: tuple) -> Optional[int]:
+        """BYTES_SCANNED of the last timed run (QUERY_HISTORY can lag a few seconds)."""
+        if self._last_qid is None:
+            return None
+        rows = self.session.sql(
+            "SELECT BYTES_SCANNED FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 1000)) "
+            "WHERE QUERY_ID = ?",
+            params=[self._last_qid],
+        ).collect()
+        return int(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def views(backend: Backend) -> List[Tuple[str, View]]:
+    """(label, view) pairs to measure; IDs and dates come from the data, so they are stable per dataset."""
+    anchor = backend.run(*render("anchor", backend.schema))
+    anchor.columns = [str(c).lower() for c in anchor.columns]
+    lo, hi = (pd.to_datetime(anchor[c].iloc[0]) if not anchor.empty else pd.NaT for c in ("min_d", "max_d"))
+    full = Filters(
+        date_start=lo.date().isoformat() if pd.notna(lo) else None,
+        date_end=hi.date().isoformat() if pd.notna(hi) else None,
+    )
+    dims = backend.run(*render("dims", backend.schema))
+    dims.columns = [str(c).lower() for c in dims.columns]
+    customers = tuple(sorted(int(i) for i in dims.loc[dims["k"] == "customer", "id"]))[:2]
+    last30 = Filters(
+        customer_ids=customers,
+        date_start=(hi - pd.Timedelta(days=29)).date().isoformat() if pd.notna(hi) else None,
+        date_end=full.date_end,
+    )
+    return [("default", View(60, full)), ("filtered", View(30, last30))]
+
+
+def measure(backend: Backend, sql: str, params: tuple, repeat: int) -> Tuple[dict, pd.DataFrame]:
+    df = backend.run(sql, params)  # warm-up (and the result)
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        backend.run(sql, params)
+        times.append((perf_counter() - t0) * 1000)
+    ops, text = backend.explain(sql, params)
+    return {
+        "ms": round(statistics.median(times), 2),
+        "rows": len(df),
+        "scanned": backend.scanned(sql, params),
+        "plan": ops,
+        "explain": text,
+    }, df
+
+
+def run_catalog(backend: Backend, repeat: int) -> Dict[str, dict]:
+    """Measurements keyed by "<view>/<query>"."""
+    out: Dict[str, dict] = {}
+    # The same schema without the sample and the daily summary renders their fallback queries
+    facts = replace(backend.schema, tables={t: n for t, n in backend.schema.tables.items() if t not in (SAMPLE, DAILY)})
+    for name in ("dims", "anchor"):
+        out[f"static/{name}"], _ = measure(backend, *render(name, backend.schema), repeat)
+    for label, view in views(backend):
+        for name in (*VIEW_PANELS, *APPROX_PANELS.values(), *ON_DEMAND_PANELS):
+            sql, params = render(name, backend.schema, view)
+            out[f"{label}/{name}"], df = measure(backend, sql, params, repeat)
+            fallback = render(name, facts, view)
+            if fallback[0] != sql:
+                out[f"{label}/{name}@facts"], _ = measure(backend, *fallback, repeat)
+            if label == "default" and name == "drill" and len(df) == view.page.size:
+                df.columns = [str(c).lower() for c in df.columns]
+                page2 = View(view.grace, view.filters, DrillPage((str(df["shipment_id"].iloc[-1]), int(df["leg_id"].iloc[-1])), view.page.size))
+                out[f"{label}/drill@2"], _ = measure(backend, *render("drill", backend.schema, page2), repeat)
+    return out
+
+
+def compare(current: Dict[str, dict], base: Dict[str, dict], threshold: float, min_ms: float) -> List[Tuple[str, str, str]]:
+    """(key, status, detail) per query; status is ok, new, gone, plan (operators changed) or regressed."""
+    rows = []
+    for key in [*current, *(k for k in base if k not in current)]:
+        cur, old = current.get(key), base.get(key)
+        if old is None:
+            rows.append((key, "new", ""))
+            continue
+        if cur is None:
+            rows.append((key, "gone", ""))
+            continue
+        problems = []
+        if cur["rows"] != old["rows"]:
+            problems.append(f"rows {old['rows']} -> {cur['rows']}")
+        if cur["ms"] > old["ms"] * (1 + threshold) and cur["ms"] - old["ms"] > min_ms:
+            problems.append(f"slower {old['ms']:.1f} -> {cur['ms']:.1f} ms")
+        if cur.get("scanned") and old.get("scanned") and cur["scanned"] > old["scanned"] * (1 + threshold):
+            problems.append(f"scanned {old['scanned']:,} -> {cur['scanned']:,}")
+        if problems:
+            rows.append((key, "regressed", "; ".join(problems)))
+        elif cur["plan"] != old["plan"]:
+            rows.append((key, "plan", f"{len(old['plan'])} -> {len(cur['plan'])} operators"))
+        else:
+            rows.append((key, "ok", ""))
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Plan/timing regression check of the app's query catalog")
+    ap.add_argument("--backend", choices=["duckdb", "snowflake"], default="duckdb", help="Engine to measure")
+    ap.add_argument("--data", default="data/out", help="Generator output directory (duckdb backend)")
+    ap.add_argument("--baseline", default=None, help="Baseline JSON (default: perf/query_baseline_<backend>.json)")
+    ap.add_argument("--update", action="store_true", help="Write this run as the new baseline")
+    ap.add_argument("--repeat", type=int, default=5, help="Timed runs per query (median reported)")
+    ap.add_argument("--threshold", type=float, default=0.25, help="Allowed relative growth of time and scanned data")
+    ap.add_argument("--min-ms", type=float, default=10.0, help="Ignore slowdowns smaller than this many ms (noise)")
+    ap.add_argument("--strict-plans", action="store_true", help="Fail when a plan's operator sequence changes")
+    ap.add_argument("--plans", default=None, help="Directory to write each query's full EXPLAIN output")
+    ap.add_argument("--threads", type=int, default=0, help="DuckDB threads (default: DuckDB's own)")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    try:
+        if args.backend == "duckdb":
+            if duckdb is None:
+                print("duckdb is not installed (pip install -r requirements-dev.txt)", file=sys.stderr)
+                return 2
+            backend: Backend = DuckDBBackend(Path(args.data), args.threads)
+        else:
+            backend = SnowflakeBackend()
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"Backend {args.backend}: {e}", file=sys.stderr)
+        return 2
+    baseline = Path(args.baseline or f"perf/query_baseline_{args.backend}.json")
+
+    scale = backend.scale()
+    current = run_catalog(backend, args.repeat)
+    backend.close()
+    if args.plans:
+        plans = Path(args.plans)
+        plans.mkdir(parents=True, exist_ok=True)
+        for key, m in current.items():
+            (plans / f"{key.replace('/', '.')}.txt").write_text(m["explain"], encoding="utf-8")
+    record = {
+        "backend": backend.name,
+        "scale": scale,
+        "scan_unit": backend.scan_unit,
+        "schema": {
+            "typed": backend.schema.typed, "compact": backend.schema.compact, "milestones": backend.schema.milestones,
+            "sample": backend.schema.sample, "daily": backend.schema.daily,
+        },
+        "queries": {k: {f: v for f, v in m.items() if f != "explain"} for k, m in current.items()},
+    }
+
+    print(f"{backend.name}: {scale:,} shipment legs, {len(current)} queries, median of {args.repeat} runs")
+    if args.update or not baseline.exists():
+        baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline.write_text(json.dumps(record, indent=2), encoding="utf-8")
+        print(f"\n{'query':<30} {'ms':>9} {'rows':>7} {'scanned ' + backend.scan_unit:>16}  operators")
+        for key, m in current.items():
+            scanned = f"{m['scanned']:,}" if m["scanned"] is not None else "-"
+            print(f"{key:<30} {m['ms']:>9.2f} {m['rows']:>7} {scanned:>16}  {len(m['plan'])}")
+        print(f"\nBaseline written to {baseline}")
+        return 0
+
+    base = json.loads(baseline.read_text(encoding="utf-8"))
+    if base.get("backend") != backend.name or base.get("scale") != scale:
+        print(
+            f"Baseline {baseline} is {base.get('backend')} at {base.get('scale'):,} legs; this run is "
+            f"{backend.name} at {scale:,}. Compare at the same scale or re-record with --update.",
+            file=sys.stderr,
+        )
+        return 2
+    results = compare(record["queries"], base["queries"], args.threshold, args.min_ms)
+    print(f"\n{'query':<30} {'base ms':>9} {'ms':>9} {'change':>7} {'scanned':>9}  status")
+    for key, status, detail in results:
+        cur, old = record["queries"].get(key), base["queries"].get(key)
+        if cur and old:
+            change = f"{cur['ms'] / old['ms'] - 1:+.0%}" if old["ms"] else "-"
+            scan = (
+                f"{cur['scanned'] / old['scanned'] - 1:+.0%}" if cur.get("scanned") and old.get("scanned") else "-"
+            )
+            print(f"{key:<30} {old['ms']:>9.2f} {cur['ms']:>9.2f} {change:>7} {scan:>9}  {status} {detail}".rstrip())
+        else:
+            print(f"{key:<30} {'':>9} {'':>9} {'':>7} {'':>9}  {status}")
+    failing = {"regressed"} | ({"plan"} if args.strict_plans else set())
+    failed = [key for key, status, _ in results if status in failing]
+    if failed:
+        print(f"\n{len(failed)} regression(s) against {baseline}: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    print(f"\nNo regressions against {baseline} (threshold {args.threshold:.0%}, noise floor {args.min_ms:g} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
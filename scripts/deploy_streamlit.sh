@@ -31,12 +31,12 @@ fi
 : "${SNOWSQL_DATABASE:=${SNOWFLAKE_DATABASE:-LOGISTICS_DB}}"
 : "${SNOWSQL_EDW_SCHEMA:=${SNOWFLAKE_EDW_SCHEMA:-EDW}}"
 
-echo "Creating stage and uploading app.py to ${SNOWSQL_DATABASE}.${SNOWSQL_EDW_SCHEMA}.${APP_STAGE} ..."
+echo "Creating stage and uploading streamlit/*.py to ${SNOWSQL_DATABASE}.${SNOWSQL_EDW_SCHEMA}.${APP_STAGE} ..."
 snowsql -a "$SNOWSQL_ACCOUNT" -u "$SNOWSQL_USER" -r "$SNOWSQL_ROLE" -w "$SNOWSQL_WAREHOUSE" -d "$SNOWSQL_DATABASE" -q \
   "CREATE OR REPLACE STAGE ${SNOWSQL_DATABASE}.${SNOWSQL_EDW_SCHEMA}.${APP_STAGE}"
 
 snowsql -a "$SNOWSQL_ACCOUNT" -u "$SNOWSQL_USER" -r "$SNOWSQL_ROLE" -w "$SNOWSQL_WAREHOUSE" -d "$SNOWSQL_DATABASE" -q \
-  "PUT file://${root}/streamlit/app.py @${SNOWSQL_DATABASE}.${SNOWSQL_EDW_SCHEMA}.${APP_STAGE} AUTO_COMPRESS=FALSE OVERWRITE=TRUE"
+  "PUT file://${root}/streamlit/*.py @${SNOWSQL_DATABASE}.${SNOWSQL_EDW_SCHEMA}.${APP_STAGE} AUTO_COMPRESS=FALSE OVERWRITE=TRUE"
 
 echo "Creating Streamlit app ${APP_NAME} ..."
 snowsql -a "$SNOWSQL_ACCOUNT" -u "$SNOWSQL_USER" -r "$SNOWSQL_ROLE" -w "$SNOWSQL_WAREHOUSE" -d "$SNOWSQL_DATABASE" -q \
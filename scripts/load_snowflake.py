@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Parallel bulk loader for the generated CSVs into STG (replaces one snowsql login per PUT/COPY).
+
+- Finds each table's files in an output directory (TABLE.csv, TABLE_*.csv or TABLE/**/*.csv,
+  and the generator's partitioned TABLE/<key>=YYYY-MM/*.parquet) or in a JSON manifest mapping
+  table names to file paths; --since/--until skip month partitions outside the range
+- One connection for the whole run: files are staged by parallel upload threads, and each
+  table's COPY starts as soon as all of its files are staged, at most --copy-concurrency at once
+- Prints files, size, rows, upload/COPY time and rows/sec per table
+- --backend duckdb|sqlite loads into a local database file instead of Snowflake, so the
+  pipeline can be benchmarked offline ("staging" gzips each file, as PUT AUTO_COMPRESS does)
+
+Usage:
+  python scripts/load_snowflake.py --data data/out               # Snowflake; same env as load_snowflake.sh
+  python scripts/load_snowflake.py --backend duckdb --db /tmp/stg.duckdb
+  python scripts/load_snowflake.py --since 2024-05                  # partitioned facts, May onwards
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import duckdb  # type: ignore
+except Exception:  # pragma: no cover
+    duckdb = None  # type: ignore
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pa = pq = None  # type: ignore
+
+# Load order of scripts/load_snowflake.sh; tables found in a manifest but not listed here load last
+TABLES = (
+    "DIM_CUSTOMER", "DIM_CARRIER", "DIM_EQUIPMENT", "DIM_LOCATION", "DIM_LANE", "DIM_DATE",
+    "FACT_SHIPMENT", "FACT_EVENT", "FACT_COST", "FACT_SHIPMENT_MILESTONE",
+)
+
+
+@dataclass
+class StagedFile:
+    table: str
+    path: Path
+    prefix: str = ""  # stage sub-path under the table (partition directories), "" for flat files
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size
+
+    @property
+    def parquet(self) -> bool:
+        return self.path.suffix == ".parquet"
+
+    @property
+    def legacy(self) -> bool:
+        """A CSV extract from before row_hash: its header does not end with that column."""
+        if self.parquet:
+            return False
+        with open(self.path, encoding="utf-8", newline="") as fh:
+            header = next(csv.reader(fh), [])
+        return not header or header[-1].strip().lower() != "row_hash"
+
+    @property
+    def month(self) -> Optional[str]:
+        """YYYY-MM of a `<key>_month=YYYY-MM` partition directory, None for anything else."""
+        for part in self.prefix.split("/"):
+            key, _, value = part.partition("=")
+            if key.endswith("_month") and len(value) == 7 and value[4] == "-":
+                return value
+        return None
+
+
+@dataclass
+class TableLoad:
+    table: str
+    files: List[StagedFile]
+    bytes: int = 0
+    rows: int = 0
+    put_s: float = 0.0  # wall time from the first upload starting to the last one finishing
+    copy_s: float = 0.0
+    error: Optional[str] = None
+    _put_span: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.copy_s if self.copy_s else 0.0
+
+
+def discover(source: Path, tables: Iterable[str] = TABLES) -> Dict[str, List[StagedFile]]:
+    """Table -> files to load, from a data directory or a JSON manifest ({"TABLE": [paths]})."""
+    found: Dict[str, List[StagedFile]] = {}
+    if source.is_file():
+        manifest = json.loads(source.read_text(encoding="utf-8"))
+        for table, paths in manifest.items():
+            paths = [paths] if isinstance(paths, str) else paths
+            found[table.upper()] = [StagedFile(table.upper(), (source.parent / p).resolve()) for p in paths]
+        return found
+    for table in tables:
+        # TABLE_*.csv are chunks of TABLE, unless they name another table (FACT_SHIPMENT_MILESTONE)
+        flat = sorted({*source.glob(f"{table}.csv"), *(p for p in source.glob(f"{table}_*.csv") if p.stem not in TABLES)})
+        files = [StagedFile(table, p) for p in flat]
+        for p in sorted({*(source / table).glob("**/*.csv"), *(source / table).glob("**/*.parquet")}):
+            rel = p.parent.relative_to(source / table).as_posix()
+            files.append(StagedFile(table, p, "" if rel == "." else rel))
+        if files:
+            found[table] = files
+    return found
+
+
+def prune(files: Dict[str, List[StagedFile]], since: Optional[str], until: Optional[str]) -> Dict[str, List[StagedFile]]:
+    """Drop month partitions outside [since, until] (YYYY-MM, inclusive).
+
+    Flat files and the NULL partition (e.g. shipments not yet delivered) are always kept.
+    """
+    def keep(f: StagedFile) -> bool:
+        m = f.month
+        return m is None or ((since is None or m >= since) and (until is None or m <= until))
+
+    kept = {t: [f for f in fs if keep(f)] for t, fs in files.items()}
+    return {t: fs for t, fs in kept.items() if fs}
+
+
+class Backend(ABC):
+    """Stage and load target; put() and copy() are called concurrently from worker threads."""
+
+    name = "?"
+
+    def prepare(self, tables: Iterable[str]) -> None:
+        pass
+
+    @abstractmethod
+    def put(self, f: StagedFile) -> None:
+        ...
+
+    @abstractmethod
+    def copy(self, table: str, files: List[StagedFile]) -> int:
+        """Load every staged file of `table`; return the number of rows loaded."""
+
+    def close(self) -> None:
+        pass
+
+
+def _env(*names: str, default: Optional[str] = None) -> str:
+    for n in names:
+        v = os.getenv(n)
+        if v:
+            return v
+    if default is None:
+        print(f"Missing env: {' or '.join(names)} (see config/.env.snowflake.example)", file=sys.stderr)
+        sys.exit(2)
+    return default
+
+
+class SnowflakeBackend(Backend):
+    """One connector connection shared by all workers (each statement gets its own cursor)."""
+
+    name = "snowflake"
+
+    def __init__(self, stage: str, put_parallel: int = 4):
+        try:
+            import snowflake.connector  # type: ignore
+        except Exception:
+            print("snowflake-connector-python is not installed (pip install -r requirements.txt).", file=sys.stderr)
+            sys.exit(2)
+        database = _env("SNOWSQL_DATABASE", "SNOWFLAKE_DATABASE", default="LOGISTICS_DB")
+        schema = _env("SNOWSQL_STG_SCHEMA", "SNOWFLAKE_STG_SCHEMA", default="STG")
+        cfg = {
+            "account": _env("SNOWSQL_ACCOUNT", "SNOWFLAKE_ACCOUNT"),
+            "user": _env("SNOWSQL_USER", "SNOWFLAKE_USER"),
+            "role": _env("SNOWSQL_ROLE", "SNOWFLAKE_ROLE", default="LOGISTICS_APP_ROLE"),
+            "warehouse": _env("SNOWSQL_WAREHOUSE", "SNOWFLAKE_WAREHOUSE", default="LOGISTICS_WH"),
+            "database": database,
+            "schema": schema,
+        }
+        secret = os.getenv("SF_PASSWORD") or os.getenv("SNOWSQL_" "PWD")
+        if secret:
+            cfg["password"] = secret
+        else:
+            # e.g. externalbrowser; the connector reports what is missing otherwise
+            cfg["authenticator"] = _env("SNOWFLAKE_AUTHENTICATOR", default="snowflake")
+        self.conn = snowflake.connector.connect(**cfg)
+        self.schema = f"{database}.{schema}"
+        self.stage = f"{self.schema}.{stage}"
+        self.put_parallel = put_parallel
+
+    def _execute(self, sql: str) -> List[tuple]:
+        with self.conn.cursor() as cur:
+            return cur.execute(sql).fetchall()
+
+    def prepare(self, tables: Iterable[str]) -> None:
+        self._execute(f"CREATE OR REPLACE STAGE {self.stage} FILE_FORMAT = {self.schema}.CSV_FMT")
+
+    def put(self, f: StagedFile) -> None:
+        target = "/".join(p for p in (f.table, f.prefix) if p)
+        # PARALLEL splits each file into chunks; the upload threads add file-level parallelism on top.
+        # Parquet is compressed internally, so it goes up as is.
+        self._execute(
+            f"PUT 'file://{f.path.resolve().as_posix()}' @{self.stage}/{target}/ "
+            f"AUTO_COMPRESS={'FALSE' if f.parquet else 'TRUE'} OVERWRITE=TRUE PARALLEL={self.put_parallel}"
+        )
+
+    def copy(self, table: str, files: List[StagedFile]) -> int:
+        if any(f.parquet for f in files):
+            # Partition keys live in the path, not the file; every other column matches STG by name
+            groups = [("FILE_FORMAT=(TYPE=PARQUET) MATCH_BY_COLUMN_NAME=CASE_INSENSITIVE", files)]
+        else:
+            # CSV_FMT checks column counts; only pre-row_hash extracts get the lenient CSV_FMT_LEGACY
+            legacy = [f for f in files if f.legacy]
+            current = [f for f in files if not f.legacy]
+            groups = [
+                (f"FILE_FORMAT=(FORMAT_NAME={self.schema}.{name})", group)
+                for name, group in (("CSV_FMT", current), ("CSV_FMT_LEGACY", legacy))
+                if group
+            ]
+        rows = 0
+        for fmt, group in groups:
+            only = ""
+            if len(group) < len(files):
+                staged = ", ".join("'" + "/".join(p for p in (f.prefix, f.path.name + ".gz") if p) + "'" for f in group)
+                only = f" FILES=({staged})"
+            result = self._execute(f"COPY INTO {self.schema}.{table} FROM @{self.stage}/{table}/{only} {fmt} ON_ERROR='ABORT_STATEMENT'")
+            # One row per file: file, status, rows_parsed, rows_loaded, ... (a single message row if none)
+            rows += sum(int(r[3] or 0) for r in result if len(r) > 3)
+        return rows
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class LocalBackend(Backend):
+    """DuckDB (when installed) or SQLite file standing in for STG, with a directory as the stage.
+
+    Tables are recreated from each CSV header (or Parquet schema) on every run. CSV values load
+    as text in SQLite and with DuckDB's sniffed types, which is enough to time the pipeline, not
+    to validate types.
+    """
+
+    def __init__(self, engine: str, db_path: Path, stage_dir: Optional[Path] = None):
+        if engine == "duckdb" and duckdb is None:
+            print("duckdb is not installed; use --backend sqlite or pip install -r requirements-dev.txt.", file=sys.stderr)
+            sys.exit(2)
+        self.name = engine
+        self.db_path = db_path
+        self.stage_dir = stage_dir or Path(tempfile.mkdtemp(prefix="logistics_stage_"))
+        self._lock = threading.Lock()
+        self._duck = duckdb.connect(str(db_path)) if engine == "duckdb" else None
+
+    def _staged(self, f: StagedFile) -> Path:
+        return self.stage_dir.joinpath(f.table, f.prefix, f.path.name + ("" if f.parquet else ".gz"))
+
+    def prepare(self, tables: Iterable[str]) -> None:
+        shutil.rmtree(self.stage_dir, ignore_errors=True)
+        self.stage_dir.mkdir(parents=True)
+        for t in tables:
+            if self._duck is not None:
+                self._duck.execute(f'DROP TABLE IF EXISTS "{t}"')
+            else:
+                with sqlite3.connect(self.db_path) as con:
+                    con.execute(f'DROP TABLE IF EXISTS "{t}"')
+
+    def put(self, f: StagedFile) -> None:
+        dest = self._staged(f)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if f.parquet:
+            shutil.copyfile(f.path, dest)
+            return
+        with open(f.path, "rb") as src, gzip.open(dest, "wb", compresslevel=1) as out:
+            shutil.copyfileobj(src, out, 1 << 20)
+
+    def copy(self, table: str, files: List[StagedFile]) -> int:
+        staged = [self._staged(f).as_posix() for f in files]
+        parquet = any(f.parquet for f in files)
+        if self._duck is not None:
+            con = self._duck.cursor()  # per-thread handle on the shared database
+            try:
+                if parquet:
+                    src = f"read_parquet({staged!r}, union_by_name=true)"
+                else:
+                    src = f"read_csv({staged!r}, header=true, union_by_name=true)"
+                con.execute(f'CREATE TABLE "{table}" AS SELECT * FROM {src} LIMIT 0')
+                return int(con.execute(f'INSERT INTO "{table}" SELECT * FROM {src}').fetchone()[0])
+            finally:
+                con.close()
+        if parquet:
+            return self._copy_parquet_sqlite(table, staged)
+        rows = 0
+        with sqlite3.connect(self.db_path, timeout=600) as con:
+            for path in staged:
+                with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+                    reader = csv.reader(fh)
+                    header = next(reader)
+                    cols = ", ".join(f'"{c}"' for c in header)
+                    con.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols})')
+                    sql = f'INSERT INTO "{table}" ({cols}) VALUES ({", ".join("?" * len(header))})'
+                    # EMPTY_FIELD_AS_NULL / NULL_IF ('', 'NULL') as in CSV_FMT
+                    batch = ([None if v in ("", "NULL") else v for v in r] for r in reader)
+                    rows += con.executemany(sql, batch).rowcount
+        return rows
+
+    def _copy_parquet_sqlite(self, table: str, staged: List[str]) -> int:
+        if pq is None:
+            raise RuntimeError("pyarrow is required to load Parquet files")
+        rows = 0
+        with sqlite3.connect(self.db_path, timeout=600) as con:
+            for path in staged:
+                pf = pq.ParquetFile(path)
+                header = pf.schema_arrow.names
+                cols = ", ".join(f'"{c}"' for c in header)
+                con.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols})')
+                sql = f'INSERT INTO "{table}" ({cols}) VALUES ({", ".join("?" * len(header))})'
+                for batch in pf.iter_batches(batch_size=100_000):
+                    # Timestamps as text, cast in Arrow (sqlite3 has no datetime type)
+                    values = [
+                        (col.cast(pa.string()) if pa.types.is_timestamp(col.type) else col).to_pylist()
+                        for col in batch.columns
+                    ]
+                    rows += con.executemany(sql, zip(*values)).rowcount
+        return rows
+
+    def close(self) -> None:
+        if self._duck is not None:
+            self._duck.close()
+        shutil.rmtree(self.stage_dir, ignore_errors=True)
+
+
+def _timed_put(backend: Backend, f: StagedFile) -> Tuple[float, float]:
+    t0 = perf_counter()
+    backend.put(f)
+    return t0, perf_counter()
+
+
+def _copy(backend: Backend, ld: TableLoad) -> None:
+    t0 = perf_counter()
+    try:
+        ld.rows = backend.copy(ld.table, ld.files)
+    except Exception as e:
+        ld.error = f"COPY failed: {e}"
+    ld.copy_s = perf_counter() - t0
+
+
+def load(
+    backend: Backend,
+    files: Dict[str, List[StagedFile]],
+    put_threads: int = 8,
+    copy_concurrency: int = 4,
+) -> List[TableLoad]:
+    """Stage every file and COPY each table once its files are staged; return per-table stats."""
+    backend.prepare(files)
+    loads = {t: TableLoad(t, fs, bytes=sum(f.size for f in fs)) for t, fs in files.items()}
+    remaining = {t: len(fs) for t, fs in files.items()}
+    with ThreadPoolExecutor(max(copy_concurrency, 1), thread_name_prefix="copy") as copiers:
+        with ThreadPoolExecutor(max(put_threads, 1), thread_name_prefix="put") as uploaders:
+            # Largest files first, so the long uploads overlap with everything else
+            ordered = sorted((f for fs in files.values() for f in fs), key=lambda f: -f.size)
+            puts = {uploaders.submit(_timed_put, backend, f): f for f in ordered}
+            for fut in as_completed(puts):
+                ld = loads[puts[fut].table]
+                try:
+                    ld._put_span.extend(fut.result())
+                except Exception as e:
+                    ld.error = ld.error or f"PUT failed for {puts[fut].path.name}: {e}"
+                remaining[ld.table] -= 1
+                if remaining[ld.table] == 0:
+                    if ld._put_span:
+                        ld.put_s = max(ld._put_span) - min(ld._put_span)
+                    if ld.error is None:
+                        copiers.submit(_copy, backend, ld)
+    order = {t: i for i, t in enumerate(TABLES)}
+    return sorted(loads.values(), key=lambda ld: order.get(ld.table, len(order)))
+
+
+def report(results: List[TableLoad], wall_s: float, backend: str) -> str:
+    out = io.StringIO()
+    out.write(f"{'table':<23} {'files':>5} {'MB':>8} {'rows':>11} {'put s':>7} {'copy s':>7} {'rows/s':>11}\n")
+    for ld in results:
+        out.write(
+            f"{ld.table:<23} {len(ld.files):>5} {ld.bytes / 1e6:>8.1f} {ld.rows:>11,} "
+            f"{ld.put_s:>7.2f} {ld.copy_s:>7.2f} {ld.rows_per_s:>11,.0f}"
+            + (f"  ERROR {ld.error}" if ld.error else "")
+            + "\n"
+        )
+    rows = sum(ld.rows for ld in results)
+    out.write(f"{backend}: {rows:,} rows in {wall_s:.2f}s wall ({rows / wall_s if wall_s else 0:,.0f} rows/s)\n")
+    return out.getvalue()
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Stage and COPY the generated CSVs into STG in parallel")
+    ap.add_argument("--data", type=Path, default=Path("data/out"), help="Output directory or JSON manifest")
+    ap.add_argument("--backend", choices=("snowflake", "duckdb", "sqlite"), default="snowflake")
+    ap.add_argument("--db", type=Path, help="Database file for the local backends (default: temp dir)")
+    ap.add_argument("--stage", default=os.getenv("STAGE_NAME", "STAGE_CSV"), help="Snowflake stage name")
+    ap.add_argument("--tables", help="Comma-separated subset of tables to load")
+    ap.add_argument("--put-threads", type=int, default=8, help="Concurrent file uploads")
+    ap.add_argument("--put-parallel", type=int, default=4, help="Snowflake PUT PARALLEL (chunks per file)")
+    ap.add_argument("--copy-concurrency", type=int, default=4, help="COPY statements running at once")
+    ap.add_argument("--since", help="Skip month partitions before YYYY-MM")
+    ap.add_argument("--until", help="Skip month partitions after YYYY-MM")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    tables = [t.strip().upper() for t in args.tables.split(",")] if args.tables else TABLES
+    files = discover(args.data, tables)
+    if args.tables:
+        files = {t: fs for t, fs in files.items() if t in tables}
+    if args.since or args.until:
+        files = prune(files, args.since, args.until)
+    if not files:
+        print(f"No data files found under {args.data}", file=sys.stderr)
+        sys.exit(2)
+    if args.backend == "snowflake":
+        backend: Backend = SnowflakeBackend(args.stage, args.put_parallel)
+    else:
+        db = args.db or Path(tempfile.gettempdir()) / f"logistics_stg.{args.backend}"
+        backend = LocalBackend(args.backend, db)
+    t0 = perf_counter()
+    try:
+        results = load(backend, files, args.put_threads, args.copy_concurrency)
+    finally:
+        backend.close()
+    print(report(results, perf_counter() - t0, backend.name), end="")
+    if any(ld.error for ld in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
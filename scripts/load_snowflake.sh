@@ -1,7 +1,8 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-# Parameter-driven Snowflake loader. Prints COPY commands by default; use --apply to execute.
+# Parameter-driven Snowflake loader. Prints COPY commands by default; --apply runs
+# scripts/load_snowflake.py (parallel PUT/COPY over one connection).
 
 here="$(cd "$(dirname "$0")" && pwd)"
 root="$(cd "$here/.." && pwd)"
@@ -40,18 +41,13 @@ echo
 
 echo "COPY command examples (manual):"
 echo "PUT file://$(pwd)/data/out/*.csv @${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.${STAGE_NAME} AUTO_COMPRESS=TRUE;"
-for t in DIM_CUSTOMER DIM_CARRIER DIM_EQUIPMENT DIM_LOCATION DIM_LANE DIM_DATE FACT_SHIPMENT FACT_EVENT FACT_COST; do
+for t in DIM_CUSTOMER DIM_CARRIER DIM_EQUIPMENT DIM_LOCATION DIM_LANE DIM_DATE FACT_SHIPMENT FACT_EVENT FACT_COST FACT_SHIPMENT_MILESTONE; do
   echo "PUT file://$(pwd)/data/out/${t}.csv @${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.${STAGE_NAME} AUTO_COMPRESS=TRUE;"
   echo "COPY INTO ${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.${t} FROM @${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.${STAGE_NAME}/${t}.csv.gz FILE_FORMAT=(FORMAT_NAME=${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.CSV_FMT) ON_ERROR='ABORT_STATEMENT';"
 done
 
 if [[ "$APPLY" -eq 1 ]]; then
-  snowsql -a "${SNOWSQL_ACCOUNT}" -u "${SNOWSQL_USER}" -r "${SNOWSQL_ROLE}" -w "${SNOWSQL_WAREHOUSE}" -d "${SNOWSQL_DATABASE}" -q "
-    USE SCHEMA ${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA};
-    CREATE OR REPLACE STAGE ${STAGE_NAME} FILE_FORMAT = CSV_FMT;
-  "
-  for t in DIM_CUSTOMER DIM_CARRIER DIM_EQUIPMENT DIM_LOCATION DIM_LANE DIM_DATE FACT_SHIPMENT FACT_EVENT FACT_COST; do
-    snowsql -a "${SNOWSQL_ACCOUNT}" -u "${SNOWSQL_USER}" -r "${SNOWSQL_ROLE}" -w "${SNOWSQL_WAREHOUSE}" -d "${SNOWSQL_DATABASE}" -q "PUT file://$(pwd)/data/out/${t}.csv @${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.${STAGE_NAME} AUTO_COMPRESS=TRUE;"
-    snowsql -a "${SNOWSQL_ACCOUNT}" -u "${SNOWSQL_USER}" -r "${SNOWSQL_ROLE}" -w "${SNOWSQL_WAREHOUSE}" -d "${SNOWSQL_DATABASE}" -q "COPY INTO ${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.${t} FROM @${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.${STAGE_NAME}/${t}.csv.gz FILE_FORMAT=(FORMAT_NAME=${SNOWSQL_DATABASE}.${SNOWSQL_STG_SCHEMA}.CSV_FMT) ON_ERROR='ABORT_STATEMENT';"
-  done
+  # One connection with parallel PUTs and concurrent COPYs instead of a snowsql login per statement
+  export SNOWSQL_ACCOUNT SNOWSQL_USER SNOWSQL_ROLE SNOWSQL_WAREHOUSE SNOWSQL_DATABASE SNOWSQL_STG_SCHEMA
+  exec python3 "$here/load_snowflake.py" --data "$root/data/out" --stage "${STAGE_NAME}"
 fi
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Headless concurrent-user load test of the dashboard query set.
+
+- N simulated users each replay views of the app: dims, anchor, the four KPIs, lane, exception
+  heatmap, drill page and drill count, rendered from streamlit/query_catalog.py exactly as
+  the app issues them (same SQL text and bind params, so the same cache keys)
+- Each user starts on the app's default view (full date range, no filters, grace 60) and then
+  changes one thing per view, like the sidebar: the grace slider or a filter set drawn with
+  skewed popularity from a pool of random customer/carrier/equipment/lane/date selections.
+  Some views page the drill once (--page-prob)
+- Same tiers as the app: a per-user panel memo (PANEL_INPUTS), the shared ResultCache, then
+  the backend through a SessionPool with the app's admission control (stale results when
+  the queue is full)
+- Backends: local (streamlit/local_engine.py over the generator output), snowflake (Snowpark,
+  the app's environment variables) or module:function returning a Backend
+- --rate paces the users to a total number of views per second (0: back to back); reports
+  throughput, latency percentiles per panel and hit rates per tier, --json writes them
+
+Usage:
+  python scripts/load_test.py --users 8 --duration 30
+  python scripts/load_test.py --users 32 --rate 4 --duration 120 --json load_test.json
+  python scripts/load_test.py --backend snowflake --users 20 --rate 1 --duration 300
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from time import monotonic, perf_counter, sleep
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "streamlit"))
+from streamlit import logger as st_logger  # noqa: E402
+
+st_logger.set_log_level("error")  # st.cache_* outside a Streamlit runtime works but warns
+
+import app  # noqa: E402
+from local_engine import LocalEngine  # noqa: E402
+from query_catalog import (  # noqa: E402
+    DEFAULT_GRACE, PANEL_INPUTS, VIEW_PANELS, DrillPage, Filters, SchemaMap, View, query_name, render,
+)
+from result_cache import ResultCache  # noqa: E402
+from session_pool import PoolTimeout, SessionPool  # noqa: E402
+
+GRACES = list(range(0, 121, 5))
+Choice = Tuple[Filters, int]  # (applied filters, grace): what a user has on screen
+
+
+@dataclass
+class Backend:
+    """A query engine for the harness.
+
+    `factory` makes one pooled session (anything `run` accepts); `run(session, sql, params,
+    view, memo)` returns the result frame, `view` being the View the query was rendered from
+    and `memo` a dict shared by one view's queries.
+    """
+
+    name: str
+    schema: SchemaMap
+    version: str
+    factory: Callable[[], Any]
+    run: Callable[[Any, str, tuple, View, dict], pd.DataFrame]
+
+
+def local_backend(args: argparse.Namespace) -> Backend:
+    """The app's CSV-mode engine over --data (builds the Arrow store on first use)."""
+    engine = LocalEngine.open(args.data)
+    slots = itertools.count()
+    return Backend(
+        "local",
+        app.local_schema_map("LOCAL", "EDW", engine),
+        app._local_data_version(args.data),
+        lambda: next(slots),
+        lambda session, sql, params, view, memo: engine.run(query_name(sql), view.filters, view.page, memo, grace=view.grace),
+    )
+
+
+def snowflake_backend(args: argparse.Namespace) -> Backend:
+    """Snowpark sessions configured like the app's (SNOWFLAKE_*, SF_PASSWORD, STREAMLIT_EDW_*)."""
+    session = app._new_session()
+    database = os.getenv("STREAMLIT_EDW_DATABASE") or session.sql("SELECT CURRENT_DATABASE()").collect()[0][0]
+    edw_schema = os.getenv("STREAMLIT_EDW_SCHEMA", "EDW")
+    return Backend(
+        "snowflake",
+        app.load_schema_map(session, database, edw_schema),
+        app.data_version(session, database, edw_schema),
+        app._pooled_session,
+        lambda session, sql, params, view, memo: app._snowflake_df(session, sql, params)[0],
+    )
+
+
+BACKENDS: Dict[str, Callable[[argparse.Namespace], Backend]] = {"local": local_backend, "snowflake": snowflake_backend}
+
+
+def make_backend(args: argparse.Namespace) -> Backend:
+    if args.backend in BACKENDS:
+        return BACKENDS[args.backend](args)
+    module, _, func = args.backend.partition(":")
+    return getattr(importlib.import_module(module), func or "backend")(args)
+
+
+class Harness:
+    """Shared state of one run: backend, pool, result cache, the view pool and the records."""
+
+    def __init__(self, backend: Backend, args: argparse.Namespace):
+        self.backend = backend
+        self.schema = backend.schema
+        self.page_size = args.page_size
+        self.page_prob = args.page_prob
+        self.pool = SessionPool(backend.factory, args.pool_size, args.max_queue, args.wait_s)
+        self.cache: Optional[ResultCache] = None
+        if not args.no_cache:
+            root = args.cache_dir or tempfile.mkdtemp(prefix="load_test_cache_")
+            self.cache = ResultCache(root, args.cache_mb * 1024 * 1024)
+        self.records: List[Tuple[str, float, str]] = []  # (panel, ms, tier)
+        self.views: List[float] = []  # ms per completed view
+        self._lock = threading.Lock()
+        self.default_view, self.filter_sets, self.weights = self._view_pool(args.filter_sets, random.Random(args.seed))
+
+    def _view_pool(self, n: int, rng: random.Random) -> Tuple[Choice, List[Filters], List[float]]:
+        """Default view plus `n` random filter sets; set i is drawn with weight 1/(i+1)."""
+        run = self.backend.run
+        session = self.backend.factory()
+        dims = run(session, *render("dims", self.schema), View(), {})
+        anchor = run(session, *render("anchor", self.schema), View(), {})
+        lo, hi = app._first(anchor, "min_d"), app._first(anchor, "max_d")
+        lo = pd.Timestamp(lo).date() if lo is not None else None
+        hi = pd.Timestamp(hi).date() if hi is not None else None
+        default = Filters(date_start=lo.isoformat() if lo else None, date_end=hi.isoformat() if hi else None)
+        ids = {k: [int(i) for i in g["id"]] for k, g in dims.groupby("k")}
+        sets = [default]
+        while len(sets) < n:
+            picks = {
+                k: tuple(sorted(rng.sample(ids.get(k, []), min(rng.randint(1, 3), len(ids.get(k, []))))))
+                if rng.random() < 0.3 else ()
+                for k in ("customer", "carrier", "equipment", "lane")
+            }
+            start, end = default.date_start, default.date_end
+            if lo and hi and rng.random() < 0.5 and (hi - lo).days > 7:
+                a = lo + pd.Timedelta(days=rng.randint(0, (hi - lo).days - 7))
+                b = a + pd.Timedelta(days=rng.randint(7, (hi - a).days))
+                start, end = a.isoformat(), b.isoformat()
+            sets.append(Filters(picks["customer"], picks["carrier"], picks["equipment"], picks["lane"], start, end))
+        return (default, DEFAULT_GRACE), sets, [1 / (i + 1) for i in range(len(sets))]
+
+    def next_view(self, view: Choice, rng: random.Random) -> Choice:
+        """One sidebar change: a new grace or a new filter set."""
+        flt, grace = view
+        if rng.random() < 0.5:
+            return flt, rng.choice(GRACES)
+        return rng.choices(self.filter_sets, self.weights)[0], grace
+
+    def query(
+        self, user: str, sql: str, params: tuple, view: View, memo: dict, view_memo: dict, deps: dict,
+    ) -> pd.DataFrame:
+        """One panel query through the app's tiers: panel memo, result cache, pooled backend."""
+        name = query_name(sql)
+        t0 = perf_counter()
+        memo_key = (self.backend.version, tuple(deps[n] for n in PANEL_INPUTS[name]))
+        hit = memo.get(name)
+        if hit is not None and hit[0] == memo_key:
+            self._record(name, t0, "memo")
+            return hit[1]
+        key = ResultCache.key(sql, params, self.backend.version)
+        base = ResultCache.base_key(sql, params)
+        df, tier = self.cache.get(key) if self.cache else (None, "miss")
+        if df is None:
+            stale = self.cache.latest(base) if self.cache and self.pool.queued() >= self.pool.max_queue else None
+            if stale is not None:
+                df, tier = stale, "stale"
+            else:
+                try:
+                    with self.pool.lease(user) as session:
+                        df = self.backend.run(session, sql, params, view, view_memo)
+                except PoolTimeout:
+                    df = self.cache.latest(base) if self.cache else None
+                    tier = "stale" if df is not None else "error"
+                except Exception:
+                    df, tier = None, "error"
+                if tier == "miss" and self.cache:
+                    self.cache.put(key, df, base)
+        self._record(name, t0, tier)
+        if df is None:
+            return pd.DataFrame()
+        if tier != "stale":
+            memo[name] = (memo_key, df)
+        return df
+
+    def _record(self, name: str, t0: float, tier: str) -> None:
+        with self._lock:
+            self.records.append((name, (perf_counter() - t0) * 1000, tier))
+
+    def run_view(self, user: str, view: Choice, memo: dict, rng: random.Random) -> None:
+        """Every panel query of one rerun, in the order the app renders them."""
+        t0 = perf_counter()
+        flt, grace = view
+        view_memo: dict = {}  # filtered rows, shared by this view's queries (the app's per-rerun memo)
+        deps = {"grace": grace, "filters": astuple(flt), "cursor": astuple(DrillPage(None, self.page_size))}
+        first = View(grace, flt, DrillPage(None, self.page_size))
+        frames = {}
+        for name in ("dims", "anchor", *VIEW_PANELS):
+            sql, params = render(name, self.schema, first)
+            frames[name] = self.query(user, sql, params, first, memo, view_memo, deps)
+        drill = frames["drill"]
+        if len(drill) == self.page_size and rng.random() < self.page_prob:
+            nxt = View(grace, flt, DrillPage((str(drill["shipment_id"].iloc[-1]), int(drill["leg_id"].iloc[-1])), self.page_size))
+            sql, params = render("drill", self.schema, nxt)
+            self.query(user, sql, params, nxt, memo, view_memo, {**deps, "cursor": astuple(nxt.page)})
+        with self._lock:
+            self.views.append((perf_counter() - t0) * 1000)
+
+    def user(self, uid: int, deadline: float, interval: float, max_views: int, seed: int) -> None:
+        """One simulated user: views until the deadline, spaced `interval` s apart on average."""
+        rng = random.Random(seed * 7919 + uid)
+        user, memo, view = f"user{uid}", {}, self.default_view
+        start = monotonic() + (rng.random() * interval if interval else 0.0)  # staggered arrivals
+        done = 0
+        while not max_views or done < max_views:
+            wait = min(start, deadline) - monotonic()
+            if wait > 0:
+                sleep(wait)
+            if monotonic() >= deadline:
+                break
+            self.run_view(user, view, memo, rng)
+            done += 1
+            view = self.next_view(view, rng)
+            start = max(start + (rng.expovariate(1 / interval) if interval else 0.0), monotonic())
+
+
+def summary(h: Harness, seconds: float) -> dict:
+    """Throughput, view latency, and per panel: counts per tier and latency percentiles (ms)."""
+    rec = pd.DataFrame(h.records, columns=["panel", "ms", "tier"])
+    order = list(dict.fromkeys(rec["panel"]))
+    panels = []
+    for name in order:
+        g = rec[rec["panel"] == name]
+        ms = g["ms"].to_numpy()
+        miss = g.loc[g["tier"] == "miss", "ms"].to_numpy()
+        tiers = g["tier"].value_counts()
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        panels.append({
+            "panel": name,
+            "n": len(g),
+            "memo": int(tiers.get("memo", 0)),
+            "cache": int(tiers.get("memory", 0) + tiers.get("disk", 0)),
+            "miss": int(tiers.get("miss", 0)),
+            "stale": int(tiers.get("stale", 0)),
+            "error": int(tiers.get("error", 0)),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "miss_p95_ms": round(float(np.percentile(miss, 95)), 2) if len(miss) else None,
+        })
+    views = np.asarray(h.views) if h.views else np.zeros(1)
+    n = len(rec)
+    tiers = rec["tier"].value_counts()
+    return {
+        "backend": h.backend.name,
+        "seconds": round(seconds, 2),
+        "views": len(h.views),
+        "queries": n,
+        "backend_queries": int(tiers.get("miss", 0)),
+        "views_per_s": round(len(h.views) / seconds, 2) if seconds else 0.0,
+        "queries_per_s": round(n / seconds, 1) if seconds else 0.0,
+        "view_p50_ms": round(float(np.percentile(views, 50)), 1),
+        "view_p95_ms": round(float(np.percentile(views, 95)), 1),
+        "memo_hit_rate": round(int(tiers.get("memo", 0)) / n, 3) if n else 0.0,
+        "cache_hit_rate": round(int(tiers.get("memory", 0) + tiers.get("disk", 0)) / n, 3) if n else 0.0,
+        "pool": h.pool.snapshot(),
+        "panels": panels,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Concurrent-user load test of the dashboard query set")
+    ap.add_argument("--backend", default="local", help="local, snowflake or module:function returning a Backend")
+    ap.add_argument("--data", default=os.getenv("LOCAL_DATA_DIR", "data/out"), help="Generator output (local backend)")
+    ap.add_argument("--users", type=int, default=8, help="Simulated users (threads)")
+    ap.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    ap.add_argument("--views", type=int, default=0, help="Stop each user after this many views (0: duration only)")
+    ap.add_argument("--rate", type=float, default=0.0, help="Target views/s across all users (0: back to back)")
+    ap.add_argument("--filter-sets", type=int, default=20, help="Random filter sets users choose from")
+    ap.add_argument("--page-prob", type=float, default=0.3, help="Chance a view also fetches the next drill page")
+    ap.add_argument("--page-size", type=int, default=int(os.getenv("DRILL_PAGE_SIZE", "500")), help="Drill page size")
+    ap.add_argument("--pool-size", type=int, default=int(os.getenv("SESSION_POOL_SIZE", "4")), help="Concurrent backend queries")
+    ap.add_argument("--max-queue", type=int, default=int(os.getenv("SESSION_POOL_MAX_QUEUE", "16")), help="Queue depth that serves stale results")
+    ap.add_argument("--wait-s", type=float, default=float(os.getenv("SESSION_POOL_WAIT_S", "60")), help="Pool wait limit")
+    ap.add_argument("--cache-dir", default=None, help="Result cache directory (default: a new empty one)")
+    ap.add_argument("--cache-mb", type=int, default=int(os.getenv("RESULT_CACHE_MAX_MB", "512")), help="Result cache size")
+    ap.add_argument("--no-cache", action="store_true", help="Bypass the shared result cache (panel memo still applies)")
+    ap.add_argument("--seed", type=int, default=7, help="RNG seed for views and pacing")
+    ap.add_argument("--json", default=None, help="Write the summary as JSON to this file")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    try:
+        backend = make_backend(args)
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"Backend {args.backend}: {e}", file=sys.stderr)
+        return 2
+    h = Harness(backend, args)
+    interval = args.users / args.rate if args.rate > 0 else 0.0
+    t0 = monotonic()
+    deadline = t0 + args.duration
+    threads = [
+        threading.Thread(target=h.user, args=(i, deadline, interval, args.views, args.seed), daemon=True)
+        for i in range(args.users)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    out = summary(h, monotonic() - t0)
+
+    print(
+        f"{out['backend']}: {args.users} users, {out['seconds']:.0f}s, {out['views']} views "
+        f"({out['views_per_s']}/s), {out['queries']} panel queries ({out['queries_per_s']}/s), "
+        f"{out['backend_queries']} reached the backend"
+    )
+    print(
+        f"view p50 {out['view_p50_ms']} ms, p95 {out['view_p95_ms']} ms; "
+        f"memo hits {out['memo_hit_rate']:.0%}, cache hits {out['cache_hit_rate']:.0%}"
+    )
+    print(f"\n{'panel':<12} {'n':>6} {'memo':>6} {'cache':>6} {'miss':>6} {'stale':>5} {'err':>4} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'miss p95':>9}")
+    for p in out["panels"]:
+        miss_p95 = f"{p['miss_p95_ms']:.2f}" if p["miss_p95_ms"] is not None else "-"
+        print(
+            f"{p['panel']:<12} {p['n']:>6} {p['memo']:>6} {p['cache']:>6} {p['miss']:>6} {p['stale']:>5} {p['error']:>4} "
+            f"{p['p50_ms']:>8.2f} {p['p95_ms']:>8.2f} {p['p99_ms']:>8.2f} {miss_p95:>9}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(out, indent=2, default=str), encoding="utf-8")
+    return 1 if any(p["error"] for p in out["panels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
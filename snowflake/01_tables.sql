@@ -10,7 +10,8 @@ CREATE OR REPLACE TABLE DIM_CUSTOMER (
   segment STRING,
   region STRING,
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING          -- md5 of the business columns (generator); MERGE skips rows whose hash is unchanged
 );
 
 CREATE OR REPLACE TABLE DIM_CARRIER (
@@ -20,7 +21,8 @@ CREATE OR REPLACE TABLE DIM_CARRIER (
   mc_number STRING,
   score_tier STRING,       -- Bronze/Silver/Gold/Platinum
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 CREATE OR REPLACE TABLE DIM_EQUIPMENT (
@@ -28,7 +30,8 @@ CREATE OR REPLACE TABLE DIM_EQUIPMENT (
   type STRING,             -- Van/Reefer/Flat
   capacity_lbs INTEGER,
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 CREATE OR REPLACE TABLE DIM_LOCATION (
@@ -40,7 +43,8 @@ CREATE OR REPLACE TABLE DIM_LOCATION (
   timezone STRING,
   type STRING,             -- Origin/Dest/Terminal/DC
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 CREATE OR REPLACE TABLE DIM_LANE (
@@ -50,7 +54,8 @@ CREATE OR REPLACE TABLE DIM_LANE (
   standard_miles NUMBER(10,2),
   std_transit_days INTEGER,
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 CREATE OR REPLACE TABLE DIM_DATE (
@@ -63,7 +68,8 @@ CREATE OR REPLACE TABLE DIM_DATE (
   dow INTEGER,
   is_weekend BOOLEAN,
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 CREATE OR REPLACE TABLE FACT_SHIPMENT (
@@ -95,7 +101,8 @@ CREATE OR REPLACE TABLE FACT_SHIPMENT (
   isotif BOOLEAN,
   cancel_flag BOOLEAN,
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 CREATE OR REPLACE TABLE FACT_EVENT (
@@ -106,7 +113,8 @@ CREATE OR REPLACE TABLE FACT_EVENT (
   facility_loc_id INTEGER,
   notes STRING,
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 CREATE OR REPLACE TABLE FACT_COST (
@@ -117,7 +125,29 @@ CREATE OR REPLACE TABLE FACT_COST (
   cost_amount NUMBER(12,2),
   currency STRING,
   load_date TIMESTAMP_NTZ,
-  update_date TIMESTAMP_NTZ
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
+);
+
+-- Accumulating snapshot: one row per shipment, milestones filled in as events arrive
+CREATE OR REPLACE TABLE FACT_SHIPMENT_MILESTONE (
+  shipment_id STRING,
+  customer_id INTEGER,     -- filter columns from the first leg
+  carrier_id INTEGER,
+  equipment_id INTEGER,
+  lane_id INTEGER,
+  delivery_date DATE,
+  tendered_ts TIMESTAMP_NTZ,     -- earliest event of each type
+  accepted_ts TIMESTAMP_NTZ,
+  picked_up_ts TIMESTAMP_NTZ,
+  at_dest_ts TIMESTAMP_NTZ,
+  delivered_ts TIMESTAMP_NTZ,
+  dwell_minutes INTEGER,   -- sum of DwellStart -> DwellEnd pairs
+  exception_count INTEGER,
+  first_exception_type STRING,
+  load_date TIMESTAMP_NTZ,
+  update_date TIMESTAMP_NTZ,
+  row_hash STRING
 );
 
 -- EDW tables (curated; same schemas with constraints informational)
@@ -143,3 +173,7 @@ ALTER TABLE DIM_DATE ADD PRIMARY KEY (date_key);
 CREATE OR REPLACE TABLE FACT_SHIPMENT LIKE <DATABASE>.<STG_SCHEMA>.FACT_SHIPMENT;
 CREATE OR REPLACE TABLE FACT_EVENT LIKE <DATABASE>.<STG_SCHEMA>.FACT_EVENT;
 CREATE OR REPLACE TABLE FACT_COST LIKE <DATABASE>.<STG_SCHEMA>.FACT_COST;
+
+-- Built from FACT_EVENT history by 10_shipment_milestone.sql (or the Keboola curation step)
+CREATE OR REPLACE TABLE FACT_SHIPMENT_MILESTONE LIKE <DATABASE>.<STG_SCHEMA>.FACT_SHIPMENT_MILESTONE;
+ALTER TABLE FACT_SHIPMENT_MILESTONE ADD PRIMARY KEY (shipment_id);
@@ -21,6 +21,7 @@ CREATE OR REPLACE STAGE STAGE_CSV
 -- COPY INTO FACT_SHIPMENT FROM @STAGE_CSV/FACT_SHIPMENT.csv.gz ON_ERROR='ABORT_STATEMENT';
 -- COPY INTO FACT_EVENT FROM @STAGE_CSV/FACT_EVENT.csv.gz ON_ERROR='ABORT_STATEMENT';
 -- COPY INTO FACT_COST FROM @STAGE_CSV/FACT_COST.csv.gz ON_ERROR='ABORT_STATEMENT';
+-- COPY INTO FACT_SHIPMENT_MILESTONE FROM @STAGE_CSV/FACT_SHIPMENT_MILESTONE.csv.gz ON_ERROR='ABORT_STATEMENT';
 
 -- Optional: Streams & Tasks (commented skeleton)
 -- CREATE OR REPLACE STREAM STRM_FACT_SHIPMENT ON TABLE FACT_SHIPMENT;
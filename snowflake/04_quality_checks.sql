@@ -63,3 +63,19 @@ SELECT COUNT(*) AS exceptions
 FROM IDENTIFIER($EDW).FACT_EVENT
 WHERE event_type = 'Exception';
 
+
+-- Milestone snapshot vs events (10_shipment_milestone.sql): both counts should match
+SELECT
+  (SELECT COALESCE(SUM(exception_count), 0) FROM IDENTIFIER($EDW).FACT_SHIPMENT_MILESTONE) AS milestone_exceptions,
+  (SELECT COUNT(*) FROM IDENTIFIER($EDW).FACT_EVENT WHERE event_type = 'Exception') AS event_exceptions;
+
+-- Generator snapshot (STG) vs curated snapshot (EDW): rows that disagree on a milestone
+SELECT s.shipment_id, s.accepted_ts, e.accepted_ts AS edw_accepted_ts, s.exception_count, e.exception_count AS edw_exception_count
+FROM IDENTIFIER($STG).FACT_SHIPMENT_MILESTONE s
+JOIN IDENTIFIER($EDW).FACT_SHIPMENT_MILESTONE e ON e.shipment_id = s.shipment_id
+WHERE s.tendered_ts IS DISTINCT FROM e.tendered_ts
+   OR s.accepted_ts IS DISTINCT FROM e.accepted_ts
+   OR s.delivered_ts IS DISTINCT FROM e.delivered_ts
+   OR s.dwell_minutes IS DISTINCT FROM e.dwell_minutes
+   OR s.exception_count IS DISTINCT FROM e.exception_count
+LIMIT 100;
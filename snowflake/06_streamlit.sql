@@ -8,7 +8,7 @@ USE SCHEMA IDENTIFIER('<EDW_SCHEMA>'); -- context only; app queries use fully qu
 CREATE OR REPLACE STAGE IDENTIFIER('<APP_STAGE>');
 
 -- From your workstation (SnowSQL) upload the app code:
--- PUT file://streamlit/app.py @<DATABASE>.<EDW_SCHEMA>.<APP_STAGE> AUTO_COMPRESS=FALSE OVERWRITE=TRUE;
+-- PUT file://streamlit/*.py @<DATABASE>.<EDW_SCHEMA>.<APP_STAGE> AUTO_COMPRESS=FALSE OVERWRITE=TRUE;
 
 -- Create the Streamlit app
 CREATE OR REPLACE STREAMLIT IDENTIFIER('<APP_NAME>')
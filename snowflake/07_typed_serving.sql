@@ -0,0 +1,130 @@
+-- Typed serving layer for the Streamlit app (and any other hot-path readers).
+-- Replace <DATABASE>, <EDW_SCHEMA> as needed.
+--
+-- EDW facts may hold timestamps as VARCHAR (e.g. when curated from the all-VARCHAR RAW
+-- tables in snowflake/admin/raw_ddl_varchar.sql). Parsing them with
+-- TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(col), '')) on every dashboard query is wasted work, so
+-- parse once here into native TIMESTAMP_TZ columns plus a precomputed delivery_date.
+-- The app detects these tables and emits plain column references against them.
+--
+-- The first run creates and fills the tables. Later runs MERGE from EDW and only rewrite a
+-- row when its EDW row_hash changed (08_row_hash.sql), so a run over unchanged data writes
+-- nothing and leaves LAST_ALTERED, and with it the app's result cache, alone. Curation
+-- (10_curate_edw.sql, last step) applies the same MERGE to the shipments of its batch.
+-- Typed tables built before they carried row_hash get the column below; the next run
+-- rewrites them once. Safe to re-run.
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+-- ISO 8601 with offsets (generator output) and TIMESTAMP_NTZ text both parse under AUTO
+ALTER SESSION SET TIMESTAMP_INPUT_FORMAT = 'AUTO';
+
+CREATE TABLE IF NOT EXISTS FACT_SHIPMENT_TYPED
+  CLUSTER BY (delivery_date)
+AS
+SELECT
+  shipment_id,
+  leg_id,
+  customer_id,
+  carrier_id,
+  equipment_id,
+  origin_loc_id,
+  dest_loc_id,
+  lane_id,
+  TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(tender_ts::VARCHAR), '')) AS tender_ts,
+  TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(pickup_plan_ts::VARCHAR), '')) AS pickup_plan_ts,
+  TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(pickup_actual_ts::VARCHAR), '')) AS pickup_actual_ts,
+  TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_plan_ts::VARCHAR), '')) AS delivery_plan_ts,
+  TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_actual_ts::VARCHAR), '')) AS delivery_actual_ts,
+  CAST(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_actual_ts::VARCHAR), '')) AS DATE) AS delivery_date,
+  planned_miles,
+  actual_miles,
+  pieces,
+  weight_lbs,
+  cube,
+  revenue,
+  total_cost,
+  fuel_surcharge,
+  accessorial_cost,
+  status,
+  isdeliveredontime,
+  isinfull,
+  isotif,
+  cancel_flag,
+  load_date,
+  update_date,
+  COALESCE(row_hash, TO_VARCHAR(HASH(*))) AS row_hash
+FROM FACT_SHIPMENT;
+
+CREATE TABLE IF NOT EXISTS FACT_EVENT_TYPED AS
+SELECT
+  shipment_id,
+  event_seq,
+  event_type,
+  TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(event_ts::VARCHAR), '')) AS event_ts,
+  facility_loc_id,
+  notes,
+  load_date,
+  update_date,
+  COALESCE(row_hash, TO_VARCHAR(HASH(*))) AS row_hash
+FROM FACT_EVENT;
+
+ALTER TABLE FACT_SHIPMENT_TYPED ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_EVENT_TYPED ADD COLUMN IF NOT EXISTS row_hash STRING;
+
+-- Existing tables: bring them up to date with EDW, rewriting changed rows only
+MERGE INTO FACT_SHIPMENT_TYPED t
+USING (
+  SELECT
+    shipment_id, leg_id, customer_id, carrier_id, equipment_id, origin_loc_id, dest_loc_id, lane_id,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(tender_ts::VARCHAR), '')) AS tender_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(pickup_plan_ts::VARCHAR), '')) AS pickup_plan_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(pickup_actual_ts::VARCHAR), '')) AS pickup_actual_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_plan_ts::VARCHAR), '')) AS delivery_plan_ts,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_actual_ts::VARCHAR), '')) AS delivery_actual_ts,
+    planned_miles, actual_miles, pieces, weight_lbs, cube, revenue, total_cost, fuel_surcharge, accessorial_cost,
+    status, isdeliveredontime, isinfull, isotif, cancel_flag, load_date, update_date,
+    COALESCE(row_hash, TO_VARCHAR(HASH(*))) AS row_hash
+  FROM FACT_SHIPMENT
+) s
+ON t.shipment_id = s.shipment_id AND t.leg_id = s.leg_id
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  customer_id=s.customer_id, carrier_id=s.carrier_id, equipment_id=s.equipment_id,
+  origin_loc_id=s.origin_loc_id, dest_loc_id=s.dest_loc_id, lane_id=s.lane_id,
+  tender_ts=s.tender_ts, pickup_plan_ts=s.pickup_plan_ts, pickup_actual_ts=s.pickup_actual_ts,
+  delivery_plan_ts=s.delivery_plan_ts, delivery_actual_ts=s.delivery_actual_ts, delivery_date=CAST(s.delivery_actual_ts AS DATE),
+  planned_miles=s.planned_miles, actual_miles=s.actual_miles, pieces=s.pieces, weight_lbs=s.weight_lbs, cube=s.cube,
+  revenue=s.revenue, total_cost=s.total_cost, fuel_surcharge=s.fuel_surcharge, accessorial_cost=s.accessorial_cost,
+  status=s.status, isdeliveredontime=s.isdeliveredontime, isinfull=s.isinfull, isotif=s.isotif,
+  cancel_flag=s.cancel_flag, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (
+  shipment_id, leg_id, customer_id, carrier_id, equipment_id, origin_loc_id, dest_loc_id, lane_id,
+  tender_ts, pickup_plan_ts, pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, delivery_date,
+  planned_miles, actual_miles, pieces, weight_lbs, cube, revenue, total_cost, fuel_surcharge, accessorial_cost,
+  status, isdeliveredontime, isinfull, isotif, cancel_flag, load_date, update_date, row_hash
+) VALUES (
+  s.shipment_id, s.leg_id, s.customer_id, s.carrier_id, s.equipment_id, s.origin_loc_id, s.dest_loc_id, s.lane_id,
+  s.tender_ts, s.pickup_plan_ts, s.pickup_actual_ts, s.delivery_plan_ts, s.delivery_actual_ts, CAST(s.delivery_actual_ts AS DATE),
+  s.planned_miles, s.actual_miles, s.pieces, s.weight_lbs, s.cube, s.revenue, s.total_cost, s.fuel_surcharge, s.accessorial_cost,
+  s.status, s.isdeliveredontime, s.isinfull, s.isotif, s.cancel_flag, s.load_date, s.update_date, s.row_hash
+);
+
+MERGE INTO FACT_EVENT_TYPED t
+USING (
+  SELECT
+    shipment_id, event_seq, event_type,
+    TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(event_ts::VARCHAR), '')) AS event_ts,
+    facility_loc_id, notes, load_date, update_date,
+    COALESCE(row_hash, TO_VARCHAR(HASH(*))) AS row_hash
+  FROM FACT_EVENT
+) s
+ON t.shipment_id = s.shipment_id AND t.event_seq = s.event_seq
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  event_type=s.event_type, event_ts=s.event_ts, facility_loc_id=s.facility_loc_id, notes=s.notes,
+  load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (shipment_id, event_seq, event_type, event_ts, facility_loc_id, notes, load_date, update_date, row_hash)
+VALUES (s.shipment_id, s.event_seq, s.event_type, s.event_ts, s.facility_loc_id, s.notes, s.load_date, s.update_date, s.row_hash);
+
+-- Verification (optional)
+-- SELECT COUNT(*) AS total, COUNT(delivery_date) AS delivered, MIN(delivery_date), MAX(delivery_date) FROM FACT_SHIPMENT_TYPED;
@@ -0,0 +1,30 @@
+-- Add row_hash to STG and EDW tables created before it was part of 01_tables.sql.
+-- Replace <DATABASE>, <STG_SCHEMA>, <EDW_SCHEMA> as needed. Safe to re-run.
+--
+-- The MERGEs in 03_merge_upserts.sql (and curation) update a matched row only when its
+-- row_hash differs from the source's. Existing EDW rows start with NULL, so the first load
+-- after this rewrites every matched row once; later loads skip unchanged rows.
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+
+USE SCHEMA IDENTIFIER('<STG_SCHEMA>');
+ALTER TABLE DIM_CUSTOMER ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_CARRIER ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_EQUIPMENT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_LOCATION ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_LANE ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_DATE ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_SHIPMENT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_EVENT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_COST ADD COLUMN IF NOT EXISTS row_hash STRING;
+
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+ALTER TABLE DIM_CUSTOMER ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_CARRIER ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_EQUIPMENT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_LOCATION ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_LANE ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE DIM_DATE ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_SHIPMENT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_EVENT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_COST ADD COLUMN IF NOT EXISTS row_hash STRING;
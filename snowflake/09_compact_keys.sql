@@ -0,0 +1,240 @@
+-- Compact-key serving layer (optional). Replace <DATABASE>, <EDW_SCHEMA> as needed. Safe to re-run.
+--
+-- The facts key on the string shipment_id ('S000001') and repeat enumerated strings (status,
+-- event_type, cost_type, calc_method) on every row. This layer serves them as:
+--   DIM_SHIPMENT      shipment_key BIGINT <-> shipment_id, assigned once and never reused
+--   DIM_STATUS, DIM_EVENT_TYPE, DIM_COST_TYPE, DIM_CALC_METHOD   SMALLINT code <-> value
+--   FACT_SHIPMENT_COMPACT, FACT_EVENT_COMPACT, FACT_COST_COMPACT typed facts carrying only
+--                     the BIGINT key and SMALLINT codes
+-- EDW tables and the STG/CSV contract keep their string keys; MERGEs are unchanged.
+-- The app detects the *_COMPACT tables and joins on shipment_key, comparing integer codes;
+-- drop them (DROP TABLE FACT_SHIPMENT_COMPACT, ...) to go back to the *_TYPED tables.
+--
+-- Builds from the typed layer, so run 07_typed_serving.sql first. The first run creates the
+-- compact facts; later runs MERGE them from the typed layer and rewrite a row only when its
+-- row_hash changed, so re-running over unchanged data writes nothing (and leaves the app's
+-- result cache valid). After each curation, keboola/transformations/sql/20_compact_keys.sql
+-- applies the same refresh to the shipments of the batch.
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+CREATE TABLE IF NOT EXISTS DIM_SHIPMENT (
+  shipment_key BIGINT NOT NULL,
+  shipment_id STRING NOT NULL,
+  PRIMARY KEY (shipment_key),
+  UNIQUE (shipment_id)
+);
+
+CREATE TABLE IF NOT EXISTS DIM_STATUS (status_code SMALLINT NOT NULL, status STRING NOT NULL, PRIMARY KEY (status_code));
+CREATE TABLE IF NOT EXISTS DIM_EVENT_TYPE (event_type_code SMALLINT NOT NULL, event_type STRING NOT NULL, PRIMARY KEY (event_type_code));
+CREATE TABLE IF NOT EXISTS DIM_COST_TYPE (cost_type_code SMALLINT NOT NULL, cost_type STRING NOT NULL, PRIMARY KEY (cost_type_code));
+CREATE TABLE IF NOT EXISTS DIM_CALC_METHOD (calc_method_code SMALLINT NOT NULL, calc_method STRING NOT NULL, PRIMARY KEY (calc_method_code));
+
+-- Fixed codes for the documented values (01_tables.sql comments); unseen values get the next code below
+INSERT INTO DIM_STATUS
+SELECT v.column1, v.column2
+FROM VALUES (1, 'Tendered'), (2, 'Accepted'), (3, 'In-Transit'), (4, 'Delivered'), (5, 'Exception'), (6, 'Cancelled') v
+WHERE v.column2 NOT IN (SELECT status FROM DIM_STATUS);
+
+INSERT INTO DIM_EVENT_TYPE
+SELECT v.column1, v.column2
+FROM VALUES (1, 'Tendered'), (2, 'Accepted'), (3, 'AtOrigin'), (4, 'PickedUp'), (5, 'AtDest'),
+            (6, 'Delivered'), (7, 'Exception'), (8, 'DwellStart'), (9, 'DwellEnd') v
+WHERE v.column2 NOT IN (SELECT event_type FROM DIM_EVENT_TYPE);
+
+INSERT INTO DIM_COST_TYPE
+SELECT v.column1, v.column2
+FROM VALUES (1, 'Base'), (2, 'Fuel'), (3, 'Accessorial: Detention'), (4, 'Accessorial: Lumper'),
+            (5, 'Accessorial: Layover'), (6, 'Accessorial: TONU') v
+WHERE v.column2 NOT IN (SELECT cost_type FROM DIM_COST_TYPE);
+
+INSERT INTO DIM_CALC_METHOD
+SELECT v.column1, v.column2
+FROM VALUES (1, 'flat'), (2, 'per-mile'), (3, 'index') v
+WHERE v.column2 NOT IN (SELECT calc_method FROM DIM_CALC_METHOD);
+
+-- Refresh: new shipment IDs and code values get the next free numbers (in ID/value order)
+INSERT INTO DIM_SHIPMENT (shipment_key, shipment_id)
+SELECT COALESCE(m.max_key, 0) + ROW_NUMBER() OVER (ORDER BY n.shipment_id), n.shipment_id
+FROM (
+  SELECT shipment_id FROM FACT_SHIPMENT WHERE shipment_id IS NOT NULL
+  UNION SELECT shipment_id FROM FACT_EVENT WHERE shipment_id IS NOT NULL
+  UNION SELECT shipment_id FROM FACT_COST WHERE shipment_id IS NOT NULL
+) n
+CROSS JOIN (SELECT MAX(shipment_key) AS max_key FROM DIM_SHIPMENT) m
+WHERE NOT EXISTS (SELECT 1 FROM DIM_SHIPMENT k WHERE k.shipment_id = n.shipment_id);
+
+INSERT INTO DIM_STATUS (status_code, status)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.status), n.status
+FROM (SELECT DISTINCT status FROM FACT_SHIPMENT WHERE status IS NOT NULL) n
+CROSS JOIN (SELECT MAX(status_code) AS max_code FROM DIM_STATUS) m
+WHERE n.status NOT IN (SELECT status FROM DIM_STATUS);
+
+INSERT INTO DIM_EVENT_TYPE (event_type_code, event_type)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.event_type), n.event_type
+FROM (SELECT DISTINCT event_type FROM FACT_EVENT WHERE event_type IS NOT NULL) n
+CROSS JOIN (SELECT MAX(event_type_code) AS max_code FROM DIM_EVENT_TYPE) m
+WHERE n.event_type NOT IN (SELECT event_type FROM DIM_EVENT_TYPE);
+
+INSERT INTO DIM_COST_TYPE (cost_type_code, cost_type)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.cost_type), n.cost_type
+FROM (SELECT DISTINCT cost_type FROM FACT_COST WHERE cost_type IS NOT NULL) n
+CROSS JOIN (SELECT MAX(cost_type_code) AS max_code FROM DIM_COST_TYPE) m
+WHERE n.cost_type NOT IN (SELECT cost_type FROM DIM_COST_TYPE);
+
+INSERT INTO DIM_CALC_METHOD (calc_method_code, calc_method)
+SELECT COALESCE(m.max_code, 0) + ROW_NUMBER() OVER (ORDER BY n.calc_method), n.calc_method
+FROM (SELECT DISTINCT calc_method FROM FACT_COST WHERE calc_method IS NOT NULL) n
+CROSS JOIN (SELECT MAX(calc_method_code) AS max_code FROM DIM_CALC_METHOD) m
+WHERE n.calc_method NOT IN (SELECT calc_method FROM DIM_CALC_METHOD);
+
+CREATE TABLE IF NOT EXISTS FACT_SHIPMENT_COMPACT
+  CLUSTER BY (delivery_date)
+AS
+SELECT
+  k.shipment_key,
+  f.leg_id,
+  f.customer_id,
+  f.carrier_id,
+  f.equipment_id,
+  f.origin_loc_id,
+  f.dest_loc_id,
+  f.lane_id,
+  f.tender_ts,
+  f.pickup_plan_ts,
+  f.pickup_actual_ts,
+  f.delivery_plan_ts,
+  f.delivery_actual_ts,
+  f.delivery_date,
+  f.planned_miles,
+  f.actual_miles,
+  f.pieces,
+  f.weight_lbs,
+  f.cube,
+  f.revenue,
+  f.total_cost,
+  f.fuel_surcharge,
+  f.accessorial_cost,
+  sc.status_code,
+  f.isdeliveredontime,
+  f.isinfull,
+  f.isotif,
+  f.cancel_flag,
+  f.load_date,
+  f.update_date,
+  f.row_hash
+FROM FACT_SHIPMENT_TYPED f
+JOIN DIM_SHIPMENT k ON k.shipment_id = f.shipment_id
+LEFT JOIN DIM_STATUS sc ON sc.status = f.status;
+
+-- Clustered on the event code, so the tender and exception scans prune to their event types
+CREATE TABLE IF NOT EXISTS FACT_EVENT_COMPACT
+  CLUSTER BY (event_type_code)
+AS
+SELECT
+  k.shipment_key,
+  e.event_seq,
+  et.event_type_code,
+  e.event_ts,
+  e.facility_loc_id,
+  e.notes,
+  e.load_date,
+  e.update_date,
+  e.row_hash
+FROM FACT_EVENT_TYPED e
+JOIN DIM_SHIPMENT k ON k.shipment_id = e.shipment_id
+LEFT JOIN DIM_EVENT_TYPE et ON et.event_type = e.event_type;
+
+CREATE TABLE IF NOT EXISTS FACT_COST_COMPACT AS
+SELECT
+  k.shipment_key,
+  ct.cost_type_code,
+  cm.calc_method_code,
+  c.rate_ref,
+  c.cost_amount,
+  c.currency,
+  c.load_date,
+  c.update_date,
+  COALESCE(c.row_hash, TO_VARCHAR(HASH(c.*))) AS row_hash
+FROM FACT_COST c
+JOIN DIM_SHIPMENT k ON k.shipment_id = c.shipment_id
+LEFT JOIN DIM_COST_TYPE ct ON ct.cost_type = c.cost_type
+LEFT JOIN DIM_CALC_METHOD cm ON cm.calc_method = c.calc_method;
+
+-- Compact facts built before they carried row_hash are rewritten once by the MERGEs below
+ALTER TABLE FACT_SHIPMENT_COMPACT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_EVENT_COMPACT ADD COLUMN IF NOT EXISTS row_hash STRING;
+ALTER TABLE FACT_COST_COMPACT ADD COLUMN IF NOT EXISTS row_hash STRING;
+
+-- Existing tables: bring them up to date with the typed layer, rewriting changed rows only
+MERGE INTO FACT_SHIPMENT_COMPACT t
+USING (
+  SELECT
+    k.shipment_key, f.leg_id, f.customer_id, f.carrier_id, f.equipment_id, f.origin_loc_id,
+    f.dest_loc_id, f.lane_id, f.tender_ts, f.pickup_plan_ts, f.pickup_actual_ts, f.delivery_plan_ts,
+    f.delivery_actual_ts, f.delivery_date, f.planned_miles, f.actual_miles, f.pieces, f.weight_lbs,
+    f.cube, f.revenue, f.total_cost, f.fuel_surcharge, f.accessorial_cost, sc.status_code,
+    f.isdeliveredontime, f.isinfull, f.isotif, f.cancel_flag, f.load_date, f.update_date, f.row_hash
+  FROM FACT_SHIPMENT_TYPED f
+  JOIN DIM_SHIPMENT k ON k.shipment_id = f.shipment_id
+  LEFT JOIN DIM_STATUS sc ON sc.status = f.status
+) s
+ON t.shipment_key = s.shipment_key AND t.leg_id = s.leg_id
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  customer_id=s.customer_id, carrier_id=s.carrier_id, equipment_id=s.equipment_id,
+  origin_loc_id=s.origin_loc_id, dest_loc_id=s.dest_loc_id, lane_id=s.lane_id, tender_ts=s.tender_ts,
+  pickup_plan_ts=s.pickup_plan_ts, pickup_actual_ts=s.pickup_actual_ts,
+  delivery_plan_ts=s.delivery_plan_ts, delivery_actual_ts=s.delivery_actual_ts,
+  delivery_date=s.delivery_date, planned_miles=s.planned_miles, actual_miles=s.actual_miles,
+  pieces=s.pieces, weight_lbs=s.weight_lbs, cube=s.cube, revenue=s.revenue, total_cost=s.total_cost,
+  fuel_surcharge=s.fuel_surcharge, accessorial_cost=s.accessorial_cost, status_code=s.status_code,
+  isdeliveredontime=s.isdeliveredontime, isinfull=s.isinfull, isotif=s.isotif,
+  cancel_flag=s.cancel_flag, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (
+  shipment_key, leg_id, customer_id, carrier_id, equipment_id, origin_loc_id, dest_loc_id, lane_id,
+  tender_ts, pickup_plan_ts, pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, delivery_date,
+  planned_miles, actual_miles, pieces, weight_lbs, cube, revenue, total_cost, fuel_surcharge,
+  accessorial_cost, status_code, isdeliveredontime, isinfull, isotif, cancel_flag, load_date,
+  update_date, row_hash
+) VALUES (
+  s.shipment_key, s.leg_id, s.customer_id, s.carrier_id, s.equipment_id, s.origin_loc_id,
+  s.dest_loc_id, s.lane_id, s.tender_ts, s.pickup_plan_ts, s.pickup_actual_ts, s.delivery_plan_ts,
+  s.delivery_actual_ts, s.delivery_date, s.planned_miles, s.actual_miles, s.pieces, s.weight_lbs,
+  s.cube, s.revenue, s.total_cost, s.fuel_surcharge, s.accessorial_cost, s.status_code,
+  s.isdeliveredontime, s.isinfull, s.isotif, s.cancel_flag, s.load_date, s.update_date, s.row_hash
+);
+
+MERGE INTO FACT_EVENT_COMPACT t
+USING (
+  SELECT k.shipment_key, e.event_seq, et.event_type_code, e.event_ts, e.facility_loc_id, e.notes,
+         e.load_date, e.update_date, e.row_hash
+  FROM FACT_EVENT_TYPED e
+  JOIN DIM_SHIPMENT k ON k.shipment_id = e.shipment_id
+  LEFT JOIN DIM_EVENT_TYPE et ON et.event_type = e.event_type
+) s
+ON t.shipment_key = s.shipment_key AND t.event_seq = s.event_seq
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  event_type_code=s.event_type_code, event_ts=s.event_ts, facility_loc_id=s.facility_loc_id, notes=s.notes, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (shipment_key, event_seq, event_type_code, event_ts, facility_loc_id, notes, load_date, update_date, row_hash)
+VALUES (s.shipment_key, s.event_seq, s.event_type_code, s.event_ts, s.facility_loc_id, s.notes, s.load_date, s.update_date, s.row_hash);
+
+MERGE INTO FACT_COST_COMPACT t
+USING (
+  SELECT k.shipment_key, ct.cost_type_code, cm.calc_method_code, c.rate_ref, c.cost_amount, c.currency,
+         c.load_date, c.update_date, COALESCE(c.row_hash, TO_VARCHAR(HASH(c.*))) AS row_hash
+  FROM FACT_COST c
+  JOIN DIM_SHIPMENT k ON k.shipment_id = c.shipment_id
+  LEFT JOIN DIM_COST_TYPE ct ON ct.cost_type = c.cost_type
+  LEFT JOIN DIM_CALC_METHOD cm ON cm.calc_method = c.calc_method
+) s
+ON t.shipment_key = s.shipment_key AND t.cost_type_code = s.cost_type_code AND NVL(t.rate_ref, '') = NVL(s.rate_ref, '')
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  calc_method_code=s.calc_method_code, cost_amount=s.cost_amount, currency=s.currency, load_date=s.load_date, update_date=s.update_date, row_hash=s.row_hash
+WHEN NOT MATCHED THEN INSERT (shipment_key, cost_type_code, rate_ref, calc_method_code, cost_amount, currency, load_date, update_date, row_hash)
+VALUES (s.shipment_key, s.cost_type_code, s.rate_ref, s.calc_method_code, s.cost_amount, s.currency, s.load_date, s.update_date, s.row_hash);
+
+-- Verification (optional): every fact row found its key, and the sizes of both layouts
+-- SELECT (SELECT COUNT(*) FROM FACT_SHIPMENT_TYPED) AS typed_rows, (SELECT COUNT(*) FROM FACT_SHIPMENT_COMPACT) AS compact_rows;
+-- SELECT TABLE_NAME, ROW_COUNT, BYTES FROM INFORMATION_SCHEMA.TABLES
+--  WHERE TABLE_SCHEMA = CURRENT_SCHEMA() AND TABLE_NAME LIKE 'FACT_%' ORDER BY TABLE_NAME;
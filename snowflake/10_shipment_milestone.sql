@@ -0,0 +1,118 @@
+-- Shipment milestone accumulating snapshot (FACT_SHIPMENT_MILESTONE). Replace <DATABASE>, <STG_SCHEMA>,
+-- <EDW_SCHEMA> as needed. Safe to re-run.
+--
+-- One row per shipment: the earliest Tendered/Accepted/PickedUp/AtDest/Delivered timestamps, total
+-- dwell minutes (n-th DwellStart paired with the n-th DwellEnd), exception count and the first
+-- exception type, plus the first leg's filter columns and delivery date. The app reads tender
+-- acceptance and dwell from it as single-table filtered scans instead of aggregating FACT_EVENT
+-- and joining it back to FACT_SHIPMENT on every rerun. The exception heatmap stays on the events,
+-- since a shipment's exceptions can be of several types.
+--
+-- Incremental: only shipments present in this batch's STG FACT_EVENT or FACT_SHIPMENT are
+-- recomputed, from their full EDW event history, so late events update an existing row.
+-- Run after 03_merge_upserts.sql; the Keboola curation (10_curate_edw.sql step 4) does the same.
+-- The generator also writes FACT_SHIPMENT_MILESTONE.csv with identical rules, so STG can be
+-- compared against this build (04_quality_checks.sql).
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+ALTER SESSION SET TIMESTAMP_INPUT_FORMAT = 'AUTO';
+
+MERGE INTO FACT_SHIPMENT_MILESTONE t
+USING (
+  WITH touched AS (
+    SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_EVENT')
+    UNION
+    SELECT shipment_id FROM IDENTIFIER('<STG_SCHEMA>.FACT_SHIPMENT')
+  ),
+  ev AS (
+    SELECT e.shipment_id, e.event_seq, e.event_type, e.notes,
+           TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(e.event_ts::VARCHAR), '')) AS event_ts
+    FROM FACT_EVENT e
+    JOIN touched USING (shipment_id)
+  ),
+  dwell_seq AS (
+    SELECT shipment_id, event_type, event_ts,
+           ROW_NUMBER() OVER (PARTITION BY shipment_id, event_type ORDER BY event_ts, event_seq) AS n
+    FROM ev
+    WHERE event_type IN ('DwellStart', 'DwellEnd')
+  ),
+  dwell AS (
+    SELECT b.shipment_id, SUM(FLOOR(DATEDIFF('second', b.event_ts, d.event_ts) / 60)) AS dwell_minutes
+    FROM dwell_seq b
+    JOIN dwell_seq d ON d.shipment_id = b.shipment_id AND d.n = b.n AND d.event_type = 'DwellEnd'
+    WHERE b.event_type = 'DwellStart'
+    GROUP BY b.shipment_id
+  ),
+  agg AS (
+    SELECT shipment_id,
+           MIN(IFF(event_type = 'Tendered', event_ts, NULL)) AS tendered_ts,
+           MIN(IFF(event_type = 'Accepted', event_ts, NULL)) AS accepted_ts,
+           MIN(IFF(event_type = 'PickedUp', event_ts, NULL)) AS picked_up_ts,
+           MIN(IFF(event_type = 'AtDest', event_ts, NULL)) AS at_dest_ts,
+           MIN(IFF(event_type = 'Delivered', event_ts, NULL)) AS delivered_ts,
+           COUNT_IF(event_type = 'Exception') AS exception_count
+    FROM ev
+    GROUP BY shipment_id
+  ),
+  first_ex AS (
+    SELECT shipment_id, COALESCE(NULLIF(TRIM(notes), ''), 'Unknown') AS first_exception_type
+    FROM ev
+    WHERE event_type = 'Exception'
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY shipment_id ORDER BY event_ts, event_seq) = 1
+  ),
+  leg AS (
+    SELECT f.shipment_id, f.customer_id, f.carrier_id, f.equipment_id, f.lane_id,
+           CAST(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts::VARCHAR), '')) AS DATE) AS delivery_date
+    FROM FACT_SHIPMENT f
+    JOIN touched USING (shipment_id)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY f.shipment_id ORDER BY f.leg_id) = 1
+  )
+  SELECT
+    l.shipment_id, l.customer_id, l.carrier_id, l.equipment_id, l.lane_id, l.delivery_date,
+    a.tendered_ts, a.accepted_ts, a.picked_up_ts, a.at_dest_ts, a.delivered_ts,
+    d.dwell_minutes,
+    COALESCE(a.exception_count, 0) AS exception_count,
+    x.first_exception_type,
+    TO_VARCHAR(HASH(
+      l.shipment_id, l.customer_id, l.carrier_id, l.equipment_id, l.lane_id, l.delivery_date,
+      a.tendered_ts, a.accepted_ts, a.picked_up_ts, a.at_dest_ts, a.delivered_ts,
+      d.dwell_minutes, a.exception_count, x.first_exception_type
+    )) AS src_hash
+  FROM leg l
+  LEFT JOIN agg a ON a.shipment_id = l.shipment_id
+  LEFT JOIN dwell d ON d.shipment_id = l.shipment_id
+  LEFT JOIN first_ex x ON x.shipment_id = l.shipment_id
+) s
+ON t.shipment_id = s.shipment_id
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.src_hash THEN UPDATE SET
+  customer_id = s.customer_id,
+  carrier_id = s.carrier_id,
+  equipment_id = s.equipment_id,
+  lane_id = s.lane_id,
+  delivery_date = s.delivery_date,
+  tendered_ts = s.tendered_ts,
+  accepted_ts = s.accepted_ts,
+  picked_up_ts = s.picked_up_ts,
+  at_dest_ts = s.at_dest_ts,
+  delivered_ts = s.delivered_ts,
+  dwell_minutes = s.dwell_minutes,
+  exception_count = s.exception_count,
+  first_exception_type = s.first_exception_type,
+  update_date = CURRENT_TIMESTAMP(),
+  row_hash = s.src_hash
+WHEN NOT MATCHED THEN INSERT (
+  shipment_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+  tendered_ts, accepted_ts, picked_up_ts, at_dest_ts, delivered_ts,
+  dwell_minutes, exception_count, first_exception_type, load_date, update_date, row_hash
+) VALUES (
+  s.shipment_id, s.customer_id, s.carrier_id, s.equipment_id, s.lane_id, s.delivery_date,
+  s.tendered_ts, s.accepted_ts, s.picked_up_ts, s.at_dest_ts, s.delivered_ts,
+  s.dwell_minutes, s.exception_count, s.first_exception_type,
+  CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP(), s.src_hash
+);
+
+-- Verification (optional): every EDW shipment has exactly one milestone row
+-- SELECT (SELECT COUNT(DISTINCT shipment_id) FROM FACT_SHIPMENT) AS shipments,
+--        (SELECT COUNT(*) FROM FACT_SHIPMENT_MILESTONE) AS milestones;
@@ -0,0 +1,95 @@
+-- Stratified shipment sample for the app's approximate mode (optional). Replace <DATABASE>,
+-- <EDW_SCHEMA> as needed. Safe to re-run.
+--
+-- FACT_SHIPMENT_SAMPLE keeps a simple random sample of legs per (lane_id, customer_id) stratum:
+-- 1% of the stratum, but at least 30 legs (small strata are kept whole), chosen by a seeded hash
+-- so a rebuild of unchanged data picks the same rows. sample_weight is the stratum's inverse
+-- sampling rate (stratum legs / sampled legs), so weighted sums estimate the full fact under
+-- any filter. Only the columns the approximate lane panel and the sidebar filters read are kept.
+-- Unlike a Bernoulli sample of FACT_SHIPMENT_TYPED, reading it does not scan the full fact, and
+-- every lane and customer is represented however rare.
+--
+-- Builds from the typed layer, so run 07_typed_serving.sql first. The first run creates the
+-- table; later runs recompute every stratum and MERGE the result, rewriting a row only when its
+-- leg or weight changed (row_hash) and deleting legs that left the sample, so re-running over
+-- unchanged data writes nothing (and leaves the app's result cache valid). After each curation,
+-- keboola/transformations/sql/30_shipment_sample.sql applies the same refresh to the strata of
+-- the batch. Drop the table to make approximate mode fall back to Bernoulli sampling.
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+CREATE TABLE IF NOT EXISTS FACT_SHIPMENT_SAMPLE
+  CLUSTER BY (delivery_date)
+AS
+WITH strata AS (
+  SELECT
+    shipment_id, leg_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+    pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, row_hash,
+    COUNT(*) OVER (PARTITION BY lane_id, customer_id) AS stratum_rows,
+    ROW_NUMBER() OVER (PARTITION BY lane_id, customer_id ORDER BY HASH(shipment_id, leg_id, 7)) AS stratum_rank
+  FROM FACT_SHIPMENT_TYPED
+), sized AS (
+  SELECT s.*, LEAST(stratum_rows, GREATEST(30, CEIL(stratum_rows * 0.01))) AS stratum_keep
+  FROM strata s
+)
+SELECT
+  shipment_id, leg_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+  pickup_actual_ts, delivery_plan_ts, delivery_actual_ts,
+  stratum_rows::FLOAT / stratum_keep AS sample_weight,
+  TO_VARCHAR(HASH(row_hash, stratum_rows::FLOAT / stratum_keep)) AS row_hash
+FROM sized
+WHERE stratum_rank <= stratum_keep;
+
+-- Samples built before they carried row_hash are rewritten once by the MERGE below
+ALTER TABLE FACT_SHIPMENT_SAMPLE ADD COLUMN IF NOT EXISTS row_hash STRING;
+
+-- Existing table: bring every stratum up to date with the typed layer, rewriting changed rows only
+MERGE INTO FACT_SHIPMENT_SAMPLE t
+USING (
+  WITH strata AS (
+    SELECT
+      shipment_id, leg_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+      pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, row_hash,
+      COUNT(*) OVER (PARTITION BY lane_id, customer_id) AS stratum_rows,
+      ROW_NUMBER() OVER (PARTITION BY lane_id, customer_id ORDER BY HASH(shipment_id, leg_id, 7)) AS stratum_rank
+    FROM FACT_SHIPMENT_TYPED
+  ), sized AS (
+    SELECT s.*, LEAST(stratum_rows, GREATEST(30, CEIL(stratum_rows * 0.01))) AS stratum_keep
+    FROM strata s
+  ), kept AS (
+    SELECT
+      shipment_id, leg_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+      pickup_actual_ts, delivery_plan_ts, delivery_actual_ts,
+      stratum_rows::FLOAT / stratum_keep AS sample_weight,
+      TO_VARCHAR(HASH(row_hash, stratum_rows::FLOAT / stratum_keep)) AS row_hash
+    FROM sized
+    WHERE stratum_rank <= stratum_keep
+  )
+  SELECT k.*, FALSE AS dropped FROM kept k
+  UNION ALL
+  -- Sampled legs that are no longer kept (their stratum grew or shrank, or they moved stratum)
+  SELECT
+    p.shipment_id, p.leg_id, p.customer_id, p.carrier_id, p.equipment_id, p.lane_id, p.delivery_date,
+    p.pickup_actual_ts, p.delivery_plan_ts, p.delivery_actual_ts, p.sample_weight, p.row_hash, TRUE
+  FROM FACT_SHIPMENT_SAMPLE p
+  WHERE NOT EXISTS (SELECT 1 FROM kept k WHERE k.shipment_id = p.shipment_id AND k.leg_id = p.leg_id)
+) s
+ON t.shipment_id = s.shipment_id AND t.leg_id = s.leg_id
+WHEN MATCHED AND s.dropped THEN DELETE
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  customer_id=s.customer_id, carrier_id=s.carrier_id, equipment_id=s.equipment_id, lane_id=s.lane_id,
+  delivery_date=s.delivery_date, pickup_actual_ts=s.pickup_actual_ts, delivery_plan_ts=s.delivery_plan_ts,
+  delivery_actual_ts=s.delivery_actual_ts, sample_weight=s.sample_weight, row_hash=s.row_hash
+WHEN NOT MATCHED AND NOT s.dropped THEN INSERT (
+  shipment_id, leg_id, customer_id, carrier_id, equipment_id, lane_id, delivery_date,
+  pickup_actual_ts, delivery_plan_ts, delivery_actual_ts, sample_weight, row_hash
+) VALUES (
+  s.shipment_id, s.leg_id, s.customer_id, s.carrier_id, s.equipment_id, s.lane_id, s.delivery_date,
+  s.pickup_actual_ts, s.delivery_plan_ts, s.delivery_actual_ts, s.sample_weight, s.row_hash
+);
+
+-- Verification (optional): weights add back up to the fact, per stratum and overall
+-- SELECT (SELECT COUNT(*) FROM FACT_SHIPMENT_TYPED) AS legs,
+--        (SELECT ROUND(SUM(sample_weight)) FROM FACT_SHIPMENT_SAMPLE) AS estimated_legs,
+--        (SELECT COUNT(*) FROM FACT_SHIPMENT_SAMPLE) AS sampled_legs;
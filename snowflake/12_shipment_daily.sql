@@ -0,0 +1,120 @@
+-- Daily summary with quantile sketches (FACT_SHIPMENT_DAILY, optional). Replace <DATABASE>,
+-- <EDW_SCHEMA> as needed. Safe to re-run.
+--
+-- One row per delivery_date × lane_id × carrier_id with the delivered leg count and mergeable
+-- t-digest states (APPROX_PERCENTILE_ACCUMULATE) of:
+--   transit_hours_sketch   pickup -> delivery, in hours, per delivered leg (FACT_SHIPMENT_TYPED)
+--   dwell_minutes_sketch   total dwell per shipment that dwelled (FACT_SHIPMENT_MILESTONE)
+-- The app's percentile panels merge the rows a view selects with APPROX_PERCENTILE_COMBINE and
+-- read p50/p90/p99 with APPROX_PERCENTILE_ESTIMATE: a scan of a few rows per day instead of
+-- the fact. Views filtered by customer or equipment are outside this grain; the app answers
+-- those with APPROX_PERCENTILE over the facts.
+--
+-- Builds from the typed layer and the milestone snapshot, so run 07_typed_serving.sql and
+-- 10_shipment_milestone.sql first. The first run creates the table; later runs recompute every
+-- cell and MERGE it, rewriting a row only when the legs or shipments under it changed (row_hash
+-- is HASH_AGG of their row_hashes, not of the sketch) and deleting cells left empty, so
+-- re-running over unchanged data writes nothing (and leaves the app's result cache valid).
+-- After each curation, keboola/transformations/sql/40_shipment_daily.sql applies the same
+-- refresh to the days of the batch. Drop the table to make the app read the facts again.
+
+USE DATABASE IDENTIFIER('<DATABASE>');
+USE SCHEMA IDENTIFIER('<EDW_SCHEMA>');
+
+CREATE TABLE IF NOT EXISTS FACT_SHIPMENT_DAILY
+  CLUSTER BY (delivery_date)
+AS
+WITH legs AS (
+  SELECT delivery_date, lane_id, carrier_id,
+         COUNT(*) AS legs,
+         APPROX_PERCENTILE_ACCUMULATE(DATEDIFF('minute', pickup_actual_ts, delivery_actual_ts) / 60) AS transit_hours_sketch,
+         HASH_AGG(row_hash) AS legs_hash
+  FROM FACT_SHIPMENT_TYPED
+  WHERE delivery_date IS NOT NULL AND pickup_actual_ts IS NOT NULL
+  GROUP BY delivery_date, lane_id, carrier_id
+), dwell AS (
+  SELECT delivery_date, lane_id, carrier_id,
+         COUNT(*) AS dwell_shipments,
+         APPROX_PERCENTILE_ACCUMULATE(dwell_minutes) AS dwell_minutes_sketch,
+         HASH_AGG(row_hash) AS dwell_hash
+  FROM FACT_SHIPMENT_MILESTONE
+  WHERE delivery_date IS NOT NULL AND dwell_minutes IS NOT NULL
+  GROUP BY delivery_date, lane_id, carrier_id
+)
+SELECT
+  COALESCE(l.delivery_date, d.delivery_date) AS delivery_date,
+  COALESCE(l.lane_id, d.lane_id) AS lane_id,
+  COALESCE(l.carrier_id, d.carrier_id) AS carrier_id,
+  COALESCE(l.legs, 0) AS legs,
+  l.transit_hours_sketch,
+  COALESCE(d.dwell_shipments, 0) AS dwell_shipments,
+  d.dwell_minutes_sketch,
+  TO_VARCHAR(HASH(l.legs_hash, d.dwell_hash)) AS row_hash
+FROM legs l
+FULL OUTER JOIN dwell d
+  ON d.delivery_date = l.delivery_date AND d.lane_id = l.lane_id AND d.carrier_id = l.carrier_id;
+
+-- Summaries built before they carried row_hash are rewritten once by the MERGE below
+ALTER TABLE FACT_SHIPMENT_DAILY ADD COLUMN IF NOT EXISTS row_hash STRING;
+
+-- Existing table: bring every cell up to date, rewriting changed cells only
+MERGE INTO FACT_SHIPMENT_DAILY t
+USING (
+  WITH legs AS (
+    SELECT delivery_date, lane_id, carrier_id,
+           COUNT(*) AS legs,
+           APPROX_PERCENTILE_ACCUMULATE(DATEDIFF('minute', pickup_actual_ts, delivery_actual_ts) / 60) AS transit_hours_sketch,
+           HASH_AGG(row_hash) AS legs_hash
+    FROM FACT_SHIPMENT_TYPED
+    WHERE delivery_date IS NOT NULL AND pickup_actual_ts IS NOT NULL
+    GROUP BY delivery_date, lane_id, carrier_id
+  ), dwell AS (
+    SELECT delivery_date, lane_id, carrier_id,
+           COUNT(*) AS dwell_shipments,
+           APPROX_PERCENTILE_ACCUMULATE(dwell_minutes) AS dwell_minutes_sketch,
+           HASH_AGG(row_hash) AS dwell_hash
+    FROM FACT_SHIPMENT_MILESTONE
+    WHERE delivery_date IS NOT NULL AND dwell_minutes IS NOT NULL
+    GROUP BY delivery_date, lane_id, carrier_id
+  ), cells AS (
+    SELECT
+      COALESCE(l.delivery_date, d.delivery_date) AS delivery_date,
+      COALESCE(l.lane_id, d.lane_id) AS lane_id,
+      COALESCE(l.carrier_id, d.carrier_id) AS carrier_id,
+      COALESCE(l.legs, 0) AS legs,
+      l.transit_hours_sketch,
+      COALESCE(d.dwell_shipments, 0) AS dwell_shipments,
+      d.dwell_minutes_sketch,
+      TO_VARCHAR(HASH(l.legs_hash, d.dwell_hash)) AS row_hash
+    FROM legs l
+    FULL OUTER JOIN dwell d
+      ON d.delivery_date = l.delivery_date AND d.lane_id = l.lane_id AND d.carrier_id = l.carrier_id
+  )
+  SELECT c.*, FALSE AS dropped FROM cells c
+  UNION ALL
+  -- Cells with no legs or dwell left (every leg moved to another day, lane or carrier)
+  SELECT
+    p.delivery_date, p.lane_id, p.carrier_id, p.legs, p.transit_hours_sketch, p.dwell_shipments,
+    p.dwell_minutes_sketch, p.row_hash, TRUE
+  FROM FACT_SHIPMENT_DAILY p
+  WHERE NOT EXISTS (
+    SELECT 1 FROM cells c
+    WHERE c.delivery_date = p.delivery_date AND EQUAL_NULL(c.lane_id, p.lane_id) AND EQUAL_NULL(c.carrier_id, p.carrier_id)
+  )
+) s
+ON t.delivery_date = s.delivery_date AND EQUAL_NULL(t.lane_id, s.lane_id) AND EQUAL_NULL(t.carrier_id, s.carrier_id)
+WHEN MATCHED AND s.dropped THEN DELETE
+WHEN MATCHED AND t.row_hash IS DISTINCT FROM s.row_hash THEN UPDATE SET
+  legs=s.legs, transit_hours_sketch=s.transit_hours_sketch, dwell_shipments=s.dwell_shipments,
+  dwell_minutes_sketch=s.dwell_minutes_sketch, row_hash=s.row_hash
+WHEN NOT MATCHED AND NOT s.dropped THEN INSERT (
+  delivery_date, lane_id, carrier_id, legs, transit_hours_sketch, dwell_shipments, dwell_minutes_sketch, row_hash
+) VALUES (
+  s.delivery_date, s.lane_id, s.carrier_id, s.legs, s.transit_hours_sketch, s.dwell_shipments, s.dwell_minutes_sketch, s.row_hash
+);
+
+-- Verification (optional): merged sketch against the exact percentile over the fact
+-- SELECT APPROX_PERCENTILE_ESTIMATE(APPROX_PERCENTILE_COMBINE(transit_hours_sketch), 0.9) AS sketch_p90,
+--        (SELECT PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY DATEDIFF('minute', pickup_actual_ts, delivery_actual_ts) / 60)
+--         FROM FACT_SHIPMENT_TYPED WHERE delivery_date IS NOT NULL AND pickup_actual_ts IS NOT NULL) AS exact_p90
+-- FROM FACT_SHIPMENT_DAILY;
@@ -9,7 +9,8 @@ CREATE OR REPLACE TABLE DIM_CUSTOMER (
   SEGMENT VARCHAR,
   REGION VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE DIM_CARRIER (
@@ -19,7 +20,8 @@ CREATE OR REPLACE TABLE DIM_CARRIER (
   MC_NUMBER VARCHAR,
   SCORE_TIER VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE DIM_EQUIPMENT (
@@ -27,7 +29,8 @@ CREATE OR REPLACE TABLE DIM_EQUIPMENT (
   TYPE VARCHAR,
   CAPACITY_LBS VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE DIM_LOCATION (
@@ -39,7 +42,8 @@ CREATE OR REPLACE TABLE DIM_LOCATION (
   TIMEZONE VARCHAR,
   TYPE VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE DIM_LANE (
@@ -49,7 +53,8 @@ CREATE OR REPLACE TABLE DIM_LANE (
   STANDARD_MILES VARCHAR,
   STD_TRANSIT_DAYS VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE DIM_DATE (
@@ -62,7 +67,8 @@ CREATE OR REPLACE TABLE DIM_DATE (
   DOW VARCHAR,
   IS_WEEKEND VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE FACT_SHIPMENT (
@@ -94,7 +100,8 @@ CREATE OR REPLACE TABLE FACT_SHIPMENT (
   ISOTIF VARCHAR,
   CANCEL_FLAG VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE FACT_EVENT (
@@ -105,7 +112,8 @@ CREATE OR REPLACE TABLE FACT_EVENT (
   FACILITY_LOC_ID VARCHAR,
   NOTES VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
 CREATE OR REPLACE TABLE FACT_COST (
@@ -116,6 +124,27 @@ CREATE OR REPLACE TABLE FACT_COST (
   COST_AMOUNT VARCHAR,
   CURRENCY VARCHAR,
   LOAD_DATE VARCHAR,
-  UPDATE_DATE VARCHAR
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
+);
+
+CREATE OR REPLACE TABLE FACT_SHIPMENT_MILESTONE (
+  SHIPMENT_ID VARCHAR,
+  CUSTOMER_ID VARCHAR,
+  CARRIER_ID VARCHAR,
+  EQUIPMENT_ID VARCHAR,
+  LANE_ID VARCHAR,
+  DELIVERY_DATE VARCHAR,
+  TENDERED_TS VARCHAR,
+  ACCEPTED_TS VARCHAR,
+  PICKED_UP_TS VARCHAR,
+  AT_DEST_TS VARCHAR,
+  DELIVERED_TS VARCHAR,
+  DWELL_MINUTES VARCHAR,
+  EXCEPTION_COUNT VARCHAR,
+  FIRST_EXCEPTION_TYPE VARCHAR,
+  LOAD_DATE VARCHAR,
+  UPDATE_DATE VARCHAR,
+  ROW_HASH VARCHAR
 );
 
@@ -1,10 +1,33 @@
+import hashlib
+import itertools
 import os
+import tempfile
+import time
+import uuid
 import pandas as pd
+import pyarrow as pa
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, astuple, replace
+from functools import partial
 from time import perf_counter
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 import streamlit as st
 
+import drill_export
+from instrumentation import QueryRecord, QueryStats
+from local_engine import LocalEngine
+from name_search import NameIndex
+from query_catalog import (
+    APPROX_PANELS, DEFAULT_GRACE, DEFAULT_SAMPLE_PCT, MILESTONES, PANEL_INPUTS, DrillPage, Filters, SchemaMap, View,
+    build_schema_sql, build_view_queries, canonical_schema_map, filters_from_json, query_name, render,
+    schema_map,
+)
+from query_control import AsyncJobHandle, Inflight, QueryHandle, ThreadHandle, wait as wait_query
+from result_cache import ResultCache
+from session_pool import PoolTimeout, SessionPool
+from warmup import Task, Warmer
+
 try:
     # Streamlit in Snowflake
     from snowflake.snowpark.context import get_active_session  # type: ignore
@@ -17,12 +40,13 @@ except Exception:  # pragma: no cover
     Session = None  # type: ignore
 
 
-@st.cache_resource(show_spinner=False)
-def get_session():
+def _new_session():
     """Return a Snowpark session.
 
-    - In Snowflake: use get_active_session.
+    - In Snowflake: use get_active_session (the app's one session; pooled slots share it).
     - Locally: build a Snowpark Session from environment variables.
+
+    Raises RuntimeError with a user-facing message when no session can be made.
     """
     if get_active_session is not None:
         try:
@@ -32,11 +56,10 @@ def get_session():
 
     # Local fallback
     if Session is None:
-        st.error(
+        raise RuntimeError(
             "Snowpark is not available. For local dev, install dependencies (requirements-dev.txt)\n"
             "and ensure snowflake-snowpark-python is installed."
         )
-        st.stop()
 
     required = [
         "SNOWFLAKE_ACCOUNT",
@@ -50,11 +73,10 @@ def get_session():
     ]
     missing = [k for k in required if os.getenv(k) in (None, "")]
     if missing:
-        st.error(
+        raise RuntimeError(
             "Missing environment for local run: " + ", ".join(missing) +
             "\nSource .env.snowflake or pass environment variables before running."
         )
-        st.stop()
 
     cfg = {
         "account": os.getenv("SNOWFLAKE_ACCOUNT"),
@@ -68,10 +90,50 @@ def get_session():
     try:
         return Session.builder.configs(cfg).create()
     except Exception as e:  # pragma: no cover
-        st.error(f"Failed to create Snowpark session locally: {e}")
+        raise RuntimeError(f"Failed to create Snowpark session locally: {e}") from e
+
+
+@st.cache_resource(show_spinner=False)
+def get_session():
+    """The app's main session (context, schema map, data version); panel queries use the pool."""
+    try:
+        return _new_session()
+    except RuntimeError as e:
+        st.error(str(e))
         st.stop()
 
 
+def _pooled_session():
+    """Pool factory: a new session with the app's session settings applied."""
+    session = _new_session()
+    for stmt in (
+        f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS={int(os.getenv('STATEMENT_TIMEOUT', '45'))}",
+        # Harmless with the typed layer; needed when EDW timestamps are VARCHAR
+        """ALTER SESSION SET TIMESTAMP_INPUT_FORMAT='YYYY-MM-DD"T"HH24:MI:SS.FF TZH:TZM'""",
+    ):
+        try:
+            session.sql(stmt).collect()
+        except Exception:
+            pass
+    return session
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_pool(is_local: bool) -> SessionPool:
+    """Process-wide pool bounding concurrent panel queries (SESSION_POOL_SIZE, default 4).
+
+    The local engine pools slot numbers instead of sessions, so CSV mode enforces the same
+    concurrency limits and queueing and can be load-tested offline.
+    """
+    slots = itertools.count()
+    return SessionPool(
+        (lambda: next(slots)) if is_local else _pooled_session,
+        size=int(os.getenv("SESSION_POOL_SIZE", "4")),
+        max_queue=int(os.getenv("SESSION_POOL_MAX_QUEUE", "16")),
+        wait_s=float(os.getenv("SESSION_POOL_WAIT_S", "60")),
+    )
+
+
 def _in_list(col: str, values: List[str]) -> str:
     if not values:
         return ""
@@ -79,86 +141,246 @@ def _in_list(col: str, values: List[str]) -> str:
     return f" AND {col} IN (" + ",".join([f"'{v}'" for v in esc]) + ")"
 
 
-def _filters_clause(
-    database: str,
-    edw_schema: str,
-    customers: List[str],
-    carriers: List[str],
-    equipment: List[str],
-    lanes: List[str],
-    date_start: Optional[str],
-    date_end: Optional[str],
-    quoted_tables: bool,
-    quoted_cols: bool,
-) -> str:
-    """Build a SQL filters clause using names (resolved to IDs inside SQL)."""
-    f = []
-    if date_start:
-        f.append(f" AND DATE(TRY_TO_TIMESTAMP_NTZ(f.delivery_actual_ts)) >= '{date_start}' ")
-    if date_end:
-        f.append(f" AND DATE(TRY_TO_TIMESTAMP_NTZ(f.delivery_actual_ts)) <= '{date_end}' ")
-
-    # Resolve table/column quoting based on variant
-    dim_customer_tbl = (
-        f"{database}.{edw_schema}.\"dim_customer\"" if quoted_tables else f"{database}.{edw_schema}.DIM_CUSTOMER"
-    )
-    dim_carrier_tbl = (
-        f"{database}.{edw_schema}.\"dim_carrier\"" if quoted_tables else f"{database}.{edw_schema}.DIM_CARRIER"
-    )
-    dim_equipment_tbl = (
-        f"{database}.{edw_schema}.\"dim_equipment\"" if quoted_tables else f"{database}.{edw_schema}.DIM_EQUIPMENT"
-    )
-    dim_lane_tbl = (
-        f"{database}.{edw_schema}.\"dim_lane\"" if quoted_tables else f"{database}.{edw_schema}.DIM_LANE"
-    )
-    dim_loc_tbl = (
-        f"{database}.{edw_schema}.\"dim_location\"" if quoted_tables else f"{database}.{edw_schema}.DIM_LOCATION"
+def local_schema_map(database: str, schema: str, engine: LocalEngine) -> SchemaMap:
+    """SchemaMap of CSV mode: canonical names, typed (the local store parses timestamps at load time)."""
+    return canonical_schema_map(database, schema, MILESTONES in engine.data)
+
+
+@st.cache_resource(show_spinner=False, ttl=int(os.getenv("SCHEMA_CACHE_TTL", "900")))
+def load_schema_map(_session, database: str, schema: str) -> SchemaMap:
+    """Introspect database.schema with a single INFORMATION_SCHEMA query.
+
+    Cached process-wide (shared by every viewer) and refreshed after SCHEMA_CACHE_TTL seconds.
+    """
+    rows = _session.sql(build_schema_sql(database), params=[schema.upper()]).collect()
+    return schema_map(database, schema, [(r[0], r[1]) for r in rows])
+
+
+@st.cache_resource(show_spinner=False)
+def get_query_stats() -> QueryStats:
+    """Process-wide query stats; QUERY_LOG (file path or http(s) URL) receives one JSON line per query."""
+    return QueryStats(window=int(os.getenv("QUERY_STATS_WINDOW", "500")), jsonl=os.getenv("QUERY_LOG") or None)
+
+
+def _snowflake_fetch(session, sql: str, params: tuple) -> pd.DataFrame:
+    """Fetch a result in the connector's native Arrow format (to_pandas() on Snowpark
+    versions without DataFrame.to_arrow)."""
+    return _snowpark_frame(session.sql(sql, params=list(params) if params else None))
+
+
+def _snowpark_frame(sp_df) -> pd.DataFrame:
+    to_arrow = getattr(sp_df, "to_arrow", None)
+    if to_arrow is not None:
+        return _arrow_frame(to_arrow())
+    df = sp_df.to_pandas()
+    return df.set_axis([str(c).lower() for c in df.columns], axis=1)
+
+
+def _arrow_frame(tbl: pa.Table) -> pd.DataFrame:
+    """Lowercase the column names (schema-only rename) and wrap the buffers as ArrowDtype columns.
+
+    No per-row Python objects are created: strings stay in Arrow buffers and numeric
+    columns are shared with the table, so charts and st.dataframe re-serialize them cheaply.
+    """
+    tbl = tbl.rename_columns([str(c).lower() for c in tbl.column_names])
+    for i, fld in enumerate(tbl.schema):
+        # NUMBER(p, s) may arrive as decimal128; charts and metrics want floats
+        if pa.types.is_decimal(fld.type):
+            tbl = tbl.set_column(i, fld.name, tbl.column(i).cast(pa.float64()))
+    return tbl.to_pandas(types_mapper=pd.ArrowDtype, split_blocks=True)
+
+
+def _first(df: pd.DataFrame, col=0):
+    """First-row value of a one-row result (by position or name); SQL NULL (None/NaN/NA) as None."""
+    if df.empty:
+        return None
+    v = df.iloc[0, col] if isinstance(col, int) else df[col].iloc[0]
+    return None if pd.isna(v) else v
+
+
+def _snowflake_df(session, sql: str, params: tuple) -> tuple[pd.DataFrame, Optional[str]]:
+    """Run a query through Snowpark into an Arrow-backed frame with lowercase columns;
+    also return its warehouse query id when Snowpark reports it."""
+    try:
+        history = session.query_history()
+    except Exception:
+        history = None
+    if history is None:
+        return _snowflake_fetch(session, sql, params), None
+    with history:
+        df = _snowflake_fetch(session, sql, params)
+    queries = history.queries
+    return df, (queries[-1].query_id if queries else None)
+
+
+def _snowflake_submit(session, sql: str, params: tuple) -> QueryHandle:
+    """Start a query without waiting for it: a Snowpark async job, cancellable on the warehouse,
+    or the blocking fetch on a worker thread on Snowpark versions without collect_nowait."""
+    sp_df = session.sql(sql, params=list(params) if params else None)
+    collect_nowait = getattr(sp_df, "collect_nowait", None)
+    if collect_nowait is None:
+        return ThreadHandle(lambda: _snowflake_df(session, sql, params))
+    # The finished result is read back through RESULT_SCAN, so it still arrives as Arrow
+    return AsyncJobHandle(collect_nowait(), lambda job: _snowpark_frame(job.to_df()))
+
+
+def _snowflake_batches(session, sql: str, params: tuple) -> Iterator[pd.DataFrame]:
+    """Stream a result as pandas chunks, one per server-side result batch (never the whole set)."""
+    sp_df = session.sql(sql, params=list(params) if params else None)
+    to_arrow_batches = getattr(sp_df, "to_arrow_batches", None)
+    if to_arrow_batches is not None:
+        for batch in to_arrow_batches():
+            yield _arrow_frame(pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch)
+        return
+    for chunk in sp_df.to_pandas_batches():
+        yield chunk.set_axis([str(c).lower() for c in chunk.columns], axis=1)
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    root = os.getenv("RESULT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "logistics_dash_cache")
+    return ResultCache(root, int(os.getenv("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+@st.cache_data(show_spinner=False, ttl=int(os.getenv("DATA_VERSION_TTL", "30")))
+def data_version(_session, database: str, schema: str) -> str:
+    """Data-version token for the result cache: latest LAST_ALTERED across the EDW tables.
+
+    LAST_ALTERED moves on DML as well as DDL, so a curation that changes rows invalidates every
+    cached result; the row_hash-guarded MERGEs write nothing for an unchanged batch. Checked at
+    most every DATA_VERSION_TTL seconds; if the metadata is not readable, falls back to
+    one-minute buckets (the old TTL behaviour).
+    """
+    try:
+        df = _session.sql(
+            f"-- app:data_version\n"
+            f"SELECT MAX(LAST_ALTERED) AS v FROM {database}.INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = ?",
+            params=[schema.upper()],
+        ).to_pandas()
+        if not df.empty and df.iloc[0, 0] is not None:
+            return f"{database}.{schema}:{df.iloc[0, 0]}"
+    except Exception:
+        pass
+    return f"ttl:{int(time.time() // 60)}"
+
+
+def _local_data_version(base: str) -> str:
+    """Data-version token for CSV mode: file names, sizes and mtimes under LOCAL_DATA_DIR.
+
+    Walks partition directories too; dot-directories (the local store) are skipped.
+    """
+    stats = []
+    for root, dirs, files in os.walk(base):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            try:
+                info = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            stats.append((os.path.relpath(os.path.join(root, name), base), info.st_size, info.st_mtime_ns))
+    stats.sort()
+    return "local:" + hashlib.sha256(repr((os.path.abspath(base), stats)).encode()).hexdigest()[:16]
+
+
+def _dim_index(dim_df: pd.DataFrame) -> dict[str, dict[str, tuple[int, ...]]]:
+    """Map each dimension kind to {display name: IDs} from the dims list query (k, id, v)."""
+    index: dict[str, dict[str, list[int]]] = {k: {} for k in ("customer", "carrier", "equipment", "lane")}
+    if not dim_df.empty:
+        for k, i, v in dim_df[["k", "id", "v"]].itertuples(index=False):
+            if k in index and pd.notna(i) and pd.notna(v):
+                index[k].setdefault(str(v), []).append(int(i))
+    return {k: {v: tuple(ids) for v, ids in names.items()} for k, names in index.items()}
+
+
+def _resolve_ids(index: dict[str, tuple[int, ...]], names: List[str]) -> List[int]:
+    """Selected display names -> sorted unique IDs (unknown names are dropped)."""
+    return sorted({i for n in names for i in index.get(n, ())})
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def dim_lookup(version: str, _dim_df: pd.DataFrame) -> tuple[dict, dict[str, NameIndex]]:
+    """Name -> IDs maps and typeahead indexes per dimension, built once per data version."""
+    dim_ids = _dim_index(_dim_df)
+    return dim_ids, {k: NameIndex(names) for k, names in dim_ids.items()}
+
+
+def _dim_multiselect(label: str, key: str, index: NameIndex, limit: int) -> List[str]:
+    """Sidebar multi-select over one dimension.
+
+    Short lists are offered whole. Longer ones get a search box: only the current selection
+    plus the top `limit` matches from the in-memory index are sent to the browser.
+    """
+    if len(index) <= limit:
+        return st.sidebar.multiselect(label, options=index.names, key=key)
+    query = st.sidebar.text_input(
+        f"Search {label.lower()}", key=f"{key}_q", placeholder=f"{len(index):,} {label.lower()}, type to search"
     )
+    # The selection stays in the options, so searching never drops a chosen name
+    options = list(dict.fromkeys(list(st.session_state.get(key, [])) + index.search(query, limit)))
+    return st.sidebar.multiselect(label, options=options, key=key)
 
-    name_col = '"name"' if quoted_cols else 'NAME'
-    type_col = '"type"' if quoted_cols else 'TYPE'
-    lane_id_col = '"lane_id"' if quoted_cols else 'LANE_ID'
-    origin_col = '"origin_loc_id"' if quoted_cols else 'ORIGIN_LOC_ID'
-    dest_col = '"dest_loc_id"' if quoted_cols else 'DEST_LOC_ID'
-    loc_id_col = '"loc_id"' if quoted_cols else 'LOC_ID'
-    city_col = '"city"' if quoted_cols else 'CITY'
-
-    # Name filters resolved to IDs via DIM tables
-    if customers:
-        esc = [c.replace("'", "''") for c in customers]
-        s = ",".join([f"'{x}'" for x in esc])
-        cust_id_col = '"customer_id"' if quoted_cols else 'CUSTOMER_ID'
-        f.append(
-            f" AND f.customer_id IN (SELECT {cust_id_col} FROM {dim_customer_tbl} WHERE {name_col} IN ({s})) "
-        )
-    if carriers:
-        esc = [c.replace("'", "''") for c in carriers]
-        s = ",".join([f"'{x}'" for x in esc])
-        carrier_id_col = '"carrier_id"' if quoted_cols else 'CARRIER_ID'
-        f.append(
-            f" AND f.carrier_id IN (SELECT {carrier_id_col} FROM {dim_carrier_tbl} WHERE {name_col} IN ({s})) "
-        )
-    if equipment:
-        esc = [e.replace("'", "''") for e in equipment]
-        s = ",".join([f"'{x}'" for x in esc])
-        equipment_id_col = '"equipment_id"' if quoted_cols else 'EQUIPMENT_ID'
-        f.append(
-            f" AND f.equipment_id IN (SELECT {equipment_id_col} FROM {dim_equipment_tbl} WHERE {type_col} IN ({s})) "
-        )
-    if lanes:
-        # lanes passed as "Origin → Dest"
-        esc = [l.replace("'", "''") for l in lanes]
-        s = ",".join([f"'{x}'" for x in esc])
-        f.append(
-            " AND f.lane_id IN (\n"
-            f"   SELECT l.{lane_id_col}\n"
-            f"   FROM {dim_lane_tbl} l\n"
-            f"   JOIN {dim_loc_tbl} o ON l.{origin_col} = o.{loc_id_col}\n"
-            f"   JOIN {dim_loc_tbl} d ON l.{dest_col} = d.{loc_id_col}\n"
-            f"   WHERE (o.{city_col} || ' → ' || d.{city_col}) IN ({s})\n"
-            ") "
-        )
-    return "".join(f)
+
+@st.cache_resource(show_spinner=False)
+def get_warmer() -> Warmer:
+    """Process-wide warm-up scheduler; WARMUP_BUDGET_S caps the query seconds spent per data version."""
+    return Warmer(float(os.getenv("WARMUP_BUDGET_S", "60")))
+
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=int(os.getenv("PREFETCH_WORKERS", "2")), thread_name_prefix="prefetch")
+
+
+@st.cache_resource(show_spinner=False)
+def get_refining() -> set:
+    """Result-cache keys of exact queries refining an approximate panel, across sessions, so a
+    view that several users open cold is refined once."""
+    return set()
+
+
+def _drill_next() -> None:
+    pager = st.session_state.get("drill_pager")
+    if pager and pager["next"] is not None:
+        pager["cursors"].append(pager["next"])
+
+
+def _drill_prev() -> None:
+    pager = st.session_state.get("drill_pager")
+    if pager and len(pager["cursors"]) > 1:
+        pager["cursors"].pop()
+
+
+def _apply_filters(pending: tuple) -> None:
+    st.session_state["applied_filters"] = pending
+
+
+def _panel_budgets() -> dict[str, float]:
+    """Seconds a panel waits for a fresh result before showing its last cached one.
+
+    PANEL_BUDGET_S sets the default (20); PANEL_BUDGETS overrides panels by tag,
+    e.g. "lane=30,drill=10". A panel with nothing cached waits for its query regardless.
+    """
+    default = float(os.getenv("PANEL_BUDGET_S", "20"))
+    budgets = {name: default for name in PANEL_INPUTS}
+    for item in os.getenv("PANEL_BUDGETS", "").split(","):
+        name, _, secs = item.partition("=")
+        if secs.strip():
+            budgets[name.strip()] = float(secs)
+    return budgets
+
+
+PANEL_BUDGETS = _panel_budgets()
+
+# Approximate mode: percent of rows the sampled panels read, the fewest sampled rows a panel
+# shows an estimate from, and how often a page with approximate panels checks whether their
+# exact results have landed (seconds)
+APPROX_SAMPLE_PCT = float(os.getenv("APPROX_SAMPLE_PCT", str(DEFAULT_SAMPLE_PCT)))
+APPROX_MIN_ROWS = int(os.getenv("APPROX_MIN_ROWS", "100"))
+APPROX_POLL_S = float(os.getenv("APPROX_POLL_S", "2"))
+
+
+# Widgets inside a fragment rerun only that fragment (Streamlit >= 1.37; plain functions before)
+_fragment = getattr(st, "fragment", None) or (lambda fn: fn)
 
 
 def main():
@@ -169,11 +391,8 @@ def main():
     # Set a short statement timeout to avoid long hangs in UI (seconds)
     try:
         timeout_s = int(os.getenv("STATEMENT_TIMEOUT", "45"))
-        session.sql(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS={timeout_s}").collect()
-        # Ensure ISO8601 with timezone offsets parse reliably if EDW was loaded as VARCHAR
-        session.sql(
-            """ALTER SESSION SET TIMESTAMP_INPUT_FORMAT='YYYY-MM-DD"T"HH24:MI:SS.FF TZH:TZM'"""
-        ).collect()
+        if session is not None:
+            session.sql(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS={timeout_s}").collect()
     except Exception:
         pass
 
@@ -188,284 +407,263 @@ def main():
         edw_schema = "EDW"
 
     st.sidebar.header("Filters")
-    # Diagnostic snapshot: show counts and date span to guide filters
-    diag_sql = f"""
-    SELECT
-      COUNT(*) AS total,
-      COUNT_IF(TRY_TO_TIMESTAMP_NTZ(delivery_actual_ts) IS NOT NULL) AS delivered,
-      MIN(DATE(TRY_TO_TIMESTAMP_NTZ(delivery_actual_ts))) AS min_delivery_date,
-      MAX(DATE(TRY_TO_TIMESTAMP_NTZ(delivery_actual_ts))) AS max_delivery_date
-    FROM {database}.{edw_schema}.FACT_SHIPMENT
-    """
-    try:
-        diag = None if is_local else run_df(diag_sql)
-        if diag is not None and not diag.empty:
-            with st.expander("Data Snapshot (EDW.FACT_SHIPMENT)", expanded=False):
-                st.write(diag)
-    except Exception:
-        pass
 
-    # Fetch lists
-    @st.cache_data(show_spinner=False, ttl=60)
-    def run_df(sql: str) -> pd.DataFrame:
-        t0 = perf_counter()
-        if not is_local:
-            df = session.sql(sql).to_pandas()
-            df.columns = [str(c).lower() for c in df.columns]
-        else:
-            df = _run_local(sql)
-        t1 = perf_counter()
-        st.session_state.setdefault("_query_times", []).append({"sql": sql[:80] + ("..." if len(sql) > 80 else ""), "ms": int((t1 - t0)*1000)})
-        return df
+    # Results are cached on disk (shared across sessions/restarts) under a data-version token,
+    # so they are reused until the EDW changes and refreshed as soon as it does.
+    local_dir = os.getenv("LOCAL_DATA_DIR", "data/out")
+    version = _local_data_version(local_dir) if is_local else data_version(session, database, edw_schema)
+    result_cache = get_result_cache()
 
-    @st.cache_resource(show_spinner=False)
-    def _load_local() -> dict:
-        base = os.getenv("LOCAL_DATA_DIR", "data/out")
-        def read(name: str, parse_ts: list[str] | None = None) -> pd.DataFrame:
-            df = pd.read_csv(os.path.join(base, name))
-            if parse_ts:
-                for c in parse_ts:
-                    if c in df.columns:
-                        df[c] = pd.to_datetime(df[c], errors="coerce", utc=True)
-            return df
-        return {
-            "dim_customer": read("DIM_CUSTOMER.csv"),
-            "dim_carrier": read("DIM_CARRIER.csv"),
-            "dim_equipment": read("DIM_EQUIPMENT.csv"),
-            "dim_location": read("DIM_LOCATION.csv"),
-            "dim_lane": read("DIM_LANE.csv"),
-            "fact_shipment": read("FACT_SHIPMENT.csv", ["tender_ts","pickup_plan_ts","pickup_actual_ts","delivery_plan_ts","delivery_actual_ts"]),
-            "fact_event": read("FACT_EVENT.csv", ["event_ts"]),
-        }
-
-    def _run_local(sql: str) -> pd.DataFrame:
-        # Heuristic mapping of known queries to local pandas computations
-        data = _load_local()
-        dc = data["dim_customer"].copy()
-        dcar = data["dim_carrier"].copy()
-        deq = data["dim_equipment"].copy()
-        dloc = data["dim_location"].copy()
-        dlane = data["dim_lane"].copy()
-        fs = data["fact_shipment"].copy()
-        fe = data["fact_event"].copy()
-
-        # DIM lists
-        if "DIM_CUSTOMER" in sql and "DIM_CARRIER" in sql and "DIM_EQUIPMENT" in sql and "UNION ALL" in sql and "label" in sql:
-            ln = dlane.merge(dloc.add_prefix("o_"), left_on="origin_loc_id", right_on="o_loc_id") \
-                      .merge(dloc.add_prefix("d_"), left_on="dest_loc_id", right_on="d_loc_id")
-            lane_labels = (ln["o_city"] + " → " + ln["d_city"]).rename("v").to_frame()
-            out = []
-            out.append(pd.DataFrame({"k": "customer", "v": sorted(dc["name"].dropna().unique().tolist())}))
-            out.append(pd.DataFrame({"k": "carrier", "v": sorted(dcar["name"].dropna().unique().tolist())}))
-            out.append(pd.DataFrame({"k": "equipment", "v": sorted(deq["type"].dropna().unique().tolist())}))
-            lane_top = lane_labels.dropna().drop_duplicates().sort_values("v").head(5000)
-            out.append(pd.DataFrame({"k": ["lane"] * len(lane_top), "v": lane_top["v"].tolist()}))
-            return pd.concat(out, ignore_index=True)
-
-        # Anchor date
-        if "MAX(DATE(delivery_actual_ts)) AS d" in sql:
-            dmax = fs["delivery_actual_ts"].dropna()
-            d = dmax.max().date() if len(dmax) else None
-            return pd.DataFrame({"d": [d]})
-
-        # Lane perf
-        if "FROM" in sql and "DIM_LANE" in sql and "AVG(DATEDIFF('day'" in sql and "otd_rate" in sql:
-            # Apply no filters in local mapping
-            df = fs.dropna(subset=["pickup_actual_ts","delivery_actual_ts"]).copy()
-            # grace from slider is embedded in SQL; assume 60 here for preview
-            grace = 60
-            df["is_otd"] = (df["delivery_actual_ts"] <= df["delivery_plan_ts"] + pd.to_timedelta(grace, unit="m"))
-            ln = dlane.merge(dloc.add_prefix("o_"), left_on="origin_loc_id", right_on="o_loc_id") \
-                      .merge(dloc.add_prefix("d_"), left_on="dest_loc_id", right_on="d_loc_id")
-            lab = (ln["o_city"] + " → " + ln["d_city"]).rename("lane").to_frame()
-            df = df.merge(dlane[["lane_id"]], left_on="lane_id", right_on="lane_id", how="left")
-            df = df.merge(lab.join(dlane.set_index("lane_id"), how="right").reset_index()[["lane_id","lane"]], on="lane_id", how="left")
-            g = df.groupby("lane", dropna=False).agg(shipments=("shipment_id","count"), avg_transit_days=(lambda x: None))
-            df["transit_days"] = (df["delivery_actual_ts"] - df["pickup_actual_ts"]).dt.days
-            g = df.groupby("lane", dropna=False).agg(shipments=("shipment_id","count"), avg_transit_days=("transit_days","mean"), otd_rate=("is_otd","mean")).reset_index()
-            return g.sort_values("shipments", ascending=False).head(50)
-
-        # OTD last/prior
-        if "otd_last_30" in sql or ("DATEADD('day', -29" in sql and "prev30" in sql):
-            df = fs.dropna(subset=["delivery_actual_ts"]).copy()
-            if df.empty:
-                return pd.DataFrame({"otd_last_30":[0.0],"otd_prior_30":[0.0]})
-            anchor = df["delivery_actual_ts"].dt.date.max()
-            last_start = anchor - pd.Timedelta(days=29)
-            prev_start = anchor - pd.Timedelta(days=60)
-            prev_end = anchor - pd.Timedelta(days=30)
-            grace = 60
-            df["is_otd"] = (df["delivery_actual_ts"] <= df["delivery_plan_ts"] + pd.to_timedelta(grace, unit="m"))
-            d = df["delivery_actual_ts"].dt.date
-            last = df[(d >= last_start) & (d <= anchor)]
-            prev = df[(d >= prev_start) & (d <= prev_end)]
-            def rate(x):
-                n = len(x)
-                return float(x["is_otd"].sum())/n if n else 0.0
-            return pd.DataFrame({"otd_last_30":[rate(last)], "otd_prior_30":[rate(prev)]})
-
-        # Average transit days
-        if "AVG(DATEDIFF('day', pickup_actual_ts, delivery_actual_ts))" in sql:
-            df = fs.dropna(subset=["pickup_actual_ts","delivery_actual_ts"]).copy()
-            if df.empty:
-                return pd.DataFrame({"avg_transit_days":[0.0]})
-            df["td"] = (df["delivery_actual_ts"] - df["pickup_actual_ts"]).dt.days
-            return pd.DataFrame({"avg_transit_days":[df["td"].mean()]})
-
-        # Tender acceptance (events)
-        if "FROM" in sql and "FACT_EVENT" in sql and "Tendered" in sql and "Accepted" in sql:
-            tendered = set(fe.loc[fe["event_type"]=="Tendered","shipment_id"].unique().tolist())
-            accepted = set(fe.loc[fe["event_type"]=="Accepted","shipment_id"].unique().tolist())
-            rate = float(len(accepted))/float(len(tendered)) if tendered else 0.0
-            return pd.DataFrame({"tender_acceptance_events":[rate]})
-
-        # Exception heatmap (counts)
-        if "Exception" in sql and "DIM_CUSTOMER" in sql:
-            ex = fe[fe["event_type"]=="Exception"].copy()
-            if ex.empty:
-                return pd.DataFrame(columns=["customer_name","exception_type","exceptions"])
-            # Map shipment->customer
-            ex = ex.merge(fs[["shipment_id","customer_id"]], on="shipment_id", how="left")
-            ex = ex.merge(dc[["customer_id","name"]].rename(columns={"name":"customer_name"}), on="customer_id", how="left")
-            ex["exception_type"] = ex["notes"].fillna("Unknown")
-            g = ex.groupby(["customer_name","exception_type"], dropna=False).size().reset_index(name="exceptions")
-            return g
-
-        # Drill table
-        if "SELECT" in sql and "Shipment Details" not in sql and "gm_per_mile" in sql:
-            df = fs.copy()
-            df = df.merge(dc[["customer_id","name"]].rename(columns={"name":"customer_name"}), on="customer_id", how="left")
-            df = df.merge(dcar[["carrier_id","name"]].rename(columns={"name":"carrier_name"}), on="carrier_id", how="left")
-            ln = dlane.merge(dloc.add_prefix("o_"), left_on="origin_loc_id", right_on="o_loc_id") \
-                      .merge(dloc.add_prefix("d_"), left_on="dest_loc_id", right_on="d_loc_id")
-            label_map = ln.set_index("lane_id").apply(lambda r: f"{r['o_city']} → {r['d_city']}", axis=1)
-            df["lane"] = df["lane_id"].map(label_map)
-            df["isdeliveredontime_calc"] = (df["delivery_actual_ts"] <= df["delivery_plan_ts"] + pd.to_timedelta(60, unit="m"))
-            df["isotif"] = df["isdeliveredontime_calc"] & df["isinfull"].fillna(False)
-            df["gm_per_mile"] = (df["revenue"] - df["total_cost"]) / df["planned_miles"].replace(0, pd.NA)
-            cols = [
-                "shipment_id","leg_id","customer_name","carrier_name","lane","status",
-                "pickup_plan_ts","pickup_actual_ts","delivery_plan_ts","delivery_actual_ts",
-                "isdeliveredontime_calc","isinfull","isotif","planned_miles","actual_miles","revenue","total_cost","gm_per_mile"
-            ]
-            return df[cols].head(1000)
-
-        # Fallback empty
-        return pd.DataFrame()
-
-    def run_df_first(sqls: list[str]) -> pd.DataFrame:
-        last_err: Exception | None = None
-        for q in sqls:
-            try:
-                df = run_df(q)
-                return df
-            except Exception as e:  # pragma: no cover
-                last_err = e
-                continue
-        if last_err:
-            raise last_err
-        return pd.DataFrame()
-
-    # Three variants:
-    #  - lower: quoted-lowercase tables + quoted-lowercase columns
-    #  - mixed: UPPERCASE tables + quoted-lowercase columns
-    #  - upper: UPPERCASE tables + UPPERCASE columns
-    dims_sql_upper = (
-        f"""
-        WITH c AS (
-            SELECT NAME AS name FROM {database}.{edw_schema}.DIM_CUSTOMER ORDER BY NAME LIMIT 5000
-        ), cr AS (
-            SELECT NAME AS name FROM {database}.{edw_schema}.DIM_CARRIER ORDER BY NAME LIMIT 5000
-        ), eq AS (
-            SELECT DISTINCT TYPE AS name FROM {database}.{edw_schema}.DIM_EQUIPMENT ORDER BY 1
-        ), ln AS (
-            SELECT (o.CITY || ' → ' || d.CITY) AS label
-            FROM {database}.{edw_schema}.DIM_LANE l
-            JOIN {database}.{edw_schema}.DIM_LOCATION o ON l.ORIGIN_LOC_ID = o.LOC_ID
-            JOIN {database}.{edw_schema}.DIM_LOCATION d ON l.DEST_LOC_ID = d.LOC_ID
-            QUALIFY ROW_NUMBER() OVER (ORDER BY label) <= 5000
-        )
-        SELECT 'customer' AS "k", name AS "v" FROM c
-        UNION ALL SELECT 'carrier' AS "k", name AS "v" FROM cr
-        UNION ALL SELECT 'equipment' AS "k", name AS "v" FROM eq
-        UNION ALL SELECT 'lane' AS "k", label AS "v" FROM ln
-        """
-    )
+    stats = get_query_stats()
+    backend = "local" if is_local else "snowflake"
+    run_log: List[QueryRecord] = []  # this rerun's queries, for the perf panel
 
-    dims_sql_lower = (
-        f"""
-        WITH c AS (
-            SELECT "name" AS name FROM {database}.{edw_schema}."dim_customer" ORDER BY "name" LIMIT 5000
-        ), cr AS (
-            SELECT "name" AS name FROM {database}.{edw_schema}."dim_carrier" ORDER BY "name" LIMIT 5000
-        ), eq AS (
-            SELECT DISTINCT "type" AS name FROM {database}.{edw_schema}."dim_equipment" ORDER BY 1
-        ), ln AS (
-            SELECT (o."city" || ' → ' || d."city") AS label
-            FROM {database}.{edw_schema}."dim_lane" l
-            JOIN {database}.{edw_schema}."dim_location" o ON l."origin_loc_id" = o."loc_id"
-            JOIN {database}.{edw_schema}."dim_location" d ON l."dest_loc_id" = d."loc_id"
-            QUALIFY ROW_NUMBER() OVER (ORDER BY label) <= 5000
-        )
-        SELECT 'customer' AS "k", name AS "v" FROM c
-        UNION ALL SELECT 'carrier' AS "k", name AS "v" FROM cr
-        UNION ALL SELECT 'equipment' AS "k", name AS "v" FROM eq
-        UNION ALL SELECT 'lane' AS "k", label AS "v" FROM ln
-        """
-    )
+    # Panel queries run on a bounded pool, queued fairly per browser session
+    pool = get_session_pool(is_local)
+    pool_user = st.session_state.setdefault("pool_user", uuid.uuid4().hex[:12])
+
+    def _fetch(
+        sql: str, params: tuple, flt: Optional[Filters], page: Optional[DrillPage], user: str = "", shed: bool = False,
+        grace: Optional[int] = None,
+    ) -> tuple[pd.DataFrame, Optional[str]]:
+        with pool.lease(user or pool_user, shed=shed) as pooled:
+            if is_local:
+                return _run_local(sql, flt, page, grace), None
+            return _snowflake_df(pooled, sql, params)
+
+    # Queries this session has running; a new run cancels whatever the previous one left behind
+    inflight: Inflight = st.session_state.setdefault("inflight", Inflight())
+    superseded = inflight.cancel_all()
 
-    dims_sql_mixed = (
-        f"""
-        WITH c AS (
-            SELECT "name" AS name FROM {database}.{edw_schema}.DIM_CUSTOMER ORDER BY "name" LIMIT 5000
-        ), cr AS (
-            SELECT "name" AS name FROM {database}.{edw_schema}.DIM_CARRIER ORDER BY "name" LIMIT 5000
-        ), eq AS (
-            SELECT DISTINCT "type" AS name FROM {database}.{edw_schema}.DIM_EQUIPMENT ORDER BY 1
-        ), ln AS (
-            SELECT (o."city" || ' → ' || d."city") AS label
-            FROM {database}.{edw_schema}.DIM_LANE l
-            JOIN {database}.{edw_schema}.DIM_LOCATION o ON l."origin_loc_id" = o."loc_id"
-            JOIN {database}.{edw_schema}.DIM_LOCATION d ON l."dest_loc_id" = d."loc_id"
-            QUALIFY ROW_NUMBER() OVER (ORDER BY label) <= 5000
+    def _record(sql: str, t0: float, df: pd.DataFrame, tier: str, query_id: Optional[str]) -> QueryRecord:
+        rec = QueryRecord(
+            name=query_name(sql) or "untagged",
+            backend=backend,
+            ms=round((perf_counter() - t0) * 1000, 1),
+            rows=len(df),
+            bytes=int(df.memory_usage(deep=True).sum()),
+            cache=tier,
+            query_id=query_id,
         )
-        SELECT 'customer' AS "k", name AS "v" FROM c
-        UNION ALL SELECT 'carrier' AS "k", name AS "v" FROM cr
-        UNION ALL SELECT 'equipment' AS "k", name AS "v" FROM eq
-        UNION ALL SELECT 'lane' AS "k", label AS "v" FROM ln
-        """
-    )
+        stats.record(rec)
+        return rec
 
-    # Try lower (quoted tables), then mixed (upper tables, quoted cols), then upper (upper tables/cols)
-    for variant, sql in (("lower", dims_sql_lower), ("mixed", dims_sql_mixed), ("upper", dims_sql_upper)):
+    def _finish(handle: QueryHandle, pooled, sql: str, key: str, base: str, t0: float) -> None:
+        # A query that outlived its panel budget completes in the background into the cache
         try:
-            dim_df = run_df(sql)
-            dims_variant = variant
-            break
+            df = handle.result()
+            result_cache.put(key, df, base)
+            _record(sql, t0, df, "prefetch", handle.query_id)
         except Exception:
-            continue
+            pass
+        finally:
+            pool.release(pooled)
+
+    def _run_query(
+        sql: str, params: tuple, flt: Optional[Filters], page: Optional[DrillPage], key: str, base: str
+    ) -> tuple[pd.DataFrame, Optional[str], bool]:
+        """Run a panel query on a pooled session while this script run is current.
+
+        Returns (frame, query_id, fresh). When the panel's time budget runs out and a cached
+        result exists, that result comes back with fresh=False and the query finishes in the
+        background. If Streamlit stops the run (the user changed something), the query is
+        cancelled on the way out.
+        """
+        name = query_name(sql) or "query"
+        budget = PANEL_BUDGETS.get(name)
+        t0 = perf_counter()
+        pooled = pool.acquire(pool_user)
+        try:
+            if is_local:
+                handle: QueryHandle = ThreadHandle(partial(_run_local, sql, flt, page))
+            else:
+                handle = _snowflake_submit(pooled, sql, params)
+        except BaseException:
+            pool.release(pooled)
+            raise
+        inflight.track(handle)
+        status = None
+        fallback: Optional[pd.DataFrame] = None
+
+        def tick(elapsed: float) -> bool:
+            nonlocal status, fallback
+            if status is None:
+                status = st.empty()
+            # Every element update is a point where Streamlit can stop a superseded run
+            status.caption(f"Running {name}… {elapsed:.0f}s")
+            if budget is not None and elapsed >= budget:
+                fallback = result_cache.latest(base)
+            return fallback is None
+
+        try:
+            finished = wait_query(handle, tick)
+        except BaseException:
+            inflight.cancel(handle)
+            pool.release(pooled)
+            _record(sql, t0, pd.DataFrame(), "cancelled", handle.query_id)
+            raise
+        inflight.untrack(handle)
+        if status is not None:
+            status.empty()
+        if not finished:
+            get_prefetch_pool().submit(_finish, handle, pooled, sql, key, base, t0)
+            return fallback, handle.query_id, False
+        try:
+            return handle.result(), handle.query_id, True
+        finally:
+            pool.release(pooled)
+
+    def run_df(
+        sql: str, params: tuple = (), flt: Optional[Filters] = None, page: Optional[DrillPage] = None
+    ) -> pd.DataFrame:
+        """Run a tagged query; `flt`/`page` are the structured form of `params` for the local engine."""
+        t0 = perf_counter()
+        key = ResultCache.key(sql, params, version)
+        df, tier = result_cache.get(key)
+        query_id = None
+        if df is None:
+            base = ResultCache.base_key(sql, params)
+            # Admission control: when the queue is deep, serve the last known result instead
+            stale = result_cache.latest(base) if pool.queued() >= pool.max_queue else None
+            if stale is None:
+                try:
+                    df, query_id, fresh = _run_query(sql, params, flt, page, key, base)
+                    if fresh:
+                        result_cache.put(key, df, base)
+                    else:  # over its time budget; the fresh result lands in the cache later
+                        stale = df
+                except PoolTimeout:
+                    stale = result_cache.latest(base)
+                    if stale is None:
+                        raise
+            if stale is not None:
+                df, tier = stale, "stale"
+                if not any(r.cache == "stale" for r in run_log):
+                    st.toast("Warehouse busy: showing the last cached results; they refresh on the next rerun.")
+        run_log.append(_record(sql, t0, df, tier, query_id))
+        return df
+
+    def warm(
+        sql: str, params: tuple = (), flt: Optional[Filters] = None, page: Optional[DrillPage] = None,
+        grace: Optional[int] = None,
+    ) -> bool:
+        """Run a query into the result cache unless it is already there; True when it ran.
+
+        `grace` is the view's grace minutes for the local engine (default: this run's slider).
+        """
+        key = ResultCache.key(sql, params, version)
+        if result_cache.get(key)[0] is not None:
+            return False
+        t0 = perf_counter()
+        # Background work is shed (PoolSaturated) rather than queued behind viewers
+        df, query_id = _fetch(sql, params, flt, page, user="_background", shed=True, grace=grace)
+        result_cache.put(key, df, ResultCache.base_key(sql, params))
+        _record(sql, t0, df, "prefetch", query_id)
+        return True
+
+    def prefetch(
+        sql: str, params: tuple = (), flt: Optional[Filters] = None, page: Optional[DrillPage] = None
+    ) -> None:
+        """Warm the result cache for a query the user is likely to ask for next (non-blocking)."""
+        if result_cache.get(ResultCache.key(sql, params, version))[0] is not None:
+            return
+
+        def task() -> None:
+            try:
+                warm(sql, params, flt, page)
+            except Exception:
+                pass
+
+        get_prefetch_pool().submit(task)
+
+    # Per-session memo of panel results keyed on the inputs the panel declares (PANEL_INPUTS)
+    panel_memo: dict = st.session_state.setdefault("panel_memo", {})
+    inputs: dict = {}  # grace / filters, filled in once the sidebar is read
+    reused: List[str] = []  # panels rendered from the memo this run (no query, no cache lookup)
+
+    def memo_key(name: str, **extra) -> tuple:
+        deps = {**inputs, **extra}
+        return (version, tuple(deps[n] for n in PANEL_INPUTS[name]))
+
+    def panel_df(
+        sql: str, params: tuple = (), flt: Optional[Filters] = None, page: Optional[DrillPage] = None, **extra
+    ) -> pd.DataFrame:
+        """run_df, skipped while the panel's declared inputs and the data version are unchanged."""
+        name = query_name(sql)
+        if name not in PANEL_INPUTS:
+            return run_df(sql, params, flt, page)
+        key = memo_key(name, **extra)
+        hit = panel_memo.get(name)
+        if hit is not None and hit[0] == key:
+            reused.append(name)
+            return hit[1]
+        df = run_df(sql, params, flt, page)
+        if run_log[-1].cache != "stale":  # a degraded result must not stick
+            panel_memo[name] = (key, df)
+        return df
+
+    @st.cache_resource(show_spinner=False)
+    def _local_engine() -> LocalEngine:
+        # Memory-mapped Arrow store built once from the CSVs (streamlit/local_store.py): typed
+        # like FACT_SHIPMENT_TYPED, repetitive strings as categoricals; with its bitmap indexes
+        # and drill order, shared by every session
+        return LocalEngine.open(local_dir)
+
+    # Filtered shipment (or milestone) rows, resolved once per rerun and shared by every panel
+    filtered_rows: dict = {}
+
+    def _run_local(
+        sql: str, flt: Optional[Filters] = None, page: Optional[DrillPage] = None, grace: Optional[int] = None
+    ) -> pd.DataFrame:
+        # Map tagged queries (-- app:<name>) to local pandas computations (streamlit/local_engine.py);
+        # grace is rendered into the SQL, so the engine gets it separately (default: the slider's)
+        grace = inputs.get("grace", DEFAULT_GRACE) if grace is None else grace
+        return _local_engine().run(query_name(sql), flt, page, filtered_rows, APPROX_SAMPLE_PCT, grace)
+
+    # One INFORMATION_SCHEMA read per database.schema resolves real table/column names
+    # (UPPERCASE, quoted-lowercase or mixed) and whether the typed serving layer exists.
+    if is_local:
+        schema = local_schema_map(database, edw_schema, _local_engine())
     else:
-        # If all fail, raise the last error by running upper to surface message
-        dim_df = run_df(dims_sql_upper)
-        dims_variant = "upper"
+        schema = load_schema_map(session, database, edw_schema)
+        if not schema.typed:
+            try:
+                # Ensure ISO8601 with timezone offsets parse reliably if EDW was loaded as VARCHAR
+                session.sql(
+                    """ALTER SESSION SET TIMESTAMP_INPUT_FORMAT='YYYY-MM-DD"T"HH24:MI:SS.FF TZH:TZM'"""
+                ).collect()
+            except Exception:
+                pass
+
+    # Diagnostic snapshot: show counts and date span to guide filters
+    try:
+        diag = None if is_local else panel_df(*render("diag", schema))
+        if diag is not None and not diag.empty:
+            with st.expander("Data Snapshot (EDW.FACT_SHIPMENT)", expanded=False):
+                st.write(diag)
+    except Exception:
+        pass
+
+    dim_df = panel_df(*render("dims", schema))
 
-    customers = dim_df.loc[dim_df["k"] == "customer", "v"].tolist() if not dim_df.empty else []
-    carriers = dim_df.loc[dim_df["k"] == "carrier", "v"].tolist() if not dim_df.empty else []
-    equipments = dim_df.loc[dim_df["k"] == "equipment", "v"].tolist() if not dim_df.empty else []
-    lanes = dim_df.loc[dim_df["k"] == "lane", "v"].tolist() if not dim_df.empty else []
+    # Name -> IDs and a typeahead index per dimension, built once per data version; filters bind the IDs
+    dim_ids, dim_search = dim_lookup(version, dim_df)
+    search_limit = int(os.getenv("DIM_SEARCH_LIMIT", "50"))
 
     # Parameters
-    grace = st.sidebar.slider("Grace Minutes (OTD/OTIF)", min_value=0, max_value=120, value=60, step=5)
+    grace = st.sidebar.slider("Grace Minutes (OTD/OTIF)", min_value=0, max_value=120, value=DEFAULT_GRACE, step=5)
     gm_target = st.sidebar.slider("GM/Mile Target", min_value=0.10, max_value=1.00, value=0.40, step=0.05)
+    approx_on = getattr(st.sidebar, "toggle", st.sidebar.checkbox)(
+        "Approximate first",
+        value=os.getenv("APPROX_MODE", "0").strip() in {"1", "true", "True"},
+        help=f"Lane and exception panels show an estimate from a {APPROX_SAMPLE_PCT:g}% sample "
+        "until their exact results are ready.",
+    )
 
     # Date range defaults
-    anchor_df = run_df(
-        f"SELECT MIN(CAST(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_actual_ts), '')) AS DATE)) AS min_d, "
-        f"MAX(CAST(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_actual_ts), '')) AS DATE)) AS max_d "
-        f"FROM {database}.{edw_schema}.FACT_SHIPMENT WHERE NULLIF(TRIM(delivery_actual_ts), '') IS NOT NULL"
-    )
-    min_d = anchor_df.get("min_d").iloc[0] if not anchor_df.empty else None
-    max_d = anchor_df.get("max_d").iloc[0] if not anchor_df.empty else None
+    anchor_df = panel_df(*render("anchor", schema))
+    min_d = _first(anchor_df, "min_d")
+    max_d = _first(anchor_df, "max_d")
     default_start = min_d
     default_end = max_d
 
@@ -476,208 +674,213 @@ def main():
     date_start = dr[0].isoformat() if isinstance(dr, tuple) and len(dr) == 2 and dr[0] else None
     date_end = dr[1].isoformat() if isinstance(dr, tuple) and len(dr) == 2 and dr[1] else None
 
-    sel_customers = st.sidebar.multiselect("Customers", options=customers)
-    sel_carriers = st.sidebar.multiselect("Carriers", options=carriers)
-    sel_equipment = st.sidebar.multiselect("Equipment", options=equipments)
-    sel_lanes = st.sidebar.multiselect("Lanes", options=lanes)
-
-    filters = _filters_clause(
-        database,
-        edw_schema,
-        sel_customers,
-        sel_carriers,
-        sel_equipment,
-        sel_lanes,
+    sel_customers = _dim_multiselect("Customers", "sel_customers", dim_search["customer"], search_limit)
+    sel_carriers = _dim_multiselect("Carriers", "sel_carriers", dim_search["carrier"], search_limit)
+    sel_equipment = _dim_multiselect("Equipment", "sel_equipment", dim_search["equipment"], search_limit)
+    sel_lanes = _dim_multiselect("Lanes", "sel_lanes", dim_search["lane"], search_limit)
+
+    pending = astuple(Filters(
+        tuple(_resolve_ids(dim_ids["customer"], sel_customers)),
+        tuple(_resolve_ids(dim_ids["carrier"], sel_carriers)),
+        tuple(_resolve_ids(dim_ids["equipment"], sel_equipment)),
+        tuple(_resolve_ids(dim_ids["lane"], sel_lanes)),
         date_start,
         date_end,
-        quoted_tables=(dims_variant == "lower"),
-        quoted_cols=(dims_variant in ("lower", "mixed")),
-    )
+    ))
+    # Filter edits are batched: panels read the applied selection until "Apply filters"
+    auto_apply = os.getenv("AUTO_APPLY_FILTERS", "0").strip() in {"1", "true", "True"}
+    if auto_apply or "applied_filters" not in st.session_state:
+        st.session_state["applied_filters"] = pending
+    applied = st.session_state["applied_filters"]
+    if not auto_apply:
+        st.sidebar.button(
+            "Apply filters", on_click=_apply_filters, args=(pending,), type="primary", disabled=pending == applied
+        )
+        if pending != applied:
+            st.sidebar.caption("Filter changes are pending until applied.")
+    flt = Filters(*applied)
+    view = View(grace, flt, sample_pct=APPROX_SAMPLE_PCT)
+    inputs.update(grace=grace, filters=applied)
+    # Count each view a session moves to; the warm-up prefetches the most frequent ones
+    if st.session_state.get("last_view") != (applied, grace):
+        st.session_state["last_view"] = (applied, grace)
+        stats.record_view([applied, grace])
 
     st.sidebar.caption(f"Context: DB={database}, EDW={edw_schema}")
 
+    refining: List[str] = []  # result-cache keys of this view's exact queries still running
+
+    def refine(sql: str, params: tuple) -> None:
+        """Run the exact query behind an approximate panel into the result cache (non-blocking).
+
+        Queued on the pool as this user, not shed like prefetch: the page is waiting for it.
+        """
+        key = ResultCache.key(sql, params, version)
+        refining.append(key)
+        running = get_refining()
+        if key in running:
+            return
+        running.add(key)
+
+        def task() -> None:
+            try:
+                t0 = perf_counter()
+                df, query_id = _fetch(sql, params, flt, None)
+                result_cache.put(key, df, ResultCache.base_key(sql, params))
+                _record(sql, t0, df, "refine", query_id)
+            except Exception:
+                pass
+            finally:
+                running.discard(key)
+
+        get_prefetch_pool().submit(task)
+
+    def progressive_df(name: str) -> tuple[pd.DataFrame, bool]:
+        """A panel's exact result when it is memoized or cached; otherwise, in approximate mode,
+        its sampled variant now and the exact query in the background, unless the sample holds
+        fewer than APPROX_MIN_ROWS rows. Returns (frame, approximate)."""
+        sql, params = render(name, schema, view)
+        hit = panel_memo.get(name)
+        if (
+            not approx_on
+            or (hit is not None and hit[0] == memo_key(name))
+            or result_cache.get(ResultCache.key(sql, params, version))[0] is not None
+        ):
+            return panel_df(sql, params, flt), False
+        df = panel_df(*render(APPROX_PANELS[name], schema, view), flt)
+        if df.empty or df["sample_rows"].sum() < APPROX_MIN_ROWS:
+            # Too few sampled rows (a narrow filter or a small table) to estimate from
+            return panel_df(sql, params, flt), False
+        refine(sql, params)
+        return df, True
+
+    def approx_badge(stratified: bool, intervals: bool) -> None:
+        source = "the stratified lane × customer sample" if stratified else f"a {APPROX_SAMPLE_PCT:g}% sample"
+        st.caption(
+            f":orange[**≈ Approximate**] from {source}"
+            + ("; whiskers show 95% intervals" if intervals else "")
+            + ". Exact results replace it when ready."
+        )
+
     # KPIs: OTD last 30 vs prior 30, GM/Mile YTD, Tender Acceptance, Avg Transit Days
     col1, col2, col3, col4 = st.columns(4)
 
-    otd_sql = f"""
-    WITH params AS (SELECT {grace} AS grace),
-    delivered AS (
-      SELECT CAST(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) AS DATE) AS d,
-             IFF(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) <= DATEADD(minute, (SELECT grace FROM params), TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_plan_ts), ''))), 1, 0) AS is_otd
-      FROM {database}.{edw_schema}.FACT_SHIPMENT f
-      WHERE NULLIF(TRIM(f.delivery_actual_ts), '') IS NOT NULL {filters}
-    ), anchor AS (
-      SELECT MAX(d) AS anchor_date FROM delivered
-    ), win AS (
-      SELECT anchor_date,
-             DATEADD('day', -29, anchor_date) AS last30_start,
-             anchor_date AS last30_end,
-             DATEADD('day', -60, anchor_date) AS prev30_start,
-             DATEADD('day', -30, anchor_date) AS prev30_end
-      FROM anchor
-    ), last30 AS (
-      SELECT COUNT(*) AS n_deliv, SUM(is_otd) AS n_otd FROM delivered, win
-      WHERE delivered.d BETWEEN win.last30_start AND win.last30_end
-    ), prev30 AS (
-      SELECT COUNT(*) AS n_deliv, SUM(is_otd) AS n_otd FROM delivered, win
-      WHERE delivered.d BETWEEN win.prev30_start AND win.prev30_end
-    )
-    SELECT
-      (last30.n_otd::FLOAT / NULLIF(last30.n_deliv,0)) AS otd_last_30,
-      (prev30.n_otd::FLOAT / NULLIF(prev30.n_deliv,0)) AS otd_prior_30
-    FROM last30, prev30
-    """
-    otd = run_df(otd_sql)
-    otd_last = float(otd.iloc[0, 0]) if not otd.empty and otd.iloc[0, 0] is not None else 0.0
-    otd_prior = float(otd.iloc[0, 1]) if not otd.empty and otd.iloc[0, 1] is not None else 0.0
+    otd = panel_df(*render("otd", schema, view), flt)
+    otd_last = float(_first(otd, 0) or 0.0)
+    otd_prior = float(_first(otd, 1) or 0.0)
     otd_delta = otd_last - otd_prior
     col1.metric("OTD % (Last 30)", f"{otd_last:.1%}", delta=f"{otd_delta:+.1%}")
 
-    gmm_sql = f"""
-    WITH anchor AS (
-      SELECT MAX(DATE(delivery_actual_ts)) AS anchor_date
-      FROM {database}.{edw_schema}.FACT_SHIPMENT f
-      WHERE f.delivery_actual_ts IS NOT NULL {filters}
-    ), ytd AS (
-      SELECT SUM(revenue) AS rev, SUM(total_cost) AS cost, SUM(planned_miles) AS miles
-      FROM {database}.{edw_schema}.FACT_SHIPMENT f, anchor
-      WHERE f.delivery_actual_ts IS NOT NULL {filters}
-        AND DATE(f.delivery_actual_ts) BETWEEN DATE_TRUNC('year', anchor.anchor_date) AND anchor.anchor_date
-    )
-    SELECT (rev - cost) / NULLIF(miles, 0) AS gm_per_mile FROM ytd
-    """
-    gmm = run_df(gmm_sql)
-    gm_mile = float(gmm.iloc[0, 0]) if not gmm.empty and gmm.iloc[0, 0] is not None else 0.0
+    gmm = panel_df(*render("gmm", schema, view), flt)
+    gm_mile = float(_first(gmm) or 0.0)
     col2.metric("GM/Mile (YTD)", f"${gm_mile:.2f}", delta=f"{gm_mile - gm_target:+.2f} vs {gm_target:.2f}")
 
-    ta_sql = f"""
-    WITH tendered AS (
-      SELECT DISTINCT shipment_id
-      FROM {database}.{edw_schema}.FACT_EVENT
-      WHERE event_type = 'Tendered'
-    ), accepted AS (
-      SELECT DISTINCT shipment_id
-      FROM {database}.{edw_schema}.FACT_EVENT
-      WHERE event_type = 'Accepted'
-    )
-    SELECT (SELECT COUNT(*) FROM accepted)::FLOAT / NULLIF((SELECT COUNT(*) FROM tendered), 0) AS tender_acceptance_events
-    """
-    ta = run_df(ta_sql)
-    ta_rate = float(ta.iloc[0, 0]) if not ta.empty and ta.iloc[0, 0] is not None else 0.0
+    ta = panel_df(*render("tender", schema, view), flt)
+    ta_rate = float(_first(ta) or 0.0)
     col3.metric("Tender Acceptance %", f"{ta_rate:.1%}")
+    dwell = _first(ta, "avg_dwell_minutes") if "avg_dwell_minutes" in ta.columns else None
+    if dwell is not None:
+        col3.caption(f"Avg dwell {float(dwell):.0f} min")
 
-    atd_sql = f"""
-    SELECT AVG(DATEDIFF('day', TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(pickup_actual_ts), '')), TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(delivery_actual_ts), '')))) AS avg_transit_days
-    FROM {database}.{edw_schema}.FACT_SHIPMENT f
-    WHERE NULLIF(TRIM(pickup_actual_ts), '') IS NOT NULL AND NULLIF(TRIM(delivery_actual_ts), '') IS NOT NULL {filters}
-    """
-    atd = run_df(atd_sql)
-    avg_transit = float(atd.iloc[0, 0]) if not atd.empty and atd.iloc[0, 0] is not None else 0.0
+    atd = panel_df(*render("transit", schema, view), flt)
+    avg_transit = float(_first(atd) or 0.0)
     col4.metric("Avg Transit Days", f"{avg_transit:.2f}")
 
+    # Tail KPIs: merged from the daily summary's sketches when it covers the filters
+    pct = panel_df(*render("pct", schema, view), flt)
+
+    def _pcts(metric: str) -> str:
+        values = [_first(pct, f"{metric}_{p}") if f"{metric}_{p}" in pct.columns else None for p in ("p50", "p90", "p99")]
+        return " / ".join("–" if v is None else f"{float(v):,.0f}" for v in values)
+
+    col5, col6, _ = st.columns([1, 1, 2])
+    col5.metric("Transit Hours p50 / p90 / p99", _pcts("transit_hours"))
+    col6.metric("Dwell Minutes p50 / p90 / p99", _pcts("dwell_minutes"))
+
     st.divider()
-    # Show quick perf of last queries (debug aid)
-    if "_query_times" in st.session_state:
-        with st.expander("Query timings (last run)"):
-            st.dataframe(pd.DataFrame(st.session_state["_query_times"]))
 
     # Lane Performance (bar: Avg Transit Days, line: OTD %)
-    # Build expressions for column case based on DIM variant
-    quoted = (dims_variant in ("lower", "mixed"))
-    cust_name_col = 'c."name"' if quoted else 'c.NAME'
-    car_name_col = 'cr."name"' if quoted else 'cr.NAME'
-    o_city_expr = 'o."city"' if quoted else 'o.CITY'
-    d_city_expr = 'd."city"' if quoted else 'd.CITY'
-    l_lane_id = 'l."lane_id"' if quoted else 'l.LANE_ID'
-    l_origin_id = 'l."origin_loc_id"' if quoted else 'l.ORIGIN_LOC_ID'
-    l_dest_id = 'l."dest_loc_id"' if quoted else 'l.DEST_LOC_ID'
-    o_loc_id = 'o."loc_id"' if quoted else 'o.LOC_ID'
-    d_loc_id = 'd."loc_id"' if quoted else 'd.LOC_ID'
-    c_cust_id = 'c."customer_id"' if quoted else 'c.CUSTOMER_ID'
-    cr_carrier_id = 'cr."carrier_id"' if quoted else 'cr.CARRIER_ID'
-
-    tbl_lane = (
-        f"{database}.{edw_schema}.\"dim_lane\"" if dims_variant == "lower" else f"{database}.{edw_schema}.DIM_LANE"
-    )
-    tbl_loc = (
-        f"{database}.{edw_schema}.\"dim_location\"" if dims_variant == "lower" else f"{database}.{edw_schema}.DIM_LOCATION"
-    )
-    tbl_cust = (
-        f"{database}.{edw_schema}.\"dim_customer\"" if dims_variant == "lower" else f"{database}.{edw_schema}.DIM_CUSTOMER"
-    )
-    tbl_carrier = (
-        f"{database}.{edw_schema}.\"dim_carrier\"" if dims_variant == "lower" else f"{database}.{edw_schema}.DIM_CARRIER"
-    )
-
-    lane_sql = f"""
-    WITH params AS (SELECT {grace} AS grace)
-    SELECT
-      {o_city_expr} || ' → ' || {d_city_expr} AS lane,
-      COUNT(*) AS shipments,
-      AVG(DATEDIFF('day', TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.pickup_actual_ts), '')), TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')))) AS avg_transit_days,
-      AVG(IFF(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) IS NOT NULL AND TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) <= DATEADD(minute, (SELECT grace FROM params), TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_plan_ts), ''))), 1, 0)) AS otd_rate
-    FROM {database}.{edw_schema}.FACT_SHIPMENT f
-    JOIN {tbl_lane} l ON f.lane_id = {l_lane_id}
-    JOIN {tbl_loc} o ON {l_origin_id} = {o_loc_id}
-    JOIN {tbl_loc} d ON {l_dest_id} = {d_loc_id}
-    WHERE NULLIF(TRIM(f.pickup_actual_ts), '') IS NOT NULL AND NULLIF(TRIM(f.delivery_actual_ts), '') IS NOT NULL {filters}
-    GROUP BY 1
-    ORDER BY shipments DESC
-    LIMIT 50
-    """
-    lane_df = run_df(lane_sql)
+    lane_df, lane_approx = progressive_df("lane")
     import altair as alt  # type: ignore
 
-    if not lane_df.empty:
-        # Optional filter to reduce noise
-        min_ship = st.slider("Min shipments per lane (chart)", 1, int(lane_df["shipments"].max()), 5)
-        lane_df = lane_df[lane_df["shipments"] >= min_ship]
-        if lane_df.empty:
-            st.info("No lanes meet the minimum shipments filter.")
-        else:
-            base = alt.Chart(lane_df).encode(
-                x=alt.X("lane:N", sort='-y', title="Lane (Origin → Dest)")
-            )
-            bars = base.mark_bar(color="#4C78A8").encode(
-                y=alt.Y("avg_transit_days:Q", title="Avg Transit Days"),
-                tooltip=[
+    @_fragment
+    def lane_panel(lane_df: pd.DataFrame, approx: bool) -> None:
+        # Fragment: moving the min-shipments slider redraws this chart only (no queries);
+        # the percentile view queries lane_pct on first use, then reads it from the memo
+        percentiles = st.radio(
+            "Lane metric", ["Avg transit days + OTD %", "Transit hours p50 / p90 / p99"], horizontal=True, key="lane_metric"
+        ) != "Avg transit days + OTD %"
+        if percentiles:
+            lane_df, approx = panel_df(*render("lane_pct", schema, view), flt), False
+        if approx:
+            approx_badge(schema.sample, True)
+        if not lane_df.empty:
+            # Optional filter to reduce noise
+            min_ship = st.slider("Min shipments per lane (chart)", 1, int(lane_df["shipments"].max()), 5)
+            lane_df = lane_df[lane_df["shipments"] >= min_ship]
+            if lane_df.empty:
+                st.info("No lanes meet the minimum shipments filter.")
+            elif percentiles:
+                tooltip = [alt.Tooltip("lane:N"), alt.Tooltip("shipments:Q")] + [
+                    alt.Tooltip(f"transit_hours_{p}:Q", format=".1f") for p in ("p50", "p90", "p99")
+                ]
+                base = alt.Chart(lane_df).encode(
+                    x=alt.X("lane:N", sort=alt.EncodingSortField("transit_hours_p90", order="descending"), title="Lane (Origin → Dest)"),
+                    tooltip=tooltip,
+                )
+                p90 = base.mark_bar(color="#9ECAE9").encode(y=alt.Y("transit_hours_p90:Q", title="Transit Hours"))
+                p50 = base.mark_bar(color="#4C78A8", size=8).encode(y="transit_hours_p50:Q")
+                p99 = base.mark_tick(color="#E45756", thickness=2).encode(y="transit_hours_p99:Q")
+                st.altair_chart(p90 + p50 + p99, use_container_width=True)
+                st.caption("Dark bar p50, light bar p90, red tick p99.")
+            else:
+                tooltip = [
                     alt.Tooltip("lane:N"),
                     alt.Tooltip("shipments:Q"),
                     alt.Tooltip("avg_transit_days:Q", format=".2f"),
                     alt.Tooltip("otd_rate:Q", format=".1%"),
-                ],
-            )
-            # Use points instead of a connecting line across categories
-            points = base.mark_point(color="#F58518", filled=True, size=70).encode(
-                y=alt.Y("otd_rate:Q", axis=alt.Axis(format="%", title="OTD %")),
-                tooltip=[
-                    alt.Tooltip("lane:N"),
-                    alt.Tooltip("shipments:Q"),
-                    alt.Tooltip("avg_transit_days:Q", format=".2f"),
-                    alt.Tooltip("otd_rate:Q", format=".1%"),
-                ],
-            )
-            st.altair_chart((bars + points).resolve_scale(y='independent'), use_container_width=True)
-    else:
-        st.info("No lane data for selected filters.")
+                ]
+                if approx:
+                    # Whisker ends: estimate ± its 95% half-width
+                    lane_df = lane_df.assign(
+                        transit_lo=lane_df["avg_transit_days"] - lane_df["avg_transit_days_ci"],
+                        transit_hi=lane_df["avg_transit_days"] + lane_df["avg_transit_days_ci"],
+                        otd_lo=(lane_df["otd_rate"] - lane_df["otd_rate_ci"]).clip(lower=0),
+                        otd_hi=(lane_df["otd_rate"] + lane_df["otd_rate_ci"]).clip(upper=1),
+                    )
+                    tooltip += [
+                        alt.Tooltip("avg_transit_days_ci:Q", format=".2f", title="± transit days"),
+                        alt.Tooltip("otd_rate_ci:Q", format=".1%", title="± OTD"),
+                        alt.Tooltip("sample_rows:Q", title="sampled legs"),
+                    ]
+                base = alt.Chart(lane_df).encode(
+                    x=alt.X("lane:N", sort='-y', title="Lane (Origin → Dest)")
+                )
+                bars = base.mark_bar(color="#4C78A8").encode(
+                    y=alt.Y("avg_transit_days:Q", title="Avg Transit Days"),
+                    tooltip=tooltip,
+                )
+                # Use points instead of a connecting line across categories
+                points = base.mark_point(color="#F58518", filled=True, size=70).encode(
+                    y=alt.Y("otd_rate:Q", axis=alt.Axis(format="%", title="OTD %")),
+                    tooltip=tooltip,
+                )
+                if approx:
+                    # Each series' whiskers share its axis
+                    bars += base.mark_rule(color="#1F3A5F").encode(y="transit_lo:Q", y2="transit_hi:Q")
+                    points += base.mark_rule(color="#F58518").encode(y="otd_lo:Q", y2="otd_hi:Q")
+                st.altair_chart((bars + points).resolve_scale(y='independent'), use_container_width=True)
+        else:
+            st.info("No lane data for selected filters.")
+
+    lane_panel(lane_df, lane_approx)
 
     st.divider()
 
     # Exception Heatmap: Exception Type × Customer
-    ex_sql = f"""
-    WITH ex AS (
-      SELECT e.shipment_id, COALESCE(NULLIF(TRIM(e.notes), ''), 'Unknown') AS exception_type
-      FROM {database}.{edw_schema}.FACT_EVENT e
-      WHERE e.event_type = 'Exception'
-    )
-    SELECT {cust_name_col} AS customer_name, ex.exception_type, COUNT(*) AS exceptions
-    FROM ex
-    JOIN {database}.{edw_schema}.FACT_SHIPMENT f ON f.shipment_id = ex.shipment_id
-    JOIN {tbl_cust} c ON {c_cust_id} = f.customer_id
-    WHERE 1=1 {filters}
-    GROUP BY 1,2
-    """
-    ex_df = run_df(ex_sql)
+    ex_df, ex_approx = progressive_df("exceptions")
+    if ex_approx:
+        approx_badge(False, False)
     if not ex_df.empty:
         heat = (
             alt.Chart(ex_df)
@@ -690,36 +893,140 @@ def main():
 
     st.divider()
 
-    # Drill table
-    drill_sql = f"""
-    SELECT
-      f.shipment_id, f.leg_id,
-      {cust_name_col} AS customer_name,
-      {car_name_col} AS carrier_name,
-      {o_city_expr} || ' → ' || {d_city_expr} AS lane,
-      f.status,
-      TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.pickup_plan_ts), '')) AS pickup_plan_ts,
-      TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.pickup_actual_ts), '')) AS pickup_actual_ts,
-      TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_plan_ts), '')) AS delivery_plan_ts,
-      TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) AS delivery_actual_ts,
-      IFF(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) IS NOT NULL AND TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) <= DATEADD(minute, {grace}, TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_plan_ts), ''))), TRUE, FALSE) AS isdeliveredontime,
-      f.isinfull,
-      (IFF(TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) IS NOT NULL AND TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_actual_ts), '')) <= DATEADD(minute, {grace}, TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM(f.delivery_plan_ts), ''))), TRUE, FALSE) AND f.isinfull) AS isotif,
-      f.planned_miles, f.actual_miles, f.revenue, f.total_cost,
-      (f.revenue - f.total_cost) / NULLIF(f.planned_miles, 0) AS gm_per_mile
-    FROM {database}.{edw_schema}.FACT_SHIPMENT f
-    JOIN {tbl_cust} c ON {c_cust_id} = f.customer_id
-    JOIN {tbl_carrier} cr ON {cr_carrier_id} = f.carrier_id
-    JOIN {tbl_lane} l ON {l_lane_id} = f.lane_id
-    JOIN {tbl_loc} o ON {o_loc_id} = {l_origin_id}
-    JOIN {tbl_loc} d ON {d_loc_id} = {l_dest_id}
-    WHERE 1=1 {filters}
-    ORDER BY f.shipment_id, f.leg_id
-    LIMIT 1000
-    """
-    drill_df = run_df(drill_sql)
-    st.subheader("Shipment Details (top 1000)")
-    st.dataframe(drill_df, use_container_width=True)
+    page_size = int(os.getenv("DRILL_PAGE_SIZE", "500"))
+
+    @_fragment
+    def drill_panel() -> None:
+        # Drill table: keyset pages over (shipment_id, leg_id); the pager resets when the scope changes.
+        # Fragment: paging and exports rerun this section only
+        # (plain tuples: app.py re-executes on every rerun, so its classes never compare across runs)
+        scope = (astuple(flt), grace, page_size)
+        pager = st.session_state.get("drill_pager")
+        if pager is None or pager["scope"] != scope:
+            pager = st.session_state["drill_pager"] = {"scope": scope, "cursors": [None], "next": None}
+        page = DrillPage(pager["cursors"][-1], page_size)
+        drill_df = panel_df(*render("drill", schema, replace(view, page=page)), flt, page, cursor=astuple(page))
+        count_df = panel_df(*render("drill_count", schema, view), flt)
+        n_total = int(_first(count_df) or 0)
+        first = (len(pager["cursors"]) - 1) * page_size
+        pager["next"] = (
+            (str(drill_df["shipment_id"].iloc[-1]), int(drill_df["leg_id"].iloc[-1])) if len(drill_df) == page_size else None
+        )
+
+        st.subheader("Shipment Details")
+        c_prev, c_next, c_info = st.columns([1, 1, 6])
+        c_prev.button("◀ Prev", on_click=_drill_prev, disabled=len(pager["cursors"]) == 1)
+        c_next.button("Next ▶", on_click=_drill_next, disabled=pager["next"] is None)
+        c_info.caption(f"Rows {first + 1:,}–{first + len(drill_df):,} of ≈{n_total:,}" if len(drill_df) else "No rows")
+        st.dataframe(drill_df, use_container_width=True)
+        if pager["next"] is not None:
+            nxt = DrillPage(pager["next"], page_size)
+            prefetch(*render("drill", schema, replace(view, page=nxt)), flt, nxt)
+
+        # Full export: streamed chunk by chunk to a file, never materialized in the app
+        with st.expander("Export all filtered rows", expanded=False):
+            fmt = st.radio("Format", list(drill_export.FORMATS), horizontal=True, key="drill_export_fmt")
+            export_sql, export_params = render("drill_export", schema, view)
+            path = drill_export.export_path(ResultCache.key(export_sql, export_params, version), fmt)
+            if st.button(f"Export ≈{n_total:,} rows as {fmt.upper()}", disabled=n_total == 0):
+                bar = st.progress(0.0, text="Starting export…")
+
+                def progress(rows: int) -> None:
+                    bar.progress(min(rows / n_total, 1.0) if n_total else 1.0, text=f"{rows:,} rows written")
+
+                t0 = perf_counter()
+                with pool.lease(pool_user) as pooled:
+                    if is_local:
+                        chunks = _local_engine().drill_chunks(flt, int(os.getenv("EXPORT_CHUNK_ROWS", "100000")), grace)
+                    else:
+                        chunks = _snowflake_batches(pooled, export_sql, export_params)
+                    rows = drill_export.write_chunks(chunks, path, fmt, progress)
+                bar.progress(1.0, text=f"{rows:,} rows written")
+                rec = QueryRecord(
+                    name="drill_export",
+                    backend=backend,
+                    ms=round((perf_counter() - t0) * 1000, 1),
+                    rows=rows,
+                    bytes=os.path.getsize(path),
+                    cache="miss",
+                )
+                stats.record(rec)
+                run_log.append(rec)
+            done = drill_export.finished(path)
+            if done is not None:
+                max_mb = int(os.getenv("EXPORT_DOWNLOAD_MAX_MB", "200"))
+                st.caption(f"{done['rows']:,} rows, {done['bytes'] / 1e6:,.1f} MB → {path}")
+                if done["bytes"] <= max_mb * 1024 * 1024:
+                    # The download widget holds the file in server memory, hence the size cap
+                    with open(path, "rb") as f:
+                        st.download_button("Download", f, file_name=f"shipment_details.{fmt}", mime=drill_export.FORMATS[fmt])
+                else:
+                    st.caption(f"Larger than EXPORT_DOWNLOAD_MAX_MB ({max_mb}); copy the file from the path above.")
+
+    drill_panel()
+
+    if refining and getattr(st, "fragment", None) is not None:
+        @st.fragment(run_every=APPROX_POLL_S)
+        def refine_watch() -> None:
+            # Polls the result cache; once every exact result is in, a full rerun renders them
+            pending = [k for k in refining if result_cache.get(k)[0] is None]
+            if not pending:
+                st.rerun()
+            if not any(k in get_refining() for k in pending):
+                st.caption("Exact results failed; approximate panels stay until the next rerun.")
+            else:
+                st.caption(f"Refining {len(pending)} approximate panel(s) to exact results…")
+
+        refine_watch()
+
+    def warm_tasks() -> Iterator[Task]:
+        # Default view first (full date range, no filters, default grace), then the most applied views
+        yield partial(warm, *render("dims", schema))
+        anchor_sql, _ = render("anchor", schema)
+        yield partial(warm, anchor_sql)
+        anchor, _ = result_cache.get(ResultCache.key(anchor_sql, (), version))
+        lo, hi = (_first(anchor, "min_d"), _first(anchor, "max_d")) if anchor is not None else (None, None)
+        views = [[astuple(Filters(
+            date_start=pd.Timestamp(lo).date().isoformat() if lo is not None else None,
+            date_end=pd.Timestamp(hi).date().isoformat() if hi is not None else None,
+        )), DEFAULT_GRACE]]
+        views += stats.top_views(int(os.getenv("WARMUP_TOP_VIEWS", "5")))
+        seen = set()
+        for view_flt, view_grace in views:
+            view_flt = filters_from_json(list(view_flt))
+            if (view_flt, view_grace) in seen:
+                continue
+            seen.add((view_flt, view_grace))
+            for sql, params in build_view_queries(schema, int(view_grace), view_flt, page_size):
+                yield partial(warm, sql, params, view_flt, DrillPage(None, page_size), grace=int(view_grace))
+
+    # Speculative warm-up, once per data version per process (time-bucketed versions are skipped:
+    # they change every minute and would spend the budget over and over)
+    warmup_on = os.getenv("WARMUP", "1").strip() not in {"0", "false", "False"}
+    if warmup_on and not version.startswith("ttl:"):
+        get_warmer().start(version, warm_tasks)
+
+    # Perf panel: this rerun's queries plus rolling percentiles across all sessions
+    with st.expander("Performance", expanded=False):
+        w = get_warmer().last
+        if w is not None:
+            st.caption(
+                f"Warm-up {'done' if w['done'] else 'running'}: {w['queries']} queries, "
+                f"{w['seconds']:.1f}s of {get_warmer().budget_s:.0f}s budget, {w['cached']} already cached"
+            )
+        ps = pool.snapshot()
+        st.caption(
+            f"Session pool: {ps['busy']}/{ps['size']} busy, {ps['queued']} queued "
+            f"({ps['users_waiting']} users), {ps['served']:,} served, {ps['shed']} shed, avg wait {ps['avg_wait_ms']} ms. "
+            f"Superseded queries cancelled this session: {inflight.cancelled} ({superseded} at the start of this run)"
+        )
+        st.caption("This run" + (f" (reused without a query: {', '.join(reused)})" if reused else ""))
+        st.dataframe(pd.DataFrame([asdict(r) for r in run_log]), use_container_width=True)
+        st.caption(f"Per query, last {stats.window} runs (all sessions)")
+        st.dataframe(stats.percentiles(), use_container_width=True)
+    metrics_file = os.getenv("QUERY_METRICS_FILE")
+    if metrics_file:
+        stats.write_openmetrics(metrics_file)
 
 
 if __name__ == "__main__":
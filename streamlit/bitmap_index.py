@@ -0,0 +1,113 @@
+"""
+Inverted bitmap indexes over a fact table for the app's local engine.
+
+- One posting list / bitmap of row ids per distinct value of each indexed column
+- A filter is an AND across columns of an OR within each column (multi-select semantics);
+  ranges (e.g. delivery_date between two dates) OR a contiguous run of sorted keys
+- Uses compressed Roaring bitmaps when pyroaring is installed, otherwise sorted numpy
+  posting lists combined through boolean row masks
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from pyroaring import BitMap  # type: ignore
+except Exception:  # pragma: no cover
+    BitMap = None  # type: ignore
+
+
+def _keys(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """(int64 keys, valid mask); datetimes become day numbers so date ranges compare as ints."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        v = values.dt.tz_localize(None) if getattr(values.dt, "tz", None) is not None else values
+        valid = v.notna().to_numpy()
+        return v.to_numpy(dtype="datetime64[D]", na_value=np.datetime64("NaT")).astype(np.int64), valid
+    valid = values.notna().to_numpy()
+    return values.fillna(0).to_numpy(dtype=np.int64), valid
+
+
+def _day(value) -> int:
+    return int(np.datetime64(pd.Timestamp(value).date(), "D").astype(np.int64))
+
+
+class FilterIndex:
+    """Per-column inverted indexes over the rows of `df` (row ids are positions, for iloc)."""
+
+    def __init__(self, df: pd.DataFrame, columns: Sequence[str]):
+        self.n = len(df)
+        self.backend = "roaring" if BitMap is not None else "numpy"
+        self._keys: Dict[str, np.ndarray] = {}
+        self._offsets: Dict[str, np.ndarray] = {}
+        self._postings: Dict[str, np.ndarray] = {}
+        self._maps: Dict[str, list] = {}
+        dtype = np.uint32 if self.n < 2**32 else np.uint64
+        for col in columns:
+            keys, valid = _keys(df[col])
+            rows = np.flatnonzero(valid)
+            order = rows[np.argsort(keys[rows], kind="stable")].astype(dtype)
+            uniq, counts = np.unique(keys[rows], return_counts=True)
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._keys[col] = uniq
+            self._offsets[col] = offsets
+            if BitMap is not None:
+                self._maps[col] = [BitMap(order[offsets[i]:offsets[i + 1]]) for i in range(len(uniq))]
+            else:
+                self._postings[col] = order
+
+    def _slots(self, col: str, values: Iterable) -> np.ndarray:
+        """Positions in the sorted key array of the requested values (unknown values dropped)."""
+        keys = self._keys[col]
+        wanted = np.unique(np.asarray([int(v) for v in values], dtype=np.int64))
+        pos = np.searchsorted(keys, wanted)
+        hit = pos < len(keys)
+        pos, wanted = pos[hit], wanted[hit]
+        return pos[keys[pos] == wanted]
+
+    def _range_slots(self, col: str, lo, hi) -> np.ndarray:
+        keys = self._keys[col]
+        start = np.searchsorted(keys, _day(lo), "left") if lo is not None else 0
+        stop = np.searchsorted(keys, _day(hi), "right") if hi is not None else len(keys)
+        return np.arange(start, stop)
+
+    def _term(self, col: str, slots: np.ndarray):
+        """OR of the posting lists at `slots`: a BitMap, or a boolean row mask."""
+        if BitMap is not None:
+            maps = self._maps[col]
+            return BitMap.union(*(maps[i] for i in slots)) if len(slots) else BitMap()
+        offsets, postings = self._offsets[col], self._postings[col]
+        mask = np.zeros(self.n, dtype=bool)
+        if len(slots) and slots[-1] - slots[0] + 1 == len(slots):
+            # Contiguous keys (date ranges): one slice of the value-sorted postings
+            mask[postings[offsets[slots[0]]:offsets[slots[-1] + 1]]] = True
+        elif len(slots):
+            mask[np.concatenate([postings[offsets[i]:offsets[i + 1]] for i in slots])] = True
+        return mask
+
+    def rows(
+        self,
+        equals: Iterable[Tuple[str, Sequence]] = (),
+        ranges: Iterable[Tuple[str, object, object]] = (),
+    ) -> Optional[np.ndarray]:
+        """Sorted row ids matching every term, or None when no term is active (all rows).
+
+        `equals` terms are (column, values) with OR semantics inside a term; `ranges` terms are
+        (column, lo, hi) over date columns, inclusive, either bound optional.
+        """
+        terms = [(col, self._slots(col, values)) for col, values in equals if values]
+        terms += [(col, self._range_slots(col, lo, hi)) for col, lo, hi in ranges if lo is not None or hi is not None]
+        if not terms:
+            return None
+        # Most selective term first keeps the running intersection small
+        terms.sort(key=lambda t: int(np.diff(self._offsets[t[0]])[t[1]].sum()))
+        acc = None
+        for col, slots in terms:
+            term = self._term(col, slots)
+            acc = term if acc is None else (acc & term)
+        if BitMap is not None:
+            return np.fromiter(acc, dtype=np.int64, count=len(acc))
+        return np.flatnonzero(acc)
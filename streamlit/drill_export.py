@@ -0,0 +1,91 @@
+"""
+Streaming export of the full filtered drill set.
+
+- Consumes an iterator of DataFrame chunks (Snowpark result batches, or slices of the local
+  store) and appends each one to a single CSV or Parquet file, so the app only ever holds
+  one chunk in memory
+- Parquet gets one row group per chunk; the schema is fixed by the first chunk
+- Files land under EXPORT_DIR named by a content key (query + binds + data version), so
+  exporting the same scope twice reuses the finished file
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from typing import Callable, Iterable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def export_dir() -> str:
+    return os.getenv("EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "logistics_dash_exports")
+
+
+def export_path(key: str, fmt: str) -> str:
+    return os.path.join(export_dir(), f"{key}.{fmt}")
+
+
+def _arrow_schema(chunk: pd.DataFrame) -> pa.Schema:
+    # An all-null text column in the first chunk would pin the column to the null type
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    return pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+
+
+def write_chunks(
+    chunks: Iterable[pd.DataFrame],
+    path: str,
+    fmt: str,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Stream `chunks` into `path` (csv or parquet); return the row count.
+
+    Written to a temp file and renamed at the end, so a cancelled or failed export never
+    leaves a partial file behind. `progress` is called with the running row count.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # A unique temp name: two sessions (threads of one process) may export the same scope at once
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    rows = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer: Optional[pq.ParquetWriter] = None
+            for chunk in chunks:
+                if fmt == "csv":
+                    f.write(chunk.to_csv(header=rows == 0, index=False).encode("utf-8"))
+                else:
+                    if writer is None:
+                        writer = pq.ParquetWriter(f, _arrow_schema(chunk))
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+                rows += len(chunk)
+                if progress is not None:
+                    progress(rows)
+            if writer is not None:
+                writer.close()
+            elif fmt == "parquet":
+                pq.write_table(pa.table({}), f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    with open(f"{path}.json", "w", encoding="utf-8") as f:
+        json.dump({"rows": rows, "bytes": os.path.getsize(path)}, f)
+    return rows
+
+
+def finished(path: str) -> Optional[dict]:
+    """{"rows", "bytes"} of a completed export at `path`, or None."""
+    try:
+        with open(f"{path}.json", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.exists(path) else None
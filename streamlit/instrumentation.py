@@ -0,0 +1,162 @@
+"""
+Query instrumentation for the dashboard.
+
+- One QueryRecord per run_df call: stable query name, backend, wall time, rows, bytes,
+  cache tier (memory/disk/miss, prefetch for background work, refine for the exact query behind
+  an approximate panel, stale for a fallback result, cancelled when a rerun superseded the
+  query) and the warehouse query id when one was issued
+- Rolling p50/p95/p99 wall time per query name over a bounded window
+- Recently applied views (filters + grace), most frequent first, seeded from a QUERY_LOG file
+  on startup; the cache warm-up prefetches the top ones
+- Optional sinks: JSONL (one line per record, to a file or POSTed to an http(s) endpoint)
+  and an OpenMetrics text file for scraping
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class QueryRecord:
+    name: str
+    backend: str
+    ms: float
+    rows: int
+    bytes: int
+    cache: str  # memory | disk | miss | prefetch (background warm-up) | refine (approximate -> exact) | stale (fallback) | cancelled
+    query_id: Optional[str] = None
+    ts: float = field(default_factory=time.time)
+
+
+class QueryStats:
+    """Process-wide, thread-safe rolling query statistics (shared by all sessions)."""
+
+    def __init__(self, window: int = 500, jsonl: Optional[str] = None):
+        self.window = window
+        self.jsonl = jsonl
+        self._lock = threading.Lock()
+        self._ms: Dict[str, Deque[float]] = {}
+        self._cache: Dict[str, Deque[str]] = {}
+        self._counts: Dict[tuple[str, str, str], int] = {}
+        self._views: Deque[str] = deque(maxlen=window)
+        if jsonl and not jsonl.startswith(("http://", "https://")):
+            self._load_views(jsonl)
+
+    def _load_views(self, path: str, max_bytes: int = 4 << 20) -> None:
+        """Seed the view history from the tail of an existing JSONL log."""
+        try:
+            with open(path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(f.tell() - max_bytes, 0))
+                lines = f.read().decode("utf-8", "replace").splitlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                view = json.loads(line).get("view")
+            except (ValueError, AttributeError):
+                continue
+            if view is not None:
+                self._views.append(json.dumps(view))
+
+    def record_view(self, view) -> None:
+        """Count one applied view (any JSON-serializable value, e.g. [filters, grace])."""
+        key = json.dumps(view)
+        with self._lock:
+            self._views.append(key)
+        if self.jsonl:
+            self._emit(json.dumps({"view": view, "ts": time.time()}))
+
+    def top_views(self, n: int) -> List[list]:
+        """The `n` most frequently applied views in the window (JSON values, most frequent first)."""
+        with self._lock:
+            counts = Counter(self._views)
+        return [json.loads(k) for k, _ in counts.most_common(n)]
+
+    def record(self, rec: QueryRecord) -> None:
+        with self._lock:
+            self._ms.setdefault(rec.name, deque(maxlen=self.window)).append(rec.ms)
+            self._cache.setdefault(rec.name, deque(maxlen=self.window)).append(rec.cache)
+            k = (rec.name, rec.backend, rec.cache)
+            self._counts[k] = self._counts.get(k, 0) + 1
+        if self.jsonl:
+            self._emit(json.dumps(asdict(rec)))
+
+    def _emit(self, line: str) -> None:
+        if self.jsonl.startswith(("http://", "https://")):
+            # Fire and forget: a slow collector must never block a dashboard query
+            threading.Thread(target=self._post, args=(line,), daemon=True).start()
+            return
+        try:
+            with open(self.jsonl, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+    def _post(self, line: str) -> None:
+        req = urllib.request.Request(
+            self.jsonl, data=(line + "\n").encode("utf-8"), headers={"Content-Type": "application/x-ndjson"}
+        )
+        try:
+            urllib.request.urlopen(req, timeout=2).close()
+        except Exception:
+            pass
+
+    def percentiles(self) -> pd.DataFrame:
+        """Per query name: samples in window, p50/p95/p99 ms and cache hit rate."""
+        with self._lock:
+            snap = {n: (np.fromiter(ms, dtype=float), list(self._cache[n])) for n, ms in self._ms.items()}
+        rows = []
+        for name, (ms, tiers) in sorted(snap.items()):
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            rows.append({
+                "query": name,
+                "n": len(ms),
+                "p50_ms": round(p50, 1),
+                "p95_ms": round(p95, 1),
+                "p99_ms": round(p99, 1),
+                "hit_rate": sum(t in ("memory", "disk") for t in tiers) / len(tiers),
+            })
+        return pd.DataFrame(rows, columns=["query", "n", "p50_ms", "p95_ms", "p99_ms", "hit_rate"])
+
+    def to_openmetrics(self) -> str:
+        """OpenMetrics exposition: rolling quantiles (summary) plus lifetime query counters."""
+        out: List[str] = ["# TYPE dashboard_query_ms summary"]
+        for _, r in self.percentiles().iterrows():
+            for q, col in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                out.append(f'dashboard_query_ms{{query="{r["query"]}",quantile="{q}"}} {r[col]}')
+        out.append("# TYPE dashboard_queries counter")
+        with self._lock:
+            counts = sorted(self._counts.items())
+        for (name, backend, cache), n in counts:
+            out.append(f'dashboard_queries_total{{query="{name}",backend="{backend}",cache="{cache}"}} {n}')
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+    def write_openmetrics(self, path: str) -> None:
+        # Every session's rerun writes the file, so each writer gets its own temp name
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.to_openmetrics())
+            os.chmod(tmp, 0o644)  # mkstemp creates it owner-only; scrapers often run as another user
+            os.replace(tmp, path)
+        except OSError:
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
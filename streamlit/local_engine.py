@@ -0,0 +1,329 @@
+"""
+Pandas engine behind the app's CSV mode (USE_LOCAL_DATA=1).
+
+- Answers the app's tagged panel queries (-- app:<name>) from the local store's frames
+  (streamlit/local_store.py) instead of a warehouse; the SQL text itself is not parsed
+- Sidebar filters resolve to row ids through bitmap indexes (bitmap_index.FilterIndex) or,
+  for the partitioned layout, through month row spans
+- One instance is shared by every session and thread (the app keeps it in st.cache_resource;
+  scripts/load_test.py drives it headlessly); the frames are read-only
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+import local_store
+from bitmap_index import FilterIndex
+from query_catalog import DEFAULT_GRACE, DEFAULT_SAMPLE_PCT, MILESTONES, PERCENTILES, SAMPLE_SEED
+
+
+class LocalEngine:
+    """The local store's frames plus the indexes the panel handlers use, built on first use.
+
+    `flt` arguments are query_catalog.Filters and `page` a query_catalog.DrillPage (read by attribute only).
+    `memo` is an optional dict shared by the queries of one rerun, so the filtered rows are
+    resolved once per view rather than once per panel.
+    """
+
+    def __init__(self, data: Dict[str, pd.DataFrame], partitions: Optional[dict] = None):
+        self.data = data
+        self.partitions = partitions or {}
+        self._indexes: Dict[str, FilterIndex] = {}
+        self._rank: Optional[np.ndarray] = None
+        self._samples: Dict[tuple, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, csv_dir: str, store_dir: Optional[str] = None, keys: Optional[str] = None) -> "LocalEngine":
+        """Engine over the generator output in `csv_dir`, building or reusing its Arrow store."""
+        return cls(local_store.load(csv_dir, store_dir, keys), local_store.partitions(csv_dir, store_dir))
+
+    def index(self, table: str = "fact_shipment") -> FilterIndex:
+        """Inverted bitmaps over FACT_SHIPMENT (or the milestone snapshot) for every sidebar filter column."""
+        with self._lock:
+            if table not in self._indexes:
+                days = ["delivery_date", "tendered_ts"] if table == MILESTONES else ["delivery_date"]
+                cols = ["customer_id", "carrier_id", "equipment_id", "lane_id", *days]
+                self._indexes[table] = FilterIndex(self.data[table], cols)
+            return self._indexes[table]
+
+    def drill_rank(self) -> np.ndarray:
+        """Position of every fact row in (shipment_id, leg_id) order, so a page needs no full sort."""
+        with self._lock:
+            if self._rank is None:
+                fs = self.data["fact_shipment"]
+                rank = np.empty(len(fs), dtype=np.int64)
+                rank[fs.sort_values(["shipment_id", "leg_id"]).index.to_numpy()] = np.arange(len(fs))
+                self._rank = rank
+            return self._rank
+
+    def sample_mask(self, table: str, pct: float) -> np.ndarray:
+        """Seeded Bernoulli mask over the rows of `table`, each kept with probability pct/100.
+
+        Built once per table and rate, so approximate panels sample the same rows on every rerun
+        (like the SEED of the SQL version) and a filtered frame is sampled by its row labels.
+        """
+        with self._lock:
+            if (table, pct) not in self._samples:
+                rng = np.random.default_rng(SAMPLE_SEED)
+                self._samples[(table, pct)] = rng.random(len(self.data[table])) < pct / 100
+            return self._samples[(table, pct)]
+
+    def lane_labels(self) -> pd.Series:
+        """"Origin → Destination" city label per lane, indexed by lane_id."""
+        dloc, dlane = self.data["dim_location"], self.data["dim_lane"]
+        ln = dlane.merge(dloc.add_prefix("o_"), left_on="origin_loc_id", right_on="o_loc_id") \
+                  .merge(dloc.add_prefix("d_"), left_on="dest_loc_id", right_on="d_loc_id")
+        return pd.Series((ln["o_city"].astype(str) + " → " + ln["d_city"].astype(str)).to_numpy(), index=ln["lane_id"])
+
+    def filtered(
+        self, flt, memo: Optional[dict] = None, table: str = "fact_shipment", day: str = "delivery_date"
+    ) -> pd.DataFrame:
+        """Rows of `table` matching the sidebar filters, with the date range on column `day`."""
+        fs = self.data[table]
+        if flt is None:
+            return fs
+        memo = {} if memo is None else memo
+        if (table, day, flt) not in memo:
+            spans = self.partitions.get(table) if day == "delivery_date" else None
+            if spans and (flt.date_start or flt.date_end):
+                # Partitioned source: months inside the range are taken whole by row span and only
+                # the edge months are checked row by row; other months are never touched
+                rows = self._partition_rows(fs, spans, flt.date_start, flt.date_end)
+                ids = self.index(table).rows(flt.id_terms())
+                if ids is not None:
+                    rows = np.intersect1d(rows, ids, assume_unique=True)
+            else:
+                rows = self.index(table).rows(flt.id_terms(), [(day, flt.date_start, flt.date_end)])
+            memo[(table, day, flt)] = fs if rows is None else fs.iloc[rows]
+        return memo[(table, day, flt)]
+
+    @staticmethod
+    def _partition_rows(fs: pd.DataFrame, spans: list, lo: Optional[str], hi: Optional[str]) -> np.ndarray:
+        days = fs["delivery_date"].to_numpy()  # datetime64; NaT fails both comparisons
+        parts = []
+        for start, stop, whole in local_store.prune(spans, lo, hi):
+            if whole:
+                parts.append(np.arange(start, stop))
+                continue
+            d = days[start:stop]
+            keep = np.ones(len(d), dtype=bool)  # an edge month always has a bound to check
+            if lo:
+                keep &= d >= np.datetime64(str(lo)[:10])
+            if hi:
+                keep &= d <= np.datetime64(str(hi)[:10])
+            parts.append(start + np.flatnonzero(keep))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def run(
+        self, name: str, flt=None, page=None, memo: Optional[dict] = None, sample_pct: float = DEFAULT_SAMPLE_PCT,
+        grace: int = DEFAULT_GRACE,
+    ) -> pd.DataFrame:
+        """Result of the panel query tagged `name`, in the columns the SQL version returns.
+
+        `sample_pct` is the Bernoulli rate of the approximate (`*_approx`) queries; `grace` the
+        on-time grace minutes that the SQL renders into otd, lane, lane_approx and drill.
+        """
+        # Handlers read the shared frames without copying them; derived columns go on subsets
+        data = self.data
+        dc = data["dim_customer"]
+        dcar = data["dim_carrier"]
+        deq = data["dim_equipment"]
+        fs = self.filtered(flt, memo)
+        fe = data["fact_event"]
+
+        # DIM lists
+        if name == "dims":
+            labels = self.lane_labels()
+            lane_labels = pd.DataFrame({"id": labels.index, "v": labels.to_numpy()})
+            out = []
+            for k, frame, id_col, name_col in (
+                ("customer", dc, "customer_id", "name"),
+                ("carrier", dcar, "carrier_id", "name"),
+                ("equipment", deq, "equipment_id", "type"),
+            ):
+                rows = frame[[id_col, name_col]].dropna().sort_values(name_col)
+                out.append(pd.DataFrame({"k": k, "id": rows[id_col].tolist(), "v": rows[name_col].tolist()}))
+            lanes = lane_labels.dropna()
+            out.append(pd.DataFrame({"k": ["lane"] * len(lanes), "id": lanes["id"].tolist(), "v": lanes["v"].tolist()}))
+            return pd.concat(out, ignore_index=True)
+
+        # Date range defaults
+        if name == "anchor":
+            d = fs["delivery_date"].dropna()
+            return pd.DataFrame({"min_d": [d.min().date() if len(d) else None], "max_d": [d.max().date() if len(d) else None]})
+
+        # Lane perf
+        if name == "lane":
+            df = fs.dropna(subset=["pickup_actual_ts","delivery_actual_ts"])
+            df = df.assign(
+                is_otd=df["delivery_actual_ts"] <= df["delivery_plan_ts"] + pd.to_timedelta(grace, unit="m"),
+                lane=df["lane_id"].map(self.lane_labels()),
+            )
+            df["transit_days"] = (df["delivery_actual_ts"] - df["pickup_actual_ts"]).dt.days
+            g = df.groupby("lane", dropna=False).agg(shipments=("shipment_id","count"), avg_transit_days=("transit_days","mean"), otd_rate=("is_otd","mean")).reset_index()
+            return g.sort_values("shipments", ascending=False).head(50)
+
+        # Lane perf from a sample: equal weights (100/pct), so the estimates are sample means and
+        # the 95% half-widths use the sampled row count, as in query_catalog.build_lane_approx_sql
+        if name == "lane_approx":
+            df = fs[self.sample_mask("fact_shipment", sample_pct)[fs.index.to_numpy()]]
+            df = df.dropna(subset=["pickup_actual_ts","delivery_actual_ts"])
+            td = (df["delivery_actual_ts"] - df["pickup_actual_ts"]).dt.days
+            df = pd.DataFrame({
+                "lane": df["lane_id"].map(self.lane_labels()),
+                "td": td,
+                "td2": td * td,
+                "is_otd": (df["delivery_actual_ts"] <= df["delivery_plan_ts"] + pd.to_timedelta(grace, unit="m")).astype(float),
+            })
+            g = df.groupby("lane", dropna=False).agg(
+                sample_rows=("td","count"), avg_transit_days=("td","mean"), td2=("td2","mean"), otd_rate=("is_otd","mean")
+            ).reset_index()
+            n = g["sample_rows"].where(g["sample_rows"] > 1)
+            g["shipments"] = (g["sample_rows"] * 100 / sample_pct).round()
+            g["avg_transit_days_ci"] = 1.96 * np.sqrt((g["td2"] - g["avg_transit_days"] ** 2).clip(lower=0) / n)
+            g["otd_rate_ci"] = 1.96 * np.sqrt(g["otd_rate"] * (1 - g["otd_rate"]) / n)
+            cols = ["lane","shipments","avg_transit_days","otd_rate","avg_transit_days_ci","otd_rate_ci","sample_rows"]
+            return g.sort_values("shipments", ascending=False).head(50)[cols]
+
+        # OTD last/prior
+        if name == "otd":
+            df = fs.dropna(subset=["delivery_actual_ts"])
+            if df.empty:
+                return pd.DataFrame({"otd_last_30":[0.0],"otd_prior_30":[0.0]})
+            anchor = df["delivery_date"].max()
+            last_start = anchor - pd.Timedelta(days=29)
+            prev_start = anchor - pd.Timedelta(days=60)
+            prev_end = anchor - pd.Timedelta(days=30)
+            df = df.assign(is_otd=df["delivery_actual_ts"] <= df["delivery_plan_ts"] + pd.to_timedelta(grace, unit="m"))
+            d = df["delivery_date"]
+            last = df[(d >= last_start) & (d <= anchor)]
+            prev = df[(d >= prev_start) & (d <= prev_end)]
+            def rate(x):
+                n = len(x)
+                return float(x["is_otd"].sum())/n if n else 0.0
+            return pd.DataFrame({"otd_last_30":[rate(last)], "otd_prior_30":[rate(prev)]})
+
+        # GM/Mile YTD
+        if name == "gmm":
+            df = fs.dropna(subset=["delivery_actual_ts"])
+            if df.empty:
+                return pd.DataFrame({"gm_per_mile":[0.0]})
+            anchor = df["delivery_date"].max()
+            ytd = df[(df["delivery_date"] >= anchor.replace(month=1, day=1)) & (df["delivery_date"] <= anchor)]
+            miles = ytd["planned_miles"].sum()
+            return pd.DataFrame({"gm_per_mile":[(ytd["revenue"].sum() - ytd["total_cost"].sum()) / miles if miles else None]})
+
+        # Average transit days
+        if name == "transit":
+            df = fs.dropna(subset=["pickup_actual_ts","delivery_actual_ts"])
+            if df.empty:
+                return pd.DataFrame({"avg_transit_days":[0.0]})
+            df = df.assign(td=(df["delivery_actual_ts"] - df["pickup_actual_ts"]).dt.days)
+            return pd.DataFrame({"avg_transit_days":[df["td"].mean()]})
+
+        # Transit-hour and dwell-minute percentiles: exact here (the SQL versions merge sketches
+        # or use APPROX_PERCENTILE); dwell from the milestone snapshot when loaded
+        if name in ("pct", "lane_pct"):
+            df = fs.dropna(subset=["pickup_actual_ts","delivery_actual_ts"])
+            hours = ((df["delivery_actual_ts"] - df["pickup_actual_ts"]).dt.total_seconds() // 60) / 60
+            qs = list(PERCENTILES.values())
+            if name == "lane_pct":
+                if df.empty:
+                    return pd.DataFrame(columns=["lane", "shipments", *(f"transit_hours_{p}" for p in PERCENTILES)])
+                by_lane = hours.groupby(df["lane_id"].map(self.lane_labels()).rename("lane"), dropna=False)
+                g = by_lane.quantile(qs).unstack()
+                g.columns = [f"transit_hours_{p}" for p in PERCENTILES]
+                g.insert(0, "shipments", by_lane.size())
+                return g.reset_index().sort_values("shipments", ascending=False).head(50)
+            dwell = self.filtered(flt, memo, MILESTONES)["dwell_minutes"].dropna() if MILESTONES in data else pd.Series(dtype=float)
+            row = {}
+            for metric, values in (("transit_hours", hours), ("dwell_minutes", dwell)):
+                for p, q in PERCENTILES.items():
+                    row[f"{metric}_{p}"] = [values.quantile(q) if len(values) else None]
+            return pd.DataFrame(row)
+
+        # Tender acceptance: one filtered scan of the milestone snapshot when loaded (by tender
+        # date, like query_catalog._tender_filters)
+        if MILESTONES in data and name == "tender":
+            ms = self.filtered(flt, memo, MILESTONES, "tendered_ts")
+            tendered = ms["tendered_ts"].count()
+            rate = float(ms["accepted_ts"].count())/float(tendered) if tendered else 0.0
+            return pd.DataFrame({"tender_acceptance_events":[rate], "avg_dwell_minutes":[ms["dwell_minutes"].mean()]})
+
+        # Tender acceptance (events)
+        # Events join shipments on the int64 key when the store was built with LOCAL_KEYS=compact
+        key = "shipment_key" if "shipment_key" in fe.columns else "shipment_id"
+
+        if name == "tender":
+            tendered = fe.loc[fe["event_type"]=="Tendered", key].nunique()
+            accepted = fe.loc[fe["event_type"]=="Accepted", key].nunique()
+            rate = float(accepted)/float(tendered) if tendered else 0.0
+            return pd.DataFrame({"tender_acceptance_events":[rate]})
+
+        # Exception heatmap (counts); the approximate one from a sample of the events, scaled up
+        if name in ("exceptions", "exceptions_approx"):
+            ex = fe.loc[fe["event_type"]=="Exception", [key,"notes"]]
+            if name == "exceptions_approx":
+                ex = ex[self.sample_mask("fact_event", sample_pct)[ex.index.to_numpy()]]
+            if ex.empty:
+                return pd.DataFrame(columns=["customer_name","exception_type","exceptions"] + (["sample_rows"] if name == "exceptions_approx" else []))
+            # Map shipment->customer
+            ex = ex.merge(fs[[key,"customer_id"]], on=key, how="inner")
+            ex = ex.merge(dc[["customer_id","name"]].rename(columns={"name":"customer_name"}), on="customer_id", how="left")
+            ex["exception_type"] = ex["notes"].astype(object).where(ex["notes"].notna(), "Unknown")
+            g = ex.groupby(["customer_name","exception_type"], dropna=False, observed=True).size().reset_index(name="exceptions")
+            if name == "exceptions_approx":
+                g["sample_rows"] = g["exceptions"]
+                g["exceptions"] = (g["exceptions"] * 100 / sample_pct).round()
+            return g
+
+        # Drill table
+        if name == "drill_count":
+            return pd.DataFrame({"n": [len(fs)]})
+
+        if name == "drill":
+            after, size = (page.after, page.size) if page is not None else (None, 1000)
+            df = fs
+            if after is not None:
+                sid, leg = after
+                df = df[(df["shipment_id"] > sid) | ((df["shipment_id"] == sid) & (df["leg_id"] > leg))]
+            # Top-k by precomputed rank: only the rows of this page get sorted
+            rank = self.drill_rank()[df.index.to_numpy()]
+            k = min(size, len(rank))
+            top = np.argpartition(rank, k - 1)[:k] if 0 < k < len(rank) else np.arange(len(rank))
+            return self.drill_frame(df.iloc[top[np.argsort(rank[top])]], grace)
+
+        # Fallback empty
+        return pd.DataFrame()
+
+    def drill_frame(self, df: pd.DataFrame, grace: int = DEFAULT_GRACE) -> pd.DataFrame:
+        """Drill columns for a slice of FACT_SHIPMENT rows (one page or one export chunk)."""
+        data = self.data
+        dc, dcar = data["dim_customer"], data["dim_carrier"]
+        df = df.merge(dc[["customer_id","name"]].rename(columns={"name":"customer_name"}), on="customer_id", how="left")
+        df = df.merge(dcar[["carrier_id","name"]].rename(columns={"name":"carrier_name"}), on="carrier_id", how="left")
+        df["lane"] = df["lane_id"].map(self.lane_labels())
+        df["isdeliveredontime_calc"] = (df["delivery_actual_ts"] <= df["delivery_plan_ts"] + pd.to_timedelta(grace, unit="m"))
+        df["isotif"] = df["isdeliveredontime_calc"] & df["isinfull"].fillna(False)
+        df["gm_per_mile"] = (df["revenue"] - df["total_cost"]) / df["planned_miles"].replace(0, pd.NA)
+        cols = [
+            "shipment_id","leg_id","customer_name","carrier_name","lane","status",
+            "pickup_plan_ts","pickup_actual_ts","delivery_plan_ts","delivery_actual_ts",
+            "isdeliveredontime_calc","isinfull","isotif","planned_miles","actual_miles","revenue","total_cost","gm_per_mile"
+        ]
+        return df[cols]
+
+    def drill_chunks(self, flt, size: int, grace: int = DEFAULT_GRACE) -> Iterator[pd.DataFrame]:
+        """The filtered set in (shipment_id, leg_id) order, enriched one chunk at a time."""
+        fs = self.filtered(flt)
+        rows = fs.index.to_numpy()
+        rows = rows[np.argsort(self.drill_rank()[rows], kind="stable")]
+        base = self.data["fact_shipment"]
+        for i in range(0, len(rows), size):
+            yield self.drill_frame(base.iloc[rows[i:i + size]], grace)
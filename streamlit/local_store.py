@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Columnar local data store for the app's CSV mode (USE_LOCAL_DATA=1).
+
+- Converts data/out/*.csv once into uncompressed Arrow IPC (Feather v2) files
+- Timestamps parsed to UTC, delivery_date precomputed (same typing as FACT_SHIPMENT_TYPED)
+- Repetitive strings (status, event_type, notes, names, cities, ...) stored as dictionaries,
+  which load as pandas categoricals with sorted categories
+- Files are memory-mapped on load, so the raw columns live in the shared page cache and
+  numeric columns without nulls come back as zero-copy views
+- Rebuilt automatically when a source CSV changes (size/mtime manifest)
+- Also reads the generator's partitioned layout (FACT_*/<key>=YYYY-MM/*.parquet). Partitions are
+  stored back to back in month order and the manifest records each one's row span, so a date
+  range maps to a contiguous run of rows without touching the rows of other months
+- Compact keys (LOCAL_KEYS=compact or --keys compact, like snowflake/09_compact_keys.sql): both
+  facts get an int64 `shipment_key` and FACT_EVENT drops its string shipment_id, so the event
+  side of the tender/exception joins is integers. FACT_SHIPMENT keeps shipment_id for the drill
+- FACT_SHIPMENT_MILESTONE (one row per shipment) is optional: output generated before it existed
+  builds without it and the app falls back to aggregating FACT_EVENT
+"""
+
+from __future__ import annotations
+
+import argparse
+import calendar
+import json
+import os
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# logical table -> (CSV file, timestamp columns)
+TABLES: Dict[str, tuple[str, List[str]]] = {
+    "dim_customer": ("DIM_CUSTOMER.csv", []),
+    "dim_carrier": ("DIM_CARRIER.csv", []),
+    "dim_equipment": ("DIM_EQUIPMENT.csv", []),
+    "dim_location": ("DIM_LOCATION.csv", []),
+    "dim_lane": ("DIM_LANE.csv", []),
+    "fact_shipment": (
+        "FACT_SHIPMENT.csv",
+        ["tender_ts", "pickup_plan_ts", "pickup_actual_ts", "delivery_plan_ts", "delivery_actual_ts"],
+    ),
+    "fact_event": ("FACT_EVENT.csv", ["event_ts"]),
+    "fact_shipment_milestone": (
+        "FACT_SHIPMENT_MILESTONE.csv",
+        ["tendered_ts", "accepted_ts", "picked_up_ts", "at_dest_ts", "delivered_ts"],
+    ),
+}
+OPTIONAL = {"fact_shipment_milestone"}  # skipped when the generator output predates them
+
+MANIFEST = "manifest.json"
+KEY_MODES = ("string", "compact")
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"  # partition of rows without a date (e.g. not yet delivered)
+
+Span = Tuple[str, int, int]  # (partition value, first row, end row)
+
+
+def default_store_dir(csv_dir: str) -> str:
+    return os.getenv("LOCAL_STORE_DIR") or os.path.join(csv_dir, ".arrow")
+
+
+def default_keys() -> str:
+    keys = os.getenv("LOCAL_KEYS", "string").lower()
+    return keys if keys in KEY_MODES else "string"
+
+
+def _partitions(csv_dir: str, csv_name: str) -> List[Tuple[str, List[str]]]:
+    """(value, parquet files) per partition directory of a partitioned table, in value order."""
+    root = os.path.join(csv_dir, os.path.splitext(csv_name)[0])
+    if not os.path.isdir(root):
+        return []
+    out = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        _, sep, value = entry.name.partition("=")
+        files = sorted(os.path.join(entry.path, f) for f in os.listdir(entry.path) if f.endswith(".parquet")) if entry.is_dir() else []
+        if sep and files:
+            out.append((value, files))
+    return out
+
+
+def _source_files(csv_dir: str, csv_name: str) -> List[str]:
+    parts = _partitions(csv_dir, csv_name)
+    return [f for _, files in parts for f in files] if parts else [os.path.join(csv_dir, csv_name)]
+
+
+def _tables(csv_dir: str) -> List[str]:
+    """TABLES present in the generator output (required ones always, so a missing CSV still errors)."""
+    return [
+        t for t, (csv_name, _) in TABLES.items()
+        if t not in OPTIONAL or _partitions(csv_dir, csv_name) or os.path.exists(os.path.join(csv_dir, csv_name))
+    ]
+
+
+def _sources(csv_dir: str) -> Dict[str, List[int]]:
+    out = {}
+    for table in _tables(csv_dir):
+        for path in _source_files(csv_dir, TABLES[table][0]):
+            st = os.stat(path)
+            out[os.path.relpath(path, csv_dir)] = [st.st_size, st.st_mtime_ns]
+    return out
+
+
+def _read(csv_dir: str, csv_name: str) -> Tuple[pd.DataFrame, List[Span]]:
+    """The table's rows (partitions concatenated in order) and the row span of each partition."""
+    parts = _partitions(csv_dir, csv_name)
+    if not parts:
+        return pd.read_csv(os.path.join(csv_dir, csv_name)), []
+    frames, spans, start = [], [], 0
+    for value, files in parts:
+        df = pq.read_table(files, partitioning=None).to_pandas()  # the key is in the path, not needed
+        frames.append(df)
+        spans.append((value, start, start + len(df)))
+        start += len(df)
+    return pd.concat(frames, ignore_index=True), spans
+
+
+def _typed_frame(csv_dir: str, table: str) -> Tuple[pd.DataFrame, List[Span]]:
+    csv_name, ts_cols = TABLES[table]
+    df, spans = _read(csv_dir, csv_name)
+    df = df.drop(columns=["row_hash"], errors="ignore")  # load-time change detection only; no panel reads it
+    for c in ts_cols:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors="coerce", utc=True)
+    if table == "fact_shipment":
+        df["delivery_date"] = df["delivery_actual_ts"].dt.tz_convert(None).dt.normalize()
+    elif "delivery_date" in df.columns:
+        df["delivery_date"] = pd.to_datetime(df["delivery_date"], errors="coerce")
+    for c in df.columns:
+        # Row keys stay plain strings; anything repetitive becomes a (sorted) categorical
+        is_text = pd.api.types.is_object_dtype(df[c]) or pd.api.types.is_string_dtype(df[c])
+        if is_text and c != "shipment_id" and df[c].nunique() <= max(len(df) // 2, 1000):
+            df[c] = df[c].astype("category")
+    return df, spans
+
+
+def _compact(frames: Dict[str, pd.DataFrame]) -> None:
+    """Add int64 shipment_key to both facts (dense, in shipment_id order) and drop FACT_EVENT's string ID."""
+    fs, fe = frames["fact_shipment"], frames["fact_event"]
+    ids = pd.Index(pd.concat([fs["shipment_id"], fe["shipment_id"]]).dropna().unique()).sort_values()
+    fs.insert(0, "shipment_key", ids.get_indexer(fs["shipment_id"]).astype("int64") + 1)
+    fe.insert(0, "shipment_key", ids.get_indexer(fe["shipment_id"]).astype("int64") + 1)
+    frames["fact_event"] = fe.drop(columns=["shipment_id"])
+
+
+def build(csv_dir: str, store_dir: str, keys: str = "string") -> None:
+    """Convert every CSV in TABLES to <store_dir>/<table>.arrow and write the manifest last."""
+    os.makedirs(store_dir, exist_ok=True)
+    sources = _sources(csv_dir)
+    partitions = {}
+    frames = {}
+    for table in _tables(csv_dir):
+        frames[table], spans = _typed_frame(csv_dir, table)
+        if spans:
+            partitions[table] = spans
+    if keys == "compact":
+        _compact(frames)
+    for table, df in frames.items():
+        tbl = pa.Table.from_pandas(df, preserve_index=False)
+        if "delivery_date" in tbl.column_names:
+            i = tbl.schema.get_field_index("delivery_date")
+            tbl = tbl.set_column(i, "delivery_date", tbl.column(i).cast(pa.date32()))
+        path = os.path.join(store_dir, f"{table}.arrow")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        # Uncompressed so the file can be memory-mapped without a decode step
+        feather.write_feather(tbl, tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    tmp = os.path.join(store_dir, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"sources": sources, "partitions": partitions, "keys": keys, "tables": list(frames)}, f)
+    os.replace(tmp, os.path.join(store_dir, MANIFEST))
+
+
+def _manifest(store_dir: str) -> dict:
+    try:
+        with open(os.path.join(store_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def ensure(csv_dir: str, store_dir: str, keys: str = "string") -> None:
+    """Build the store unless its manifest matches the current source files and key mode."""
+    manifest = _manifest(store_dir)
+    if manifest.get("sources") != _sources(csv_dir) or manifest.get("keys", "string") != keys:
+        build(csv_dir, store_dir, keys)
+
+
+def load(csv_dir: str, store_dir: str | None = None, keys: str | None = None) -> Dict[str, pd.DataFrame]:
+    """Memory-map every table and expose it as a DataFrame (treat the frames as read-only)."""
+    store_dir = store_dir or default_store_dir(csv_dir)
+    ensure(csv_dir, store_dir, keys or default_keys())
+    frames = {}
+    # Stores built before optional tables existed hold exactly the required ones
+    for table in _manifest(store_dir).get("tables", [t for t in TABLES if t not in OPTIONAL]):
+        source = pa.memory_map(os.path.join(store_dir, f"{table}.arrow"), "r")
+        tbl = pa.ipc.open_file(source).read_all()
+        frames[table] = tbl.to_pandas(split_blocks=True, date_as_object=False)
+    return frames
+
+
+def partitions(csv_dir: str, store_dir: str | None = None) -> Dict[str, List[Span]]:
+    """Row spans of each partitioned table's partitions, as stored by the last build."""
+    store_dir = store_dir or default_store_dir(csv_dir)
+    return {t: [tuple(s) for s in spans] for t, spans in _manifest(store_dir).get("partitions", {}).items()}
+
+
+def prune(spans: List[Span], lo: Optional[str], hi: Optional[str]) -> List[Tuple[int, int, bool]]:
+    """(first row, end row, whole) of the month partitions that can hold dates in [lo, hi].
+
+    Bounds are inclusive ISO dates, either optional. `whole` is True when every date of the
+    month is in range, so its rows need no per-row check. The NULL partition never matches.
+    """
+    lo_d = date.fromisoformat(str(lo)[:10]) if lo else None
+    hi_d = date.fromisoformat(str(hi)[:10]) if hi else None
+    out = []
+    for value, start, stop in spans:
+        if value == HIVE_NULL:
+            continue
+        year, month = int(value[:4]), int(value[5:7])
+        first = date(year, month, 1)
+        last = date(year, month, calendar.monthrange(year, month)[1])
+        if (lo_d and last < lo_d) or (hi_d and first > hi_d):
+            continue
+        out.append((start, stop, (lo_d is None or lo_d <= first) and (hi_d is None or hi_d >= last)))
+    return out
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Convert generated CSVs into the app's Arrow local store")
+    ap.add_argument("--data", type=str, default=os.getenv("LOCAL_DATA_DIR", "data/out"), help="Generator output directory")
+    ap.add_argument("--store", type=str, default=None, help="Store directory (default: <data>/.arrow)")
+    ap.add_argument("--keys", choices=KEY_MODES, default=default_keys(), help="Shipment key mode (default: LOCAL_KEYS or string)")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    store_dir = args.store or default_store_dir(args.data)
+    build(args.data, store_dir, args.keys)
+    for table in _manifest(store_dir)["tables"]:
+        size = os.path.getsize(os.path.join(store_dir, f"{table}.arrow"))
+        spans = partitions(args.data, store_dir).get(table, [])
+        print(f"{table:<23} {size / 1e6:8.2f} MB" + (f"  {len(spans)} partitions" if spans else ""))
+    print(f"Wrote {store_dir} ({args.keys} keys)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+In-memory typeahead index over dimension display names (customers, carriers, lanes).
+
+- Prefix matches on the whole name or on any word in it, by bisect over sorted keys
+- Substring matches for queries of 3+ characters through trigram posting lists
+- Case-insensitive; results ranked name prefix, then word prefix, then substring,
+  alphabetical within each group, cut at the requested top N
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from functools import reduce
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_END = "\U0010ffff"  # sorts after every real character: [q, q + _END) is the prefix range of q
+
+
+class NameIndex:
+    """Prefix and trigram index over a set of names; build once, search per keystroke."""
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = sorted(set(names), key=lambda n: (n.casefold(), n))
+        self._folded = [n.casefold() for n in self.names]
+        pairs = sorted((w, i) for i, f in enumerate(self._folded) for w in set(_WORD.findall(f)))
+        self._words = [w for w, _ in pairs]
+        self._word_pos = np.fromiter((i for _, i in pairs), dtype=np.int64, count=len(pairs))
+        grams: Dict[str, List[int]] = {}
+        for i, f in enumerate(self._folded):
+            for g in {f[j:j + 3] for j in range(len(f) - 2)}:
+                grams.setdefault(g, []).append(i)
+        self._grams = {g: np.asarray(pos, dtype=np.int64) for g, pos in grams.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _prefix(self, keys: List[str], q: str) -> tuple[int, int]:
+        return bisect_left(keys, q), bisect_left(keys, q + _END)
+
+    def _substring(self, q: str) -> Iterator[int]:
+        postings = [self._grams.get(q[j:j + 3]) for j in range(len(q) - 2)]
+        if any(p is None for p in postings):
+            return iter(())
+        candidates = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), sorted(postings, key=len))
+        # Trigrams match out of order too; confirm the substring itself
+        return (int(i) for i in candidates if q in self._folded[i])
+
+    def _groups(self, q: str, limit: int) -> Iterator[Iterable[int]]:
+        # Generated lazily: later groups are only computed when earlier ones fall short
+        lo, hi = self._prefix(self._folded, q)
+        yield range(lo, min(hi, lo + limit))
+        lo, hi = self._prefix(self._words, q)
+        yield np.unique(self._word_pos[lo:hi])
+        if len(q) >= 3:
+            yield self._substring(q)
+
+    def search(self, query: str, limit: int = 50) -> List[str]:
+        """Top `limit` names matching `query` (the first `limit` names when the query is blank)."""
+        q = query.strip().casefold()
+        if not q:
+            return self.names[:limit]
+        out: Dict[int, None] = {}
+        for group in self._groups(q, limit):
+            for i in group:
+                out.setdefault(int(i))
+                if len(out) >= limit:
+                    return [self.names[i] for i in out]
+        return [self.names[i] for i in out]
@@ -0,0 +1,856 @@
+"""
+Named, parameterized catalog of the dashboard's SQL.
+
+- SchemaMap renders stored identifiers; the builders (build_*_sql) turn a SchemaMap plus the
+  view inputs into Snowflake SQL tagged `-- app:<name>`, with bind params for the filters
+- CATALOG names every query the app issues and the view inputs it reads; `render(name, s, view)`
+  returns (sql, params) exactly as the app runs it, so results share cache keys
+- No Streamlit import: streamlit/app.py, scripts/debug_app_sql.py, scripts/load_test.py and
+  scripts/bench_queries.py all render from here
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+_PLAIN_IDENT = re.compile(r"[A-Z_][A-Z0-9_$]*")
+
+
+def _ident(name: str) -> str:
+    """Render an identifier as stored: bare when canonical UPPERCASE, double-quoted otherwise."""
+    return name if _PLAIN_IDENT.fullmatch(name) else '"' + name.replace('"', '""') + '"'
+
+
+@dataclass(frozen=True)
+class SchemaMap:
+    """Stored table/column identifiers of one database.schema, keyed by lowercase logical name.
+
+    Unknown tables/columns fall back to their canonical UPPERCASE name, so a missing object
+    surfaces as the warehouse's own error rather than a guess at another naming variant.
+    """
+
+    database: str
+    schema: str
+    tables: dict = field(default_factory=dict)  # logical table -> stored name
+    columns: dict = field(default_factory=dict)  # (logical table, logical column) -> stored name
+
+    def has(self, table: str) -> bool:
+        return table.lower() in self.tables
+
+    def t(self, table: str) -> str:
+        """Fully qualified table reference."""
+        return f"{self.database}.{self.schema}.{_ident(self.tables.get(table.lower(), table.upper()))}"
+
+    def c(self, table: str, col: str, alias: str = "") -> str:
+        """Column reference, optionally qualified by a table alias."""
+        ref = _ident(self.columns.get((table.lower(), col.lower()), col.upper()))
+        return f"{alias}.{ref}" if alias else ref
+
+    def ref(self, table: str, alias: str = "") -> Callable[[str], str]:
+        """Column renderer bound to one table alias, for use inside the query builders."""
+        return lambda col: self.c(table, col, alias)
+
+    @property
+    def compact(self) -> bool:
+        """Whether the compact-key serving layer (snowflake/09_compact_keys.sql) is present."""
+        return all(self.has(t) for t in ("fact_shipment_compact", "fact_event_compact", "dim_shipment", *CODE_DIMS.values()))
+
+    @property
+    def typed(self) -> bool:
+        """Whether the typed serving layer (snowflake/07_typed_serving.sql) is present; the compact one is typed too."""
+        return self.compact or (self.has("fact_shipment_typed") and self.has("fact_event_typed"))
+
+    @property
+    def shipments(self) -> str:
+        if self.compact:
+            return "fact_shipment_compact"
+        return "fact_shipment_typed" if self.typed else "fact_shipment"
+
+    @property
+    def events(self) -> str:
+        if self.compact:
+            return "fact_event_compact"
+        return "fact_event_typed" if self.typed else "fact_event"
+
+    @property
+    def key(self) -> str:
+        """Column the facts join on: the BIGINT surrogate in compact mode, the string ID otherwise."""
+        return "shipment_key" if self.compact else "shipment_id"
+
+    @property
+    def milestones(self) -> bool:
+        """Whether the shipment milestone snapshot (snowflake/10_shipment_milestone.sql) is present."""
+        return self.has(MILESTONES)
+
+    @property
+    def sample(self) -> bool:
+        """Whether the stratified shipment sample (snowflake/11_shipment_sample.sql) is present."""
+        return self.has(SAMPLE)
+
+    @property
+    def daily(self) -> bool:
+        """Whether the daily summary with quantile sketches (snowflake/12_shipment_daily.sql) is present."""
+        return self.has(DAILY)
+
+
+# Enumerated fact columns stored as SMALLINT codes in compact mode -> their code dimension
+CODE_DIMS = {"status": "dim_status", "event_type": "dim_event_type"}
+
+# One row per shipment with its event milestones; tender acceptance and dwell read it when present
+MILESTONES = "fact_shipment_milestone"
+
+# Shipment legs sampled per (lane, customer) with their inverse sampling rate; the approximate
+# lane panel reads it when present, a Bernoulli sample of the shipments fact otherwise
+SAMPLE = "fact_shipment_sample"
+
+# Bernoulli samples are seeded, so the same approximate query returns the same estimate (and caches)
+SAMPLE_SEED = 7
+
+# Day × lane × carrier summary holding mergeable t-digest states of transit hours and dwell minutes;
+# the percentile panels merge them when the filters stay within its grain
+DAILY = "fact_shipment_daily"
+
+# Percentiles of the percentile panels, as column suffixes (transit_hours_p50, ...)
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+def schema_map(database: str, schema: str, rows: List[tuple]) -> SchemaMap:
+    """Build a SchemaMap from (TABLE_NAME, COLUMN_NAME) rows of INFORMATION_SCHEMA.COLUMNS."""
+    by_table: dict[str, list[str]] = {}
+    for table, col in rows:
+        by_table.setdefault(table, []).append(col)
+    # Quoted-lowercase objects win over UPPERCASE twins: those are the empty placeholders
+    # described in snowflake/99_normalize_edw_names.sql, the data lives in the quoted ones.
+    tables: dict[str, str] = {}
+    for table in by_table:
+        if table.lower() not in tables or table != table.upper():
+            tables[table.lower()] = table
+    columns: dict[tuple[str, str], str] = {}
+    for logical, table in tables.items():
+        for col in by_table[table]:
+            if (logical, col.lower()) not in columns or col != col.upper():
+                columns[(logical, col.lower())] = col
+    return SchemaMap(database, schema, tables, columns)
+
+
+def build_schema_sql(database: str) -> str:
+    """(TABLE_NAME, COLUMN_NAME) of one schema, bound as the only param, for schema_map."""
+    return (
+        f"-- app:schema\n"
+        f"SELECT TABLE_NAME, COLUMN_NAME FROM {database}.INFORMATION_SCHEMA.COLUMNS "
+        f"WHERE TABLE_SCHEMA = ? ORDER BY TABLE_NAME, ORDINAL_POSITION"
+    )
+
+
+def canonical_schema_map(
+    database: str, schema: str, milestones: bool = False, sample: bool = False, daily: bool = False
+) -> SchemaMap:
+    """SchemaMap over canonical UPPERCASE names with the typed layer (CSV mode, offline benchmarks),
+    plus the optional milestone snapshot, stratified sample and daily summary that are present."""
+    return SchemaMap(database, schema, tables={
+        t: t.upper() for t in (
+            "dim_customer", "dim_carrier", "dim_equipment", "dim_lane", "dim_location",
+            "fact_shipment", "fact_event", "fact_shipment_typed", "fact_event_typed",
+            *([MILESTONES] if milestones else []),
+            *([SAMPLE] if sample else []),
+            *([DAILY] if daily else []),
+        )
+    })
+
+
+def _ts(ref: str, typed: bool) -> str:
+    """Timestamp expression: a plain column on the typed layer, parsed from VARCHAR otherwise."""
+    return ref if typed else f"TRY_TO_TIMESTAMP_TZ(NULLIF(TRIM({ref}), ''))"
+
+
+def _ts_present(ref: str, typed: bool) -> str:
+    """Predicate that a timestamp column holds a value (blank strings count as missing)."""
+    return f"{ref} IS NOT NULL" if typed else f"NULLIF(TRIM({ref}), '') IS NOT NULL"
+
+
+def _delivery_date(s: SchemaMap, alias: str = "f") -> str:
+    """Delivery date expression: the precomputed column on the typed layer."""
+    f = s.ref(s.shipments, alias)
+    if s.typed:
+        return f("delivery_date")
+    return f"CAST({_ts(f('delivery_actual_ts'), False)} AS DATE)"
+
+
+def _code_eq(s: SchemaMap, ref: Callable[[str], str], col: str, value: str) -> str:
+    """Predicate `col = 'value'` on an enumerated fact column.
+
+    In compact mode the fact holds `<col>_code`; the code is looked up once in its (tiny)
+    code dimension, so the fact side stays an integer comparison.
+    """
+    if not s.compact:
+        return f"{ref(col)} = '{value}'"
+    k = s.ref(CODE_DIMS[col])
+    return f"{ref(col + '_code')} = (SELECT {k(col + '_code')} FROM {s.t(CODE_DIMS[col])} WHERE {k(col)} = '{value}')"
+
+
+def query_name(sql: str) -> str:
+    """Return the `-- app:<name>` tag that every dashboard query starts with ("" if untagged)."""
+    head = sql.lstrip()
+    if head.startswith("-- app:"):
+        return head[len("-- app:"):].split(None, 1)[0]
+    return ""
+
+
+@dataclass(frozen=True)
+class Filters:
+    """Sidebar selection, resolved to IDs. Hashable so per-rerun work can be keyed on it."""
+
+    customer_ids: tuple[int, ...] = ()
+    carrier_ids: tuple[int, ...] = ()
+    equipment_ids: tuple[int, ...] = ()
+    lane_ids: tuple[int, ...] = ()
+    date_start: Optional[str] = None
+    date_end: Optional[str] = None
+
+    def id_terms(self) -> list[tuple[str, tuple[int, ...]]]:
+        return [
+            ("customer_id", self.customer_ids),
+            ("carrier_id", self.carrier_ids),
+            ("equipment_id", self.equipment_ids),
+            ("lane_id", self.lane_ids),
+        ]
+
+
+@dataclass(frozen=True)
+class DrillPage:
+    """Keyset page request for the drill grid: rows strictly after `after`, at most `size`."""
+
+    after: Optional[tuple[str, int]] = None
+    size: int = 1000
+
+    def params(self) -> tuple:
+        return () if self.after is None else (self.after[0], self.after[0], self.after[1])
+
+
+def filters_from_json(values: list) -> Filters:
+    """Inverse of astuple(Filters) after a JSON round trip (lists back to tuples)."""
+    return Filters(*(tuple(v) if isinstance(v, list) else v for v in values))
+
+
+def _filters_clause(
+    s: SchemaMap, flt: Filters, table: Optional[str] = None, day: str = "delivery_date"
+) -> tuple[str, list]:
+    """Build a SQL filters clause over fact IDs (alias `f`) plus its bind parameters.
+
+    IDs are resolved client-side from the cached dimension lists and bound as one JSON
+    array per filter, so the SQL text only depends on which filters are active (not on
+    which names were picked) and the warehouse result cache can be reused.
+    `table` renders the clause over another fact with the same filter columns (the milestone
+    snapshot) instead of the shipments fact, its date range on column `day`; params are the same.
+    """
+    f = s.ref(table or s.shipments, "f")
+    if not table:
+        day = _delivery_date(s)
+    elif day == "delivery_date":
+        day = f(day)
+    else:
+        day = f"CAST({f(day)} AS DATE)"
+    clauses = []
+    params: list = []
+    if flt.date_start:
+        clauses.append(f" AND {day} >= ? ")
+        params.append(flt.date_start)
+    if flt.date_end:
+        clauses.append(f" AND {day} <= ? ")
+        params.append(flt.date_end)
+    for col, ids in flt.id_terms():
+        if ids:
+            clauses.append(f" AND {f(col)} IN (SELECT VALUE::NUMBER FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?)))) ")
+            params.append(json.dumps(list(ids)))
+    return "".join(clauses), params
+
+
+# Query builders. Every identifier comes from the SchemaMap; `filters` is the clause from
+# _filters_clause over alias `f` (its params are bound once per occurrence of the clause).
+
+def build_diag_sql(s: SchemaMap) -> str:
+    f = s.ref(s.shipments, "f")
+    return f"""-- app:diag
+    SELECT
+      COUNT(*) AS total,
+      COUNT_IF({_ts_present(f('delivery_actual_ts'), s.typed)}) AS delivered,
+      MIN({_delivery_date(s)}) AS min_delivery_date,
+      MAX({_delivery_date(s)}) AS max_delivery_date
+    FROM {s.t(s.shipments)} f
+    """
+
+
+def build_dims_sql(s: SchemaMap) -> str:
+    """Every dimension name with its ID; searched server-side (name_search), never sent whole to the browser."""
+    c = s.ref("dim_customer")
+    cr = s.ref("dim_carrier")
+    eq = s.ref("dim_equipment")
+    ln = s.ref("dim_lane", "l")
+    o = s.ref("dim_location", "o")
+    d = s.ref("dim_location", "d")
+    return f"""-- app:dims
+    WITH c AS (
+        SELECT {c('customer_id')} AS id, {c('name')} AS name FROM {s.t('dim_customer')}
+    ), cr AS (
+        SELECT {cr('carrier_id')} AS id, {cr('name')} AS name FROM {s.t('dim_carrier')}
+    ), eq AS (
+        SELECT {eq('equipment_id')} AS id, {eq('type')} AS name FROM {s.t('dim_equipment')}
+    ), ln AS (
+        SELECT {ln('lane_id')} AS id, ({o('city')} || ' → ' || {d('city')}) AS label
+        FROM {s.t('dim_lane')} l
+        JOIN {s.t('dim_location')} o ON {ln('origin_loc_id')} = {o('loc_id')}
+        JOIN {s.t('dim_location')} d ON {ln('dest_loc_id')} = {d('loc_id')}
+    )
+    SELECT 'customer' AS "k", id AS "id", name AS "v" FROM c
+    UNION ALL SELECT 'carrier' AS "k", id AS "id", name AS "v" FROM cr
+    UNION ALL SELECT 'equipment' AS "k", id AS "id", name AS "v" FROM eq
+    UNION ALL SELECT 'lane' AS "k", id AS "id", label AS "v" FROM ln
+    """
+
+
+def build_anchor_sql(s: SchemaMap) -> str:
+    f = s.ref(s.shipments, "f")
+    return (
+        f"-- app:anchor\n"
+        f"SELECT MIN({_delivery_date(s)}) AS min_d, MAX({_delivery_date(s)}) AS max_d "
+        f"FROM {s.t(s.shipments)} f WHERE {_ts_present(f('delivery_actual_ts'), s.typed)}"
+    )
+
+
+def build_otd_sql(s: SchemaMap, grace: int, filters: str) -> str:
+    f = s.ref(s.shipments, "f")
+    return f"""-- app:otd
+    WITH params AS (SELECT {grace} AS grace),
+    delivered AS (
+      SELECT {_delivery_date(s)} AS d,
+             IFF({_ts(f('delivery_actual_ts'), s.typed)} <= DATEADD(minute, (SELECT grace FROM params), {_ts(f('delivery_plan_ts'), s.typed)}), 1, 0) AS is_otd
+      FROM {s.t(s.shipments)} f
+      WHERE {_ts_present(f('delivery_actual_ts'), s.typed)} {filters}
+    ), anchor AS (
+      SELECT MAX(d) AS anchor_date FROM delivered
+    ), win AS (
+      SELECT anchor_date,
+             DATEADD('day', -29, anchor_date) AS last30_start,
+             anchor_date AS last30_end,
+             DATEADD('day', -60, anchor_date) AS prev30_start,
+             DATEADD('day', -30, anchor_date) AS prev30_end
+      FROM anchor
+    ), last30 AS (
+      SELECT COUNT(*) AS n_deliv, SUM(is_otd) AS n_otd FROM delivered, win
+      WHERE delivered.d BETWEEN win.last30_start AND win.last30_end
+    ), prev30 AS (
+      SELECT COUNT(*) AS n_deliv, SUM(is_otd) AS n_otd FROM delivered, win
+      WHERE delivered.d BETWEEN win.prev30_start AND win.prev30_end
+    )
+    SELECT
+      (last30.n_otd::FLOAT / NULLIF(last30.n_deliv,0)) AS otd_last_30,
+      (prev30.n_otd::FLOAT / NULLIF(prev30.n_deliv,0)) AS otd_prior_30
+    FROM last30, prev30
+    """
+
+
+def build_gmm_sql(s: SchemaMap, filters: str) -> str:
+    """GM/mile YTD; `filters` appears twice, so bind its params twice."""
+    f = s.ref(s.shipments, "f")
+    return f"""-- app:gmm
+    WITH anchor AS (
+      SELECT MAX({_delivery_date(s)}) AS anchor_date
+      FROM {s.t(s.shipments)} f
+      WHERE {_ts_present(f('delivery_actual_ts'), s.typed)} {filters}
+    ), ytd AS (
+      SELECT SUM({f('revenue')}) AS rev, SUM({f('total_cost')}) AS cost, SUM({f('planned_miles')}) AS miles
+      FROM {s.t(s.shipments)} f, anchor
+      WHERE {_ts_present(f('delivery_actual_ts'), s.typed)} {filters}
+        AND {_delivery_date(s)} BETWEEN DATE_TRUNC('year', anchor.anchor_date) AND anchor.anchor_date
+    )
+    SELECT (rev - cost) / NULLIF(miles, 0) AS gm_per_mile FROM ytd
+    """
+
+
+def build_tender_sql(s: SchemaMap, filters: str = "") -> str:
+    """Tender acceptance. From the milestone snapshot (with avg dwell) when present: one filtered
+    scan, `filters` over it by tender date (_tender_filters). Otherwise distinct shipments per
+    event type, unfiltered."""
+    if s.milestones:
+        m = s.ref(MILESTONES, "f")
+        return f"""-- app:tender
+    SELECT COUNT({m('accepted_ts')})::FLOAT / NULLIF(COUNT({m('tendered_ts')}), 0) AS tender_acceptance_events,
+           AVG({m('dwell_minutes')}) AS avg_dwell_minutes
+    FROM {s.t(MILESTONES)} f
+    WHERE 1=1 {filters}
+    """
+    e = s.ref(s.events)
+    return f"""-- app:tender
+    WITH tendered AS (
+      SELECT DISTINCT {e(s.key)}
+      FROM {s.t(s.events)}
+      WHERE {_code_eq(s, e, 'event_type', 'Tendered')}
+    ), accepted AS (
+      SELECT DISTINCT {e(s.key)}
+      FROM {s.t(s.events)}
+      WHERE {_code_eq(s, e, 'event_type', 'Accepted')}
+    )
+    SELECT (SELECT COUNT(*) FROM accepted)::FLOAT / NULLIF((SELECT COUNT(*) FROM tendered), 0) AS tender_acceptance_events
+    """
+
+
+def build_transit_sql(s: SchemaMap, filters: str) -> str:
+    f = s.ref(s.shipments, "f")
+    return f"""-- app:transit
+    SELECT AVG(DATEDIFF('day', {_ts(f('pickup_actual_ts'), s.typed)}, {_ts(f('delivery_actual_ts'), s.typed)})) AS avg_transit_days
+    FROM {s.t(s.shipments)} f
+    WHERE {_ts_present(f('pickup_actual_ts'), s.typed)} AND {_ts_present(f('delivery_actual_ts'), s.typed)} {filters}
+    """
+
+
+def build_lane_sql(s: SchemaMap, grace: int, filters: str) -> str:
+    f = s.ref(s.shipments, "f")
+    ln = s.ref("dim_lane", "l")
+    o = s.ref("dim_location", "o")
+    d = s.ref("dim_location", "d")
+    pickup, delivery, plan = (_ts(f(c), s.typed) for c in ("pickup_actual_ts", "delivery_actual_ts", "delivery_plan_ts"))
+    return f"""-- app:lane
+    WITH params AS (SELECT {grace} AS grace)
+    SELECT
+      {o('city')} || ' → ' || {d('city')} AS lane,
+      COUNT(*) AS shipments,
+      AVG(DATEDIFF('day', {pickup}, {delivery})) AS avg_transit_days,
+      AVG(IFF({delivery} IS NOT NULL AND {delivery} <= DATEADD(minute, (SELECT grace FROM params), {plan}), 1, 0)) AS otd_rate
+    FROM {s.t(s.shipments)} f
+    JOIN {s.t('dim_lane')} l ON {f('lane_id')} = {ln('lane_id')}
+    JOIN {s.t('dim_location')} o ON {ln('origin_loc_id')} = {o('loc_id')}
+    JOIN {s.t('dim_location')} d ON {ln('dest_loc_id')} = {d('loc_id')}
+    WHERE {_ts_present(f('pickup_actual_ts'), s.typed)} AND {_ts_present(f('delivery_actual_ts'), s.typed)} {filters}
+    GROUP BY 1
+    ORDER BY shipments DESC
+    LIMIT 50
+    """
+
+
+def build_exceptions_sql(s: SchemaMap, filters: str) -> str:
+    """Exceptions by customer and type: one count per Exception event, by its notes, joined to the
+    shipments for the customer and `filters`. Always from the events, since a shipment's exceptions
+    can be of several types."""
+    f = s.ref(s.shipments, "f")
+    e = s.ref(s.events, "e")
+    c = s.ref("dim_customer", "c")
+    return f"""-- app:exceptions
+    WITH ex AS (
+      SELECT {e(s.key)} AS k, COALESCE(NULLIF(TRIM({e('notes')}), ''), 'Unknown') AS exception_type
+      FROM {s.t(s.events)} e
+      WHERE {_code_eq(s, e, 'event_type', 'Exception')}
+    )
+    SELECT {c('name')} AS customer_name, ex.exception_type, COUNT(*) AS exceptions
+    FROM ex
+    JOIN {s.t(s.shipments)} f ON {f(s.key)} = ex.k
+    JOIN {s.t('dim_customer')} c ON {c('customer_id')} = {f('customer_id')}
+    WHERE 1=1 {filters}
+    GROUP BY 1,2
+    """
+
+
+def _bernoulli(pct: float) -> str:
+    """Seeded row-level sample clause for a fact alias: each row is kept with probability pct/100."""
+    return f"SAMPLE BERNOULLI ({pct:g}) SEED ({SAMPLE_SEED})"
+
+
+def build_lane_approx_sql(s: SchemaMap, grace: int, filters: str, pct: float) -> str:
+    """Lane panel estimated from a sample, with 95% half-widths on avg transit days and OTD %.
+
+    Reads the stratified sample when present (`filters` rendered over it with table=SAMPLE), each
+    row weighted by its stratum's inverse sampling rate; otherwise a `pct`% Bernoulli sample of
+    the shipments fact, every row weighted 100/pct. Half-widths use the normal approximation over
+    the effective sample size SUM(w)^2 / SUM(w^2) (the sampled row count when weights are equal)
+    and are NULL for lanes with a single sampled row.
+    """
+    if s.sample:
+        f = s.ref(SAMPLE, "f")
+        src, typed, w = f"{s.t(SAMPLE)} f", True, f("sample_weight")
+    else:
+        f = s.ref(s.shipments, "f")
+        src, typed, w = f"{s.t(s.shipments)} f {_bernoulli(pct)}", s.typed, f"{100 / pct:g}"
+    ln = s.ref("dim_lane", "l")
+    o = s.ref("dim_location", "o")
+    d = s.ref("dim_location", "d")
+    pickup, delivery, plan = (_ts(f(c), typed) for c in ("pickup_actual_ts", "delivery_actual_ts", "delivery_plan_ts"))
+    return f"""-- app:lane_approx
+    WITH params AS (SELECT {grace} AS grace),
+    sampled AS (
+      SELECT {f('lane_id')} AS lane_id, {w} AS w,
+             DATEDIFF('day', {pickup}, {delivery}) AS td,
+             IFF({delivery} <= DATEADD(minute, (SELECT grace FROM params), {plan}), 1, 0) AS is_otd
+      FROM {src}
+      WHERE {_ts_present(f('pickup_actual_ts'), typed)} AND {_ts_present(f('delivery_actual_ts'), typed)} {filters}
+    ), est AS (
+      SELECT lane_id, COUNT(*) AS n, SUM(w) AS sw, SUM(w * w) AS sw2,
+             SUM(w * td) / SUM(w) AS transit, SUM(w * td * td) / SUM(w) AS transit_sq,
+             SUM(w * is_otd) / SUM(w) AS otd
+      FROM sampled
+      GROUP BY lane_id
+    )
+    SELECT
+      {o('city')} || ' → ' || {d('city')} AS lane,
+      ROUND(e.sw) AS shipments,
+      e.transit AS avg_transit_days,
+      e.otd AS otd_rate,
+      IFF(e.n > 1, 1.96 * SQRT(GREATEST(e.transit_sq - e.transit * e.transit, 0) * e.sw2 / (e.sw * e.sw)), NULL) AS avg_transit_days_ci,
+      IFF(e.n > 1, 1.96 * SQRT(e.otd * (1 - e.otd) * e.sw2 / (e.sw * e.sw)), NULL) AS otd_rate_ci,
+      e.n AS sample_rows
+    FROM est e
+    JOIN {s.t('dim_lane')} l ON e.lane_id = {ln('lane_id')}
+    JOIN {s.t('dim_location')} o ON {ln('origin_loc_id')} = {o('loc_id')}
+    JOIN {s.t('dim_location')} d ON {ln('dest_loc_id')} = {d('loc_id')}
+    ORDER BY shipments DESC
+    LIMIT 50
+    """
+
+
+def build_exceptions_approx_sql(s: SchemaMap, filters: str, pct: float) -> str:
+    """Exception heatmap estimated from a `pct`% Bernoulli sample of the events, counts scaled by
+    100/pct; `sample_rows` is each cell's sampled row count."""
+    f = s.ref(s.shipments, "f")
+    e = s.ref(s.events, "e")
+    c = s.ref("dim_customer", "c")
+    return f"""-- app:exceptions_approx
+    WITH ex AS (
+      SELECT {e(s.key)} AS k, COALESCE(NULLIF(TRIM({e('notes')}), ''), 'Unknown') AS exception_type
+      FROM {s.t(s.events)} e {_bernoulli(pct)}
+      WHERE {_code_eq(s, e, 'event_type', 'Exception')}
+    )
+    SELECT {c('name')} AS customer_name, ex.exception_type, ROUND(COUNT(*) * {100 / pct:g}) AS exceptions,
+           COUNT(*) AS sample_rows
+    FROM ex
+    JOIN {s.t(s.shipments)} f ON {f(s.key)} = ex.k
+    JOIN {s.t('dim_customer')} c ON {c('customer_id')} = {f('customer_id')}
+    WHERE 1=1 {filters}
+    GROUP BY 1,2
+    """
+
+
+def _daily_covers(s: SchemaMap, flt: Filters) -> bool:
+    """Whether the daily summary can answer `flt`: it has no customer or equipment column."""
+    return s.daily and not flt.customer_ids and not flt.equipment_ids
+
+
+def _estimates(state: str, metric: str) -> str:
+    """Percentile columns `<metric>_p50, ...` estimated from one merged sketch state."""
+    return ", ".join(f"APPROX_PERCENTILE_ESTIMATE({state}, {q}) AS {metric}_{p}" for p, q in PERCENTILES.items())
+
+
+def _approx_percentiles(expr: str, metric: str) -> str:
+    """Percentile columns `<metric>_p50, ...` of `expr`, each a one-pass t-digest (no sort)."""
+    return ", ".join(f"APPROX_PERCENTILE({expr}, {q}) AS {metric}_{p}" for p, q in PERCENTILES.items())
+
+
+def _transit_hours(s: SchemaMap, f: Callable[[str], str]) -> str:
+    return f"DATEDIFF('minute', {_ts(f('pickup_actual_ts'), s.typed)}, {_ts(f('delivery_actual_ts'), s.typed)}) / 60"
+
+
+def build_pct_sql(s: SchemaMap, filters: str, mfilters: str = "", daily: bool = False) -> str:
+    """p50/p90/p99 of transit hours per leg and dwell minutes per shipment (where it dwelled).
+
+    With `daily`, one pass over the day × lane × carrier summary merging its sketches, `filters`
+    over it. Otherwise APPROX_PERCENTILE over the filtered shipments fact and, for dwell, over the
+    milestone snapshot with `mfilters` (NULL dwell without it); bind the params of both.
+    """
+    if daily:
+        g = s.ref(DAILY, "f")
+        return f"""-- app:pct
+    WITH merged AS (
+      SELECT APPROX_PERCENTILE_COMBINE({g('transit_hours_sketch')}) AS transit,
+             APPROX_PERCENTILE_COMBINE({g('dwell_minutes_sketch')}) AS dwell
+      FROM {s.t(DAILY)} f
+      WHERE 1=1 {filters}
+    )
+    SELECT {_estimates('transit', 'transit_hours')}, {_estimates('dwell', 'dwell_minutes')}
+    FROM merged
+    """
+    f = s.ref(s.shipments, "f")
+    if s.milestones:
+        m = s.ref(MILESTONES, "f")
+        dwell = f"""SELECT {_approx_percentiles(m('dwell_minutes'), 'dwell_minutes')}
+      FROM {s.t(MILESTONES)} f
+      WHERE {m('dwell_minutes')} IS NOT NULL {mfilters}"""
+    else:
+        dwell = "SELECT " + ", ".join(f"NULL AS dwell_minutes_{p}" for p in PERCENTILES)
+    return f"""-- app:pct
+    WITH transit AS (
+      SELECT {_approx_percentiles(_transit_hours(s, f), 'transit_hours')}
+      FROM {s.t(s.shipments)} f
+      WHERE {_ts_present(f('pickup_actual_ts'), s.typed)} AND {_ts_present(f('delivery_actual_ts'), s.typed)} {filters}
+    ), dwell AS (
+      {dwell}
+    )
+    SELECT * FROM transit, dwell
+    """
+
+
+def build_lane_pct_sql(s: SchemaMap, filters: str, daily: bool = False) -> str:
+    """Top 50 lanes by delivered legs with p50/p90/p99 transit hours: merged per lane from the
+    daily summary with `daily` (`filters` over it), else APPROX_PERCENTILE over the filtered fact."""
+    ln = s.ref("dim_lane", "l")
+    o = s.ref("dim_location", "o")
+    d = s.ref("dim_location", "d")
+    if daily:
+        g = s.ref(DAILY, "f")
+        est = f"""SELECT lane_id, legs, {_estimates('transit', 'transit_hours')}
+      FROM (
+        SELECT {g('lane_id')} AS lane_id, SUM({g('legs')}) AS legs,
+               APPROX_PERCENTILE_COMBINE({g('transit_hours_sketch')}) AS transit
+        FROM {s.t(DAILY)} f
+        WHERE {g('legs')} > 0 {filters}
+        GROUP BY 1
+      )"""
+    else:
+        f = s.ref(s.shipments, "f")
+        est = f"""SELECT {f('lane_id')} AS lane_id, COUNT(*) AS legs, {_approx_percentiles(_transit_hours(s, f), 'transit_hours')}
+      FROM {s.t(s.shipments)} f
+      WHERE {_ts_present(f('pickup_actual_ts'), s.typed)} AND {_ts_present(f('delivery_actual_ts'), s.typed)} {filters}
+      GROUP BY 1"""
+    cols = ", ".join(f"e.transit_hours_{p}" for p in PERCENTILES)
+    return f"""-- app:lane_pct
+    WITH est AS (
+      {est}
+    )
+    SELECT {o('city')} || ' → ' || {d('city')} AS lane, e.legs AS shipments, {cols}
+    FROM est e
+    JOIN {s.t('dim_lane')} l ON e.lane_id = {ln('lane_id')}
+    JOIN {s.t('dim_location')} o ON {ln('origin_loc_id')} = {o('loc_id')}
+    JOIN {s.t('dim_location')} d ON {ln('dest_loc_id')} = {d('loc_id')}
+    ORDER BY shipments DESC
+    LIMIT 50
+    """
+
+
+def build_drill_count_sql(s: SchemaMap, filters: str) -> str:
+    """Exact filtered row count of the fact for the drill pager. It skips the drill's dimension
+    joins, so it can exceed the drill's rows only when a leg has no matching dimension row
+    (hence the pager's ≈)."""
+    return f"""-- app:drill_count
+    SELECT COUNT(*) AS n FROM {s.t(s.shipments)} f WHERE 1=1 {filters}
+    """
+
+
+def build_drill_sql(
+    s: SchemaMap, grace: int, filters: str, after: bool = False, limit: Optional[int] = 1000
+) -> str:
+    """One drill page in (shipment_id, leg_id) order.
+
+    With `after`, the page starts past a keyset cursor bound as three extra params after the
+    filter params: (shipment_id, shipment_id, leg_id) of the previous page's last row.
+    With `limit=None`, the whole filtered set (tagged drill_export, for streaming export).
+    In compact mode the string ID and status are joined back from their dimensions, and pages
+    still follow shipment_id so the cursor means the same thing in both modes.
+    """
+    f = s.ref(s.shipments, "f")
+    k = s.ref("dim_shipment", "k")
+    sc = s.ref("dim_status", "sc")
+    sid, status = (k("shipment_id"), sc("status")) if s.compact else (f("shipment_id"), f("status"))
+    c = s.ref("dim_customer", "c")
+    cr = s.ref("dim_carrier", "cr")
+    ln = s.ref("dim_lane", "l")
+    o = s.ref("dim_location", "o")
+    d = s.ref("dim_location", "d")
+    delivery, plan = _ts(f("delivery_actual_ts"), s.typed), _ts(f("delivery_plan_ts"), s.typed)
+    on_time = f"IFF({delivery} IS NOT NULL AND {delivery} <= DATEADD(minute, {grace}, {plan}), TRUE, FALSE)"
+    keyset = (
+        f" AND ({sid} > ? OR ({sid} = ? AND {f('leg_id')} > ?)) " if after else ""
+    )
+    decode = (
+        f"""JOIN {s.t('dim_shipment')} k ON {k('shipment_key')} = {f('shipment_key')}
+    LEFT JOIN {s.t('dim_status')} sc ON {sc('status_code')} = {f('status_code')}
+    """
+        if s.compact
+        else ""
+    )
+    tag = "drill" if limit is not None else "drill_export"
+    return f"""-- app:{tag}
+    SELECT
+      {sid} AS shipment_id, {f('leg_id')} AS leg_id,
+      {c('name')} AS customer_name,
+      {cr('name')} AS carrier_name,
+      {o('city')} || ' → ' || {d('city')} AS lane,
+      {status} AS status,
+      {_ts(f('pickup_plan_ts'), s.typed)} AS pickup_plan_ts,
+      {_ts(f('pickup_actual_ts'), s.typed)} AS pickup_actual_ts,
+      {plan} AS delivery_plan_ts,
+      {delivery} AS delivery_actual_ts,
+      {on_time} AS isdeliveredontime,
+      {f('isinfull')} AS isinfull,
+      ({on_time} AND {f('isinfull')}) AS isotif,
+      {f('planned_miles')} AS planned_miles, {f('actual_miles')} AS actual_miles,
+      {f('revenue')} AS revenue, {f('total_cost')} AS total_cost,
+      ({f('revenue')} - {f('total_cost')}) / NULLIF({f('planned_miles')}, 0) AS gm_per_mile
+    FROM {s.t(s.shipments)} f
+    JOIN {s.t('dim_customer')} c ON {c('customer_id')} = {f('customer_id')}
+    JOIN {s.t('dim_carrier')} cr ON {cr('carrier_id')} = {f('carrier_id')}
+    JOIN {s.t('dim_lane')} l ON {ln('lane_id')} = {f('lane_id')}
+    JOIN {s.t('dim_location')} o ON {o('loc_id')} = {ln('origin_loc_id')}
+    JOIN {s.t('dim_location')} d ON {d('loc_id')} = {ln('dest_loc_id')}
+    {decode}WHERE 1=1 {filters}{keyset}
+    ORDER BY {sid}, {f('leg_id')}
+    {f"LIMIT {int(limit)}" if limit is not None else ""}
+    """
+
+
+def _tender_filters(s: SchemaMap, flt: Filters) -> tuple[str, list]:
+    """Filter clause of tender acceptance.
+
+    Over the milestone snapshot when present, with the date range on the tender date, since a
+    shipment that is never accepted never gets a delivery date. Unfiltered without the snapshot.
+    """
+    if not s.milestones:
+        return "", []
+    return _filters_clause(s, flt, MILESTONES, "tendered_ts")
+
+
+DEFAULT_GRACE = 60  # grace slider default; part of the default view the warm-up prefetches
+DEFAULT_SAMPLE_PCT = 1.0  # percent of rows the approximate panels read (APPROX_SAMPLE_PCT in the app)
+
+
+@dataclass(frozen=True)
+class View:
+    """The inputs a dashboard query can read: grace minutes, applied filters and drill page,
+    plus the sampling percentage of the approximate panels (a process setting, not a panel input)."""
+
+    grace: int = DEFAULT_GRACE
+    filters: Filters = Filters()
+    page: DrillPage = DrillPage(None, 500)
+    sample_pct: float = DEFAULT_SAMPLE_PCT
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    """One named dashboard query.
+
+    `inputs` are the View fields it reads, by the names the app's panel memo uses ("grace",
+    "filters", "cursor"); None for queries that are not panels. `render` returns (sql, params).
+    """
+
+    name: str
+    inputs: Optional[tuple[str, ...]]
+    render: Callable[[SchemaMap, View], tuple[str, tuple]]
+    doc: str = ""
+
+
+def _filtered(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    filters, fparams = _filters_clause(s, v.filters)
+    return filters, tuple(fparams)
+
+
+def _render_tender(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    tfilters, tparams = _tender_filters(s, v.filters)
+    return build_tender_sql(s, tfilters), tuple(tparams)
+
+
+def _render_exceptions(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    filters, fparams = _filtered(s, v)
+    return build_exceptions_sql(s, filters), fparams
+
+
+def _render_lane_approx(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    # The stratified sample carries the shipments' filter columns and delivery_date
+    filters, fparams = _filters_clause(s, v.filters, SAMPLE if s.sample else None)
+    return build_lane_approx_sql(s, v.grace, filters, v.sample_pct), tuple(fparams)
+
+
+def _render_exceptions_approx(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    filters, fparams = _filtered(s, v)
+    return build_exceptions_approx_sql(s, filters, v.sample_pct), fparams
+
+
+def _render_pct(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    if _daily_covers(s, v.filters):
+        filters, fparams = _filters_clause(s, v.filters, DAILY)
+        return build_pct_sql(s, filters, daily=True), tuple(fparams)
+    filters, fparams = _filters_clause(s, v.filters)
+    mfilters, mparams = _filters_clause(s, v.filters, MILESTONES) if s.milestones else ("", [])
+    return build_pct_sql(s, filters, mfilters), tuple(fparams + mparams)
+
+
+def _render_lane_pct(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    daily = _daily_covers(s, v.filters)
+    filters, fparams = _filters_clause(s, v.filters, DAILY if daily else None)
+    return build_lane_pct_sql(s, filters, daily), tuple(fparams)
+
+
+def _render_drill(s: SchemaMap, v: View) -> tuple[str, tuple]:
+    filters, p = _filtered(s, v)
+    return build_drill_sql(s, v.grace, filters, after=v.page.after is not None, limit=v.page.size), p + v.page.params()
+
+
+_QUERIES = [
+    CatalogQuery("diag", (), lambda s, v: (build_diag_sql(s), ()), "Row counts and delivery-date span"),
+    CatalogQuery("dims", (), lambda s, v: (build_dims_sql(s), ()), "Dimension names and IDs for the filters"),
+    CatalogQuery("anchor", (), lambda s, v: (build_anchor_sql(s), ()), "Delivery-date range"),
+    CatalogQuery(
+        "otd", ("grace", "filters"),
+        lambda s, v: (build_otd_sql(s, v.grace, _filtered(s, v)[0]), _filtered(s, v)[1]),
+        "OTD % last 30 vs prior 30 days",
+    ),
+    CatalogQuery(
+        "gmm", ("filters",),
+        lambda s, v: (build_gmm_sql(s, _filtered(s, v)[0]), _filtered(s, v)[1] * 2),
+        "GM/mile year to date",
+    ),
+    CatalogQuery("tender", ("filters",), _render_tender, "Tender acceptance (and dwell from the milestones)"),
+    CatalogQuery(
+        "transit", ("filters",),
+        lambda s, v: (build_transit_sql(s, _filtered(s, v)[0]), _filtered(s, v)[1]),
+        "Average transit days",
+    ),
+    CatalogQuery(
+        "lane", ("grace", "filters"),
+        lambda s, v: (build_lane_sql(s, v.grace, _filtered(s, v)[0]), _filtered(s, v)[1]),
+        "Top 50 lanes: shipments, transit days, OTD",
+    ),
+    CatalogQuery("exceptions", ("filters",), _render_exceptions, "Exceptions by customer and type"),
+    CatalogQuery("pct", ("filters",), _render_pct, "p50/p90/p99 transit hours and dwell minutes"),
+    CatalogQuery("lane_pct", ("filters",), _render_lane_pct, "Top 50 lanes: p50/p90/p99 transit hours"),
+    CatalogQuery(
+        "lane_approx", ("grace", "filters"), _render_lane_approx,
+        "Lane panel from a sample, with 95% intervals on transit days and OTD",
+    ),
+    CatalogQuery("exceptions_approx", ("filters",), _render_exceptions_approx, "Exception heatmap from a sample"),
+    CatalogQuery("drill", ("grace", "filters", "cursor"), _render_drill, "One keyset page of shipment legs"),
+    CatalogQuery(
+        "drill_count", ("filters",),
+        lambda s, v: (build_drill_count_sql(s, _filtered(s, v)[0]), _filtered(s, v)[1]),
+        "Filtered leg count for the pager",
+    ),
+    CatalogQuery(
+        "drill_export", None,
+        lambda s, v: (build_drill_sql(s, v.grace, _filtered(s, v)[0], limit=None), _filtered(s, v)[1]),
+        "Every filtered leg, for the streaming export",
+    ),
+]
+CATALOG: dict[str, CatalogQuery] = {q.name: q for q in _QUERIES}
+
+# Inputs each panel query reads, by query tag. A panel is re-queried only when one of these
+# (or the data version) changes; otherwise the session's last result is rendered again.
+# gm_target is display-only and the lane slider lives in its own fragment, so neither is listed.
+PANEL_INPUTS: dict[str, tuple[str, ...]] = {q.name: q.inputs for q in _QUERIES if q.inputs is not None}
+
+# The panels of one view after dims and anchor, in the order the app renders them
+VIEW_PANELS = ("otd", "gmm", "tender", "transit", "pct", "lane", "exceptions", "drill", "drill_count")
+
+# Panels the app queries only when the user asks for them (the lane chart's percentile view)
+ON_DEMAND_PANELS = ("lane_pct",)
+
+# Panels with a sampled variant: in approximate mode a cold view renders these first and the
+# exact query refines them in the background
+APPROX_PANELS = {"lane": "lane_approx", "exceptions": "exceptions_approx"}
+
+
+def render(name: str, s: SchemaMap, view: View = View()) -> tuple[str, tuple]:
+    """(sql, params) of catalog query `name` for `view`, exactly as the app issues it."""
+    return CATALOG[name].render(s, view)
+
+
+def build_view_queries(s: SchemaMap, grace: int, flt: Filters, page_size: int) -> list[tuple[str, tuple]]:
+    """(sql, params) of every panel query of one view (first drill page), in VIEW_PANELS order."""
+    view = View(grace, flt, DrillPage(None, page_size))
+    return [render(name, s, view) for name in VIEW_PANELS]
@@ -0,0 +1,170 @@
+"""
+Cancellable query handles for the dashboard.
+
+- A handle wraps one submitted query: Snowpark async jobs (`collect_nowait`) are cancelled on
+  the warehouse; the local engine and older Snowpark versions run on a worker thread whose
+  result is discarded when cancelled (pandas work cannot be interrupted mid-operation)
+- `Inflight` tracks a browser session's running queries, so whatever a superseded run left
+  behind can be cancelled when the next run starts
+- `wait` polls a handle in short slices and calls back between them; the app uses the
+  callback to give Streamlit a chance to stop the run and to enforce per-panel time budgets
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from time import monotonic
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+POLL_S = 0.25  # between status checks of a running query
+
+
+class QueryCancelled(RuntimeError):
+    """The query was cancelled before it produced a result."""
+
+
+class QueryHandle(ABC):
+    """One submitted query; `result` blocks until it finishes."""
+
+    query_id: Optional[str] = None
+
+    @abstractmethod
+    def done(self) -> bool:
+        ...
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds; True once the query has finished."""
+        deadline = monotonic() + timeout
+        while not self.done():
+            if monotonic() >= deadline:
+                return False
+            time.sleep(min(POLL_S, max(deadline - monotonic(), 0.0)))
+        return True
+
+    @abstractmethod
+    def result(self) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def cancel(self) -> None:
+        ...
+
+
+class ThreadHandle(QueryHandle):
+    """Runs `fn` (returning a frame, or (frame, query_id)) on a daemon thread."""
+
+    def __init__(self, fn: Callable[[], Any], name: str = "query"):
+        self._done = threading.Event()
+        self._cancelled = False
+        self._value: Any = None
+        self._error: Optional[BaseException] = None
+        threading.Thread(target=self._run, args=(fn,), daemon=True, name=name).start()
+
+    def _run(self, fn: Callable[[], Any]) -> None:
+        try:
+            self._value = fn()
+        except BaseException as e:  # handed to the waiter
+            self._error = e
+        finally:
+            self._done.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._done.wait(timeout)
+
+    def result(self) -> pd.DataFrame:
+        self._done.wait()
+        if self._cancelled:
+            raise QueryCancelled("query cancelled")
+        if self._error is not None:
+            raise self._error
+        if isinstance(self._value, tuple):
+            df, self.query_id = self._value
+            return df
+        return self._value
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+
+class AsyncJobHandle(QueryHandle):
+    """A Snowpark AsyncJob; `fetch(job)` turns the finished job into a frame."""
+
+    def __init__(self, job: Any, fetch: Callable[[Any], pd.DataFrame]):
+        self.job = job
+        self.fetch = fetch
+        self.query_id = getattr(job, "query_id", None)
+        self._cancelled = False
+
+    def done(self) -> bool:
+        return self._cancelled or bool(self.job.is_done())
+
+    def result(self) -> pd.DataFrame:
+        while not self.done():
+            time.sleep(POLL_S)
+        if self._cancelled:
+            raise QueryCancelled(f"query {self.query_id} cancelled")
+        return self.fetch(self.job)
+
+    def cancel(self) -> None:
+        if self._cancelled:
+            return
+        self._cancelled = True
+        try:
+            self.job.cancel()
+        except Exception:
+            pass  # already finished, or the session is gone
+
+
+class Inflight:
+    """Queries submitted by one browser session and not yet finished."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles: Dict[int, QueryHandle] = {}
+        self.cancelled = 0  # total cancelled for this session, for the perf panel
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def track(self, handle: QueryHandle) -> None:
+        with self._lock:
+            self._handles[id(handle)] = handle
+
+    def untrack(self, handle: QueryHandle) -> None:
+        with self._lock:
+            self._handles.pop(id(handle), None)
+
+    def cancel(self, handle: QueryHandle) -> None:
+        self.untrack(handle)
+        handle.cancel()
+        self.cancelled += 1
+
+    def cancel_all(self) -> int:
+        """Cancel everything still tracked; return how many were cancelled."""
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for h in handles:
+            h.cancel()
+        self.cancelled += len(handles)
+        return len(handles)
+
+
+def wait(handle: QueryHandle, tick: Callable[[float], bool]) -> bool:
+    """Wait for `handle`, calling `tick(elapsed_s)` every POLL_S while it runs.
+
+    `tick` may raise (the app lets Streamlit's stop/rerun exception through) or return False
+    to stop waiting. Returns True once the query has finished, False if `tick` gave up.
+    """
+    t0 = monotonic()
+    while not handle.wait(POLL_S):
+        if not tick(monotonic() - t0):
+            return False
+    return True
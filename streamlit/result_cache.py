@@ -0,0 +1,172 @@
+"""
+Shared on-disk result cache for dashboard queries.
+
+- One Parquet file per result, keyed on normalized SQL + bind params + a data-version token
+- SQLite index (WAL) tracks size and last access; least recently used files are evicted
+  once the cache exceeds its byte budget
+- Safe to share between Streamlit sessions, processes and restarts on one host
+  (or on a shared volume); a new data version simply produces new keys
+- A small in-process LRU of recently used frames sits in front of the files
+- The latest key written for each query (ignoring the data version) is remembered in process,
+  so an overloaded app can serve the last known result instead of queueing another query
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace per line and drop blank lines so formatting never splits a key."""
+    return "\n".join(" ".join(line.split()) for line in sql.splitlines() if line.strip())
+
+
+class ResultCache:
+    """Size-bounded LRU cache of DataFrames stored as Parquet under `root`.
+
+    Every failure (unwritable directory, locked index, unserializable frame) degrades to a
+    cache miss; the dashboard never fails because of the cache. Frames returned from the
+    memory tier are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, root: str, max_bytes: int, memory_entries: int = 256):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory: OrderedDict[str, pd.DataFrame] = OrderedDict()
+        self._latest: OrderedDict[str, str] = OrderedDict()  # base key -> latest versioned key
+        self._lock = threading.Lock()
+        self.index = os.path.join(root, "index.sqlite")
+        try:
+            os.makedirs(root, exist_ok=True)
+            with closing(self._connect()) as con, con:
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    " key TEXT PRIMARY KEY, bytes INTEGER NOT NULL, rows INTEGER NOT NULL,"
+                    " created REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+            self.enabled = True
+        except (OSError, sqlite3.Error):
+            self.enabled = False
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index, timeout=5)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.parquet")
+
+    @staticmethod
+    def key(sql: str, params: tuple, version: str) -> str:
+        payload = json.dumps([normalize_sql(sql), list(params), version], default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def base_key(sql: str, params: tuple) -> str:
+        """Version-independent key of a query, for `latest`."""
+        return ResultCache.key(sql, params, "")
+
+    def latest(self, base: str) -> Optional[pd.DataFrame]:
+        """Most recent cached result of a query under any data version (possibly stale)."""
+        with self._lock:
+            key = self._latest.get(base)
+        return None if key is None else self.get(key)[0]
+
+    def get(self, key: str) -> Tuple[Optional[pd.DataFrame], str]:
+        """Return (frame, tier) with tier memory/disk, or (None, "miss")."""
+        with self._lock:
+            df = self._memory.get(key)
+            if df is not None:
+                self._memory.move_to_end(key)
+                return df, "memory"
+        df = self._read(key)
+        if df is None:
+            return None, "miss"
+        self._remember(key, df)
+        return df, "disk"
+
+    def _remember(self, key: str, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._memory[key] = df
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[pd.DataFrame]:
+        if not self.enabled:
+            return None
+        try:
+            with closing(self._connect()) as con, con:
+                hit = con.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+                if hit is None:
+                    return None
+                try:
+                    df = pq.read_table(self._path(key)).to_pandas()
+                except (OSError, pa.ArrowException):
+                    # File evicted by another process or half-written by a crashed one
+                    con.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    return None
+                con.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                return df
+        except sqlite3.Error:
+            return None
+
+    def put(self, key: str, df: pd.DataFrame, base: Optional[str] = None) -> None:
+        self._remember(key, df)
+        if base is not None:
+            with self._lock:
+                self._latest[base] = key
+                self._latest.move_to_end(base)
+                while len(self._latest) > 16 * self.memory_entries:
+                    self._latest.popitem(last=False)
+        if not self.enabled:
+            return
+        path = self._path(key)
+        tmp = None
+        try:
+            # Unique per writer: sessions are threads of one process and may store the same key at once
+            fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f"{key}.", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pq.write_table(pa.Table.from_pandas(df, preserve_index=False), f)
+            os.replace(tmp, path)
+            now = time.time()
+            with closing(self._connect()) as con, con:
+                con.execute(
+                    "INSERT OR REPLACE INTO entries (key, bytes, rows, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, os.path.getsize(path), len(df), now, now),
+                )
+                self._evict(con)
+        except (OSError, sqlite3.Error, pa.ArrowException, TypeError, ValueError):
+            if tmp is None:
+                return
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _evict(self, con: sqlite3.Connection) -> None:
+        (total,) = con.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in con.execute("SELECT key, bytes FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            con.execute("DELETE FROM entries WHERE key = ?", (key,))
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,125 @@
+"""
+Bounded pool of warehouse sessions shared by every viewer of the app.
+
+- At most `size` queries run at once; sessions are created lazily by `factory` and reused
+  (the local engine pools plain slot numbers, so the same limits apply offline)
+- Waiting requests queue per user and are served round-robin across users, so one viewer
+  with many panels in flight cannot starve the others
+- Admission control: `queued()` lets callers degrade to cached results when the queue is deep,
+  and `shed=True` requests (prefetch / warm-up) are refused outright instead of queueing
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from time import monotonic
+from typing import Any, Callable, Deque, Iterator, List
+
+
+class PoolSaturated(RuntimeError):
+    """The queue is too deep to admit a sheddable request."""
+
+
+class PoolTimeout(RuntimeError):
+    """No session became free within the pool's wait limit."""
+
+
+class SessionPool:
+    def __init__(self, factory: Callable[[], Any], size: int, max_queue: int, wait_s: float):
+        self.factory = factory
+        self.size = max(size, 1)
+        self.max_queue = max_queue
+        self.wait_s = wait_s
+        self._cond = threading.Condition()
+        self._idle: List[Any] = []
+        self._open = 0  # sessions created (or being created)
+        self._busy = 0
+        self._queues: OrderedDict[str, Deque[object]] = OrderedDict()  # user -> tickets, in serving order
+        self._served = 0
+        self._shed = 0
+        self._wait_total = 0.0
+
+    def queued(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def _head(self) -> object:
+        return next(iter(self._queues.values()))[0] if self._queues else None
+
+    def _dequeue(self, user: str, ticket: object) -> None:
+        q = self._queues[user]
+        q.remove(ticket)
+        # Served users go to the back of the line; users with nothing left waiting leave it
+        if q:
+            self._queues.move_to_end(user)
+        else:
+            del self._queues[user]
+
+    def acquire(self, user: str, shed: bool = False) -> Any:
+        """Block until it is `user`'s turn and a session is free; return the session."""
+        t0 = monotonic()
+        with self._cond:
+            if shed and self._busy >= self.size and self.queued() >= self.max_queue:
+                self._shed += 1
+                raise PoolSaturated(f"{self.queued()} queries already queued")
+            ticket = object()
+            self._queues.setdefault(user, deque()).append(ticket)
+            try:
+                while not (self._head() is ticket and self._busy < self.size):
+                    remaining = self.wait_s - (monotonic() - t0)
+                    if remaining <= 0:
+                        raise PoolTimeout(f"all {self.size} sessions busy for {self.wait_s:g}s")
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._dequeue(user, ticket)
+                self._cond.notify_all()
+                raise
+            self._dequeue(user, ticket)
+            self._busy += 1
+            self._served += 1
+            self._wait_total += monotonic() - t0
+            session = self._idle.pop() if self._idle else None
+            if session is None:
+                self._open += 1
+            self._cond.notify_all()
+        if session is None:
+            # Connect outside the lock; a failed connect gives its slot back
+            try:
+                session = self.factory()
+            except BaseException:
+                with self._cond:
+                    self._open -= 1
+                    self._busy -= 1
+                    self._cond.notify_all()
+                raise
+        return session
+
+    def release(self, session: Any) -> None:
+        with self._cond:
+            self._idle.append(session)
+            self._busy -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, user: str, shed: bool = False) -> Iterator[Any]:
+        session = self.acquire(user, shed)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def snapshot(self) -> dict:
+        """Point-in-time counters for the perf panel and load tests."""
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "busy": self._busy,
+                "queued": sum(len(q) for q in self._queues.values()),
+                "users_waiting": len(self._queues),
+                "served": self._served,
+                "shed": self._shed,
+                "avg_wait_ms": round(1000 * self._wait_total / self._served, 1) if self._served else 0.0,
+            }
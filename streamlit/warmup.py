@@ -0,0 +1,61 @@
+"""
+Speculative result-cache warm-up for the dashboard.
+
+- Runs once per data version: after the first page load of a process, and again whenever
+  the data-version token changes (e.g. after a curation run)
+- The caller supplies the tasks lazily (default view first, then the most frequently applied
+  filter views); each task warms one query and reports whether it hit the warehouse
+- Runs on a background thread and stops once it has spent its budget of query seconds
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from time import perf_counter
+from typing import Callable, Iterable, Optional
+
+Task = Callable[[], bool]  # warms one query; True when it had to run it (cache miss)
+
+
+class Warmer:
+    """Process-wide warm-up scheduler; `start` is a no-op for a version already warmed."""
+
+    def __init__(self, budget_s: float, versions: int = 8):
+        self.budget_s = budget_s
+        self.versions = versions
+        self._lock = threading.Lock()
+        self._started: OrderedDict[str, None] = OrderedDict()
+        self.last: Optional[dict] = None  # summary of the latest run, for the perf panel
+
+    def start(self, version: str, tasks: Callable[[], Iterable[Task]]) -> bool:
+        with self._lock:
+            if version in self._started:
+                return False
+            self._started[version] = None
+            while len(self._started) > self.versions:
+                self._started.popitem(last=False)
+        threading.Thread(target=self._run, args=(version, tasks), daemon=True, name="warmup").start()
+        return True
+
+    def _run(self, version: str, tasks: Callable[[], Iterable[Task]]) -> None:
+        summary = {"version": version, "queries": 0, "cached": 0, "failed": 0, "seconds": 0.0, "done": False}
+        self.last = summary
+        t_start = time.time()
+        for task in tasks():
+            if summary["seconds"] >= self.budget_s:
+                break
+            t0 = perf_counter()
+            try:
+                ran = task()
+            except Exception:
+                summary["failed"] += 1
+                continue
+            if ran:
+                summary["queries"] += 1
+                summary["seconds"] = round(summary["seconds"] + perf_counter() - t0, 2)
+            else:
+                summary["cached"] += 1
+        summary["done"] = True
+        summary["elapsed"] = round(time.time() - t_start, 2)
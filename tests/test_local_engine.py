@@ -0,0 +1,105 @@
+"""
+Panel handlers of the CSV-mode engine (streamlit/local_engine.py) over a handful of rows.
+
+Run with `python -m pytest tests` (or `make test`).
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "streamlit"))
+from local_engine import LocalEngine  # noqa: E402
+from query_catalog import PERCENTILES, Filters  # noqa: E402
+
+
+def _ts(values):
+    return pd.to_datetime(pd.Series(values), utc=True)
+
+
+def _tables() -> dict[str, pd.DataFrame]:
+    """Three lanes between four cities with three, two and one legs, one exception event per shipment."""
+    cities = ["Chicago", "Houston", "Kansas City", "Denver"]
+    legs = 6
+    lane_ids = [1, 1, 1, 2, 2, 3]
+    pickup = _ts(["2025-01-0%d 08:00" % (i + 1) for i in range(legs)])
+    delivery = pickup + pd.to_timedelta([24, 36, 48, 60, 72, 84], unit="h")
+    fs = pd.DataFrame({
+        "shipment_id": [f"S{i}" for i in range(legs)],
+        "leg_id": [1] * legs,
+        "customer_id": [1, 1, 2, 2, 1, 2],
+        "carrier_id": [1] * legs,
+        "equipment_id": [1] * legs,
+        "lane_id": lane_ids,
+        "pickup_actual_ts": pickup,
+        "delivery_plan_ts": delivery,
+        "delivery_actual_ts": delivery,
+    })
+    fs["delivery_date"] = fs["delivery_actual_ts"].dt.tz_localize(None).dt.normalize()
+    return {
+        "dim_customer": pd.DataFrame({"customer_id": [1, 2], "name": ["Acme", "Globex"]}),
+        "dim_carrier": pd.DataFrame({"carrier_id": [1], "name": ["Swift"]}),
+        "dim_equipment": pd.DataFrame({"equipment_id": [1], "type": ["Dry Van"]}),
+        "dim_location": pd.DataFrame({"loc_id": [1, 2, 3, 4], "city": cities}),
+        "dim_lane": pd.DataFrame({"lane_id": [1, 2, 3], "origin_loc_id": [1, 1, 4], "dest_loc_id": [2, 3, 2]}),
+        "fact_shipment": fs,
+        "fact_event": pd.DataFrame({
+            "shipment_id": fs["shipment_id"],
+            "event_type": ["Exception"] * legs,
+            "notes": ["Weather", "Traffic", "Weather", "Capacity", "Weather", "Traffic"],
+        }),
+    }
+
+
+@pytest.fixture
+def engine() -> LocalEngine:
+    return LocalEngine(_tables())
+
+
+def test_lane_pct_empty_filter(engine):
+    for flt in (Filters(date_start="2030-01-01", date_end="2030-01-31"), Filters(carrier_ids=(999,))):
+        df = engine.run("lane_pct", flt)
+        assert df.empty
+        assert list(df.columns) == ["lane", "shipments", *(f"transit_hours_{p}" for p in PERCENTILES)]
+
+
+def test_lane_labels_agree(engine):
+    """The exact, sampled and percentile lane panels and the lane filter list name a lane_id alike."""
+    expected = {"Chicago → Houston": 3, "Chicago → Kansas City": 2, "Denver → Houston": 1}
+    for name, kwargs in (("lane", {}), ("lane_approx", {"sample_pct": 100}), ("lane_pct", {})):
+        df = engine.run(name, **kwargs)
+        assert df.set_index("lane")["shipments"].to_dict() == expected, name
+    dims = engine.run("dims")
+    assert dims.loc[dims["k"] == "lane"].set_index("id")["v"].to_dict() == {
+        1: "Chicago → Houston", 2: "Chicago → Kansas City", 3: "Denver → Houston",
+    }
+
+
+def test_exceptions_by_event_type():
+    """A shipment with two exceptions of different types counts once under each, with or without
+    the milestone snapshot (whose first_exception_type holds only the earliest)."""
+    data = _tables()
+    fs, fe = data["fact_shipment"], data["fact_event"]
+    data["fact_event"] = pd.concat(
+        [fe, pd.DataFrame({"shipment_id": ["S0"], "event_type": ["Exception"], "notes": ["Traffic"]})],
+        ignore_index=True,
+    )
+    expected = {("Acme", "Weather"): 2, ("Acme", "Traffic"): 2, ("Globex", "Weather"): 1,
+                ("Globex", "Capacity"): 1, ("Globex", "Traffic"): 1}
+    plain = LocalEngine(dict(data))
+    data["fact_shipment_milestone"] = fs[["shipment_id", "customer_id", "carrier_id", "equipment_id", "lane_id",
+                                          "delivery_date"]].assign(
+        tendered_ts=fs["pickup_actual_ts"] - pd.Timedelta(hours=12),
+        accepted_ts=fs["pickup_actual_ts"] - pd.Timedelta(hours=6),
+        dwell_minutes=30.0,
+        exception_count=[2, 1, 1, 1, 1, 1],
+        first_exception_type=data["fact_event"]["notes"][:len(fs)].to_numpy(),
+    )
+    for eng in (plain, LocalEngine(data)):
+        for name, kwargs in (("exceptions", {}), ("exceptions_approx", {"sample_pct": 100})):
+            df = eng.run(name, **kwargs)
+            assert df.set_index(["customer_name", "exception_type"])["exceptions"].to_dict() == expected, name